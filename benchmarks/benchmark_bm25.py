@@ -0,0 +1,58 @@
+"""
+Benchmark of the BM25 index that is used by the hybrid search: the time to build it from synthetic, README-like
+package descriptions, its size, and the latency of a lookup for a query with a rare term (a package name) and for
+a query with only common terms.
+
+Usage:
+    poetry run python benchmarks/benchmark_bm25.py [n_rows]
+"""
+
+import logging
+import sys
+import time
+import timeit
+
+import polars as pl
+from synthetic_data import generate_descriptions
+
+from pypi_scout.config import Config
+from pypi_scout.data.description_cleaner import FastDescriptionCleaner
+from pypi_scout.embeddings.bm25_index import BM25IndexBuilder
+
+DEFAULT_N_ROWS = 20_000
+TOP_K = 300
+N_REPEATS = 200
+
+
+def main():
+    logging.disable(logging.INFO)
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_N_ROWS
+
+    df = pl.DataFrame(
+        {
+            "name": [f"package-{i}" for i in range(n_rows)],
+            "summary": "A library for python",
+            "description": generate_descriptions(n_rows),
+        }
+    )
+    df = FastDescriptionCleaner().clean(df, "description", "description_cleaned")
+
+    start = time.perf_counter()
+    builder = BM25IndexBuilder(max_tokens_per_document=Config.BM25_MAX_TOKENS_PER_DOCUMENT)
+    builder.add_documents(df, ["name", "summary", "description_cleaned"])
+    bm25_index = builder.build(min_document_frequency=Config.BM25_MIN_DOCUMENT_FREQUENCY)
+    print(
+        f"Built the index of {n_rows:,} documents in {time.perf_counter() - start:.2f} s: "
+        f"{len(bm25_index.vocabulary):,} terms, {len(bm25_index.documents):,} postings, "
+        f"{bm25_index.nbytes / 1024**2:,.1f} MB."
+    )
+
+    print(f"{'query':>28} | {'matches':>9} | {'latency (ms)':>13}")
+    for query in [str(n_rows // 2), "json schema validation", "python library"]:
+        n_matches = len(bm25_index.search(query, TOP_K)[0])
+        duration = timeit.timeit(lambda q=query: bm25_index.search(q, TOP_K), number=N_REPEATS) / N_REPEATS
+        print(f"{query:>28} | {n_matches:>9,} | {duration * 1000:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark of the throughput of the `DescriptionCleaner` on synthetic, README-like package descriptions.
+
+Compares four methods:
+    - legacy: the original implementation, which parses every description with BeautifulSoup and
+        compiles the regexes on every call.
+    - serial: the `DescriptionCleaner` in the main process.
+    - fast: the `FastDescriptionCleaner` in the main process.
+    - parallel: the `FastDescriptionCleaner` with one worker process per CPU core, as used by `process_raw_dataset`.
+
+Usage:
+    poetry run python benchmarks/benchmark_description_cleaner.py [n_rows]
+"""
+
+import os
+import re
+import sys
+import time
+
+import polars as pl
+from bs4 import BeautifulSoup
+from synthetic_data import generate_descriptions
+
+from pypi_scout.data.description_cleaner import CLEANING_FAILED, DescriptionCleaner, FastDescriptionCleaner
+
+DEFAULT_N_ROWS = 20_000
+
+
+class LegacyDescriptionCleaner(DescriptionCleaner):
+    def _clean_text(self, text: str) -> str:
+        try:
+            text = BeautifulSoup(text, "lxml").get_text(separator=" ")
+            text = re.sub(r"!\[.*?\]\(.*?\)", "", text)
+            text = re.sub(r"\[!\[.*?\]\(.*?\)\]", "", text)
+            text = re.sub(r"\[.*?\]\(.*?\)", "", text)
+            text = re.sub(r"http\S+|www\S+|https\S+", "", text, flags=re.MULTILINE)
+            text = re.sub(r"[#*=_`]", "", text)
+            text = re.sub(r"\n\s*#{1,6}\s*", " ", text)
+            text = " ".join(text.split())
+        except:  # noqa: E722
+            return CLEANING_FAILED
+        return text
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_N_ROWS
+    df = pl.DataFrame({"description": generate_descriptions(n_rows)})
+    n_workers = os.cpu_count()
+    cleaners = {
+        "legacy": LegacyDescriptionCleaner(),
+        "serial": DescriptionCleaner(),
+        "fast": FastDescriptionCleaner(),
+        f"parallel ({n_workers} workers)": FastDescriptionCleaner(n_workers=n_workers),
+    }
+
+    print(f"Cleaning {n_rows:,} descriptions ({df['description'].str.len_bytes().sum() / 1024**2:,.0f} MB):")
+    print(f"{'method':>22} | {'time (s)':>9} | {'rows/s':>9}")
+    results = {}
+    for method, cleaner in cleaners.items():
+        start = time.perf_counter()
+        results[method] = cleaner.clean(df, "description", "description_cleaned")["description_cleaned"]
+        duration = time.perf_counter() - start
+        print(f"{method:>22} | {duration:>9.2f} | {n_rows / duration:>9,.0f}")
+
+    for method, result in results.items():
+        if not result.equals(results["legacy"]):
+            raise RuntimeError(f"The output of {method} differs from the legacy cleaner.")  # noqa: TRY003
+
+
+if __name__ == "__main__":
+    main()
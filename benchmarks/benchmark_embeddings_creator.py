@@ -0,0 +1,66 @@
+"""
+Benchmark of the throughput of the `VectorEmbeddingCreator` on the CPU, on synthetic, README-like package texts
+that are cleaned like the texts that `create_vector_embeddings` encodes. Like on PyPI, the lengths of the texts vary
+from a one-line summary to descriptions that are longer than the maximum sequence length of the model.
+
+Compares three methods:
+    - arrival-order: encode the texts in batches in the order of the DataFrame, as `create_vector_embeddings` did before.
+    - sorted: encode the texts in buckets of similar length in the main process.
+    - sorted-multi-process: encode the buckets with one worker process per CPU core.
+
+Usage:
+    poetry run python benchmarks/benchmark_embeddings_creator.py [n_rows] [model_name_or_path]
+"""
+
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import polars as pl
+from sentence_transformers import SentenceTransformer
+from synthetic_data import generate_descriptions
+
+from pypi_scout.config import Config
+from pypi_scout.data.description_cleaner import FastDescriptionCleaner
+from pypi_scout.embeddings.embeddings_creator import VectorEmbeddingCreator
+
+DEFAULT_N_ROWS = 2_000
+
+
+def main():
+    logging.disable(logging.INFO)
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_N_ROWS
+    model_name = sys.argv[2] if len(sys.argv) > 2 else Config.EMBEDDINGS_MODEL_NAME
+    model = SentenceTransformer(model_name, device="cpu")
+
+    df = pl.DataFrame({"description": generate_descriptions(n_rows)})
+    df = FastDescriptionCleaner().clean(df, "description", "description_cleaned")
+    lengths = np.random.default_rng(0).lognormal(5.5, 1.5, n_rows).astype(int) + 10
+    df = df.with_columns(pl.col("description_cleaned").str.slice(0, pl.Series(lengths)))
+    n_processes = os.cpu_count() or 1
+    creators = {
+        "arrival-order": VectorEmbeddingCreator(model),
+        "sorted": VectorEmbeddingCreator(model, sort_by_length=True),
+        f"sorted-multi-process ({n_processes})": VectorEmbeddingCreator(
+            model, sort_by_length=True, n_processes=n_processes
+        ),
+    }
+
+    print(f"Encoding {n_rows:,} texts with `{model_name}` on the CPU:")
+    print(f"{'method':>28} | {'time (s)':>9} | {'texts/s':>9}")
+    results = {}
+    for method, creator in creators.items():
+        start = time.perf_counter()
+        results[method] = np.stack(creator.add_embeddings(df, "description_cleaned")["embeddings"].to_numpy())
+        duration = time.perf_counter() - start
+        print(f"{method:>28} | {duration:>9.2f} | {n_rows / duration:>9,.1f}")
+
+    for method, embeddings in results.items():
+        if not np.allclose(embeddings, results["arrival-order"], atol=1e-4):
+            raise RuntimeError(f"The embeddings of {method} differ from those in arrival order.")  # noqa: TRY003
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark of the time and peak memory it takes to load the embeddings and build the `SimpleVectorDatabase`.
+
+Compares three methods:
+    - legacy: read `embeddings.parquet` and build the matrix with the previous per-row implementation.
+    - vectorized: read `embeddings.parquet` and build the matrix from the flat values buffer.
+    - memory-mapped: read the names and memory-map `embeddings.npy`, as the API does by default.
+
+The synthetic artifacts are written once, after which each method runs in a fresh process,
+so that the peak RSS of one run does not affect the other.
+
+Usage:
+    poetry run python benchmarks/benchmark_embeddings_matrix.py [n_rows]
+"""
+
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+import polars as pl
+
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.utils.memory import get_peak_memory_usage_mb
+
+EMBEDDING_DIM = 768
+DEFAULT_N_ROWS = 200_000
+METHODS = ["legacy", "vectorized", "memory-mapped"]
+
+
+def write_artifacts(data_dir: Path, n_rows: int) -> None:
+    embeddings = np.random.default_rng(0).standard_normal((n_rows, EMBEDDING_DIM), dtype=np.float32)
+    df = pl.DataFrame(
+        {
+            "name": [f"package-{i}" for i in range(n_rows)],
+            "embeddings": pl.Series(embeddings).cast(pl.List(pl.Float32)),
+        }
+    )
+    df.write_parquet(data_dir / "embeddings.parquet")
+    df.drop("embeddings").write_parquet(data_dir / "embeddings_names.parquet")
+    np.save(data_dir / "embeddings.npy", SimpleVectorDatabase._normalize(embeddings))
+
+
+def legacy_create_embeddings_matrix(df_embeddings: pl.DataFrame) -> np.ndarray:
+    embeddings_matrix = np.stack(
+        df_embeddings["embeddings"]
+        .map_elements(lambda x: np.array(x, dtype=np.float32), return_dtype=pl.Object)
+        .to_numpy()
+    )
+    return SimpleVectorDatabase._normalize(embeddings_matrix)
+
+
+def run(method: str, data_dir: Path, results: dict) -> None:
+    start = time.perf_counter()
+    if method == "legacy":
+        legacy_create_embeddings_matrix(pl.read_parquet(data_dir / "embeddings.parquet"))
+    elif method == "vectorized":
+        SimpleVectorDatabase(
+            embeddings_model=MagicMock(), df_embeddings=pl.read_parquet(data_dir / "embeddings.parquet")
+        )
+    else:
+        SimpleVectorDatabase(
+            embeddings_model=MagicMock(),
+            df_embeddings=pl.read_parquet(data_dir / "embeddings_names.parquet"),
+            embeddings_matrix=np.load(data_dir / "embeddings.npy", mmap_mode="r"),
+        )
+    results[method] = (time.perf_counter() - start, get_peak_memory_usage_mb())
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_N_ROWS
+    # Polars is multi-threaded, so we use "spawn" rather than "fork" to start the processes.
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The artifacts are also written in a separate process: on Linux, the peak RSS of a process is inherited
+        # by the processes it starts, so the parent process should stay small.
+        process = context.Process(target=write_artifacts, args=(Path(tmp_dir), n_rows))
+        process.start()
+        process.join()
+
+        for method in METHODS:
+            process = context.Process(target=run, args=(method, Path(tmp_dir), results))
+            process.start()
+            process.join()
+
+    print(f"Loading a {n_rows:,} x {EMBEDDING_DIM} embeddings matrix:")
+    print(f"{'method':>14} | {'time (s)':>9} | {'peak RSS (MB)':>14}")
+    for method in METHODS:
+        duration, peak_memory_mb = results[method]
+        print(f"{method:>14} | {duration:>9.2f} | {peak_memory_mb:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
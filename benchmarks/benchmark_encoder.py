@@ -0,0 +1,95 @@
+"""
+Benchmark of the latency and throughput of the encoder backends on the CPU: the PyTorch SentenceTransformer, the model
+exported to ONNX, and the ONNX model with int8-quantized weights. Measures the latency of a single query, as the API
+encodes it, and the throughput of batches of queries and of package descriptions. Also reports the cosine similarity
+between the embeddings of each backend and those of PyTorch.
+
+Requires the `onnx` and `onnxruntime` packages.
+
+Usage:
+    poetry run python benchmarks/benchmark_encoder.py [model_name_or_path]
+"""
+
+import logging
+import sys
+import tempfile
+import time
+
+import numpy as np
+import polars as pl
+from sentence_transformers import SentenceTransformer
+from synthetic_data import generate_descriptions
+
+from pypi_scout.config import Config
+from pypi_scout.data.description_cleaner import FastDescriptionCleaner
+from pypi_scout.embeddings.onnx_encoder import OnnxEncoder, export_to_onnx
+
+QUERIES = [
+    "a library for parsing json",
+    "fast async http client",
+    "web framework for building apis with type hints",
+    "plot charts in a jupyter notebook",
+    "command line tool to manage configuration files",
+    "machine learning model training",
+    "orm for a database",
+    "image processing",
+]
+N_SINGLE_QUERIES = 200
+BATCH_SIZES = [16, 128]
+N_DESCRIPTIONS = 256
+
+
+def measure_single_query_latency(encoder, queries: list) -> np.ndarray:
+    latencies = []
+    for i in range(N_SINGLE_QUERIES):
+        start = time.perf_counter()
+        encoder.encode([queries[i % len(queries)]], show_progress_bar=False)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def measure_throughput(encoder, texts: list, batch_size: int) -> float:
+    start = time.perf_counter()
+    encoder.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    logging.disable(logging.INFO)
+    model_name = sys.argv[1] if len(sys.argv) > 1 else Config.EMBEDDINGS_MODEL_NAME
+    model = SentenceTransformer(model_name, device="cpu")
+    queries = QUERIES * 32
+    df = pl.DataFrame({"description": generate_descriptions(N_DESCRIPTIONS)})
+    df = FastDescriptionCleaner().clean(df, "description", "description_cleaned")
+    descriptions = df["description_cleaned"].str.slice(0, 2000).to_list()
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        export_to_onnx(model, model_dir, quantize=True)
+        encoders = {
+            "torch": model,
+            "onnx": OnnxEncoder(model_dir),
+            "onnx-int8": OnnxEncoder(model_dir, quantized=True),
+        }
+        reference = model.encode(descriptions, show_progress_bar=False)
+
+        print(f"Encoding with `{model_name}` on the CPU:")
+        header = f"{'backend':>10} | {'p50 (ms)':>9} | {'p95 (ms)':>9}"
+        header += "".join(f" | {f'queries/s @{batch_size}':>17}" for batch_size in BATCH_SIZES)
+        print(f"{header} | {'descriptions/s':>15} | {'min cosine':>10}")
+        for backend, encoder in encoders.items():
+            encoder.encode(QUERIES, show_progress_bar=False)  # Warm up.
+            latencies = measure_single_query_latency(encoder, QUERIES)
+            row = f"{backend:>10} | {np.percentile(latencies, 50):>9.2f} | {np.percentile(latencies, 95):>9.2f}"
+            row += "".join(
+                f" | {measure_throughput(encoder, queries, batch_size):>17,.0f}" for batch_size in BATCH_SIZES
+            )
+            embeddings = encoder.encode(descriptions, batch_size=32, show_progress_bar=False)
+            cosine = np.sum(embeddings * reference, axis=1) / (
+                np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference, axis=1)
+            )
+            row += f" | {measure_throughput(encoder, descriptions, 32):>15,.1f} | {cosine.min():>10.4f}"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
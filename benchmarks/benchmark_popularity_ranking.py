@@ -0,0 +1,97 @@
+"""
+Benchmark of the latency of the ranking modes of the API on synthetic, clustered embeddings with log-normal downloads.
+
+Compares three methods:
+    - global: score every package by similarity and popularity (RankingMode.GLOBAL).
+    - candidates: fetch the top_k * 3 most similar packages and re-rank them (RankingMode.CANDIDATES).
+    - global-early-exit: the same ranking as global, stopping once no remaining package can reach the top_k
+        (RankingMode.GLOBAL_EARLY_EXIT). The rows are stored in order of descending popularity,
+        as `create_vector_embeddings` does.
+
+The last two are run with both the exact and the IVF vector index. The early exit saves time when the vector index
+does not compare the query to every package; with the exact index, fetching the candidates is already a full pass.
+
+Usage:
+    poetry run python benchmarks/benchmark_popularity_ranking.py [n_packages]
+"""
+
+import logging
+import sys
+import time
+from unittest.mock import MagicMock
+
+import numpy as np
+import polars as pl
+
+from pypi_scout.embeddings.popularity_ranker import PopularityRanker
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.embeddings.vector_index import ExactIndex, IVFIndex, top_k_indices
+from pypi_scout.utils.score_calculator import calculate_score_from_arrays
+
+EMBEDDING_DIM = 768
+DEFAULT_N_PACKAGES = 200_000
+N_CLUSTERS = 500
+N_QUERIES = 50
+TOP_K = 10
+
+
+def create_vector_database(n_packages: int, rng: np.random.Generator) -> SimpleVectorDatabase:
+    centroids = rng.standard_normal((N_CLUSTERS, EMBEDDING_DIM), dtype=np.float32)
+    embeddings = centroids[rng.integers(0, N_CLUSTERS, n_packages)]
+    embeddings += rng.standard_normal((n_packages, EMBEDDING_DIM), dtype=np.float32)
+    return SimpleVectorDatabase(
+        embeddings_model=MagicMock(),
+        df_embeddings=pl.DataFrame({"name": [f"package-{i}" for i in range(n_packages)]}),
+        embeddings_matrix=SimpleVectorDatabase._normalize(embeddings),
+    )
+
+
+def main():
+    logging.disable(logging.INFO)
+    n_packages = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_N_PACKAGES
+    rng = np.random.default_rng(0)
+    vector_database = create_vector_database(n_packages, rng)
+    log_weekly_downloads = np.sort(np.log1p(rng.lognormal(6, 3, n_packages)))[::-1].astype(np.float32)
+    query_embeddings = SimpleVectorDatabase._normalize(
+        vector_database.embeddings_matrix[rng.integers(0, n_packages, N_QUERIES)]
+        + 0.5 * rng.standard_normal((N_QUERIES, EMBEDDING_DIM), dtype=np.float32)
+    )
+
+    centroids = IVFIndex.train_centroids(vector_database.embeddings_matrix)
+    vector_indexes = {
+        "exact": ExactIndex(),
+        "ivf": IVFIndex(centroids, IVFIndex.assign(vector_database.embeddings_matrix, centroids)),
+    }
+
+    def candidates(query_embedding):
+        rows, similarities = vector_database.search_embeddings_batch(query_embedding[None], TOP_K * 3)[0]
+        scores = calculate_score_from_arrays(similarities, log_weekly_downloads[rows])
+        return rows[top_k_indices(scores, TOP_K)]
+
+    global_ranker = PopularityRanker(vector_database, log_weekly_downloads, early_exit=False)
+    early_exit_ranker = PopularityRanker(vector_database, log_weekly_downloads, early_exit=True)
+    methods = [("global", "exact", lambda query: global_ranker.rank(query[None], TOP_K, TOP_K * 3)[0][0])]
+    for index_name in vector_indexes:
+        methods.append(("candidates", index_name, candidates))
+        methods.append(
+            ("global-early-exit", index_name, lambda query: early_exit_ranker.rank(query[None], TOP_K, TOP_K * 3)[0][0])
+        )
+
+    expected = None
+    print(f"Ranking {N_QUERIES} queries against {n_packages:,} packages, top_k={TOP_K}:")
+    print(f"{'method':>18} | {'index':>6} | {'mean latency (ms)':>18} | {'overlap with global':>20}")
+    for method, index_name, rank in methods:
+        vector_database.vector_index = vector_indexes[index_name]
+        start = time.perf_counter()
+        results = [rank(query_embedding) for query_embedding in query_embeddings]
+        latency_ms = (time.perf_counter() - start) * 1000 / N_QUERIES
+
+        expected = expected or results
+        overlap = np.mean(
+            [len(np.intersect1d(rows, expected_rows)) / TOP_K for rows, expected_rows in zip(results, expected)]
+        )
+        print(f"{method:>18} | {index_name:>6} | {latency_ms:>18.2f} | {overlap:>20.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark of the memory, latency and recall@k of searching quantized embeddings with exact re-scoring,
+compared with searching the float32 embeddings matrix, and of the latency of the similarities with the int8
+embeddings per size of the blocks that are dequantized at a time.
+
+Usage:
+    poetry run python -m benchmarks.benchmark_quantization [n_rows]
+"""
+
+import sys
+import time
+from unittest.mock import MagicMock
+
+import numpy as np
+import polars as pl
+
+from pypi_scout.embeddings.quantized_embeddings import DEQUANTIZED_BLOCK_BYTES, QuantizedEmbeddings
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+
+EMBEDDING_DIM = 768
+DEFAULT_N_ROWS = 200_000
+N_CLUSTERS = 500
+N_QUERIES = 100
+TOP_K = 30
+RESCORE_MULTIPLIER = 4
+BLOCK_BYTES = [128 * 1024, 512 * 1024, 2 * 1024**2, 16 * 1024**2]
+N_REPEATS = 9
+
+
+def create_embeddings_matrix(n_rows: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    cluster_centers = rng.standard_normal((N_CLUSTERS, EMBEDDING_DIM), dtype=np.float32)
+    embeddings = cluster_centers[rng.integers(N_CLUSTERS, size=n_rows)]
+    embeddings += rng.standard_normal(embeddings.shape, dtype=np.float32)
+    return SimpleVectorDatabase._normalize(embeddings)
+
+
+def evaluate(vector_database: SimpleVectorDatabase, queries: np.ndarray) -> tuple:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        indices, _ = vector_database._search(query, TOP_K)
+        latencies.append(time.perf_counter() - start)
+        results.append(indices)
+    return results, np.array(latencies) * 1000
+
+
+def median_latency_ms(function) -> float:
+    function()
+    latencies = []
+    for _ in range(N_REPEATS):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    return float(np.median(latencies)) * 1000
+
+
+def benchmark_block_sizes(embeddings_matrix: np.ndarray, queries: np.ndarray) -> None:
+    """
+    Compares the latency of the similarities of a single query and of a batch of queries with the int8 embeddings,
+    per number of bytes of dequantized rows per block, with the float32 embeddings matrix.
+    """
+    quantized_embeddings = QuantizedEmbeddings.quantize(embeddings_matrix, np.int8)
+    query, batch = queries[0], np.ascontiguousarray(queries[:16].T)
+    print(f"\nSimilarities with int8 embeddings per block size (default {DEQUANTIZED_BLOCK_BYTES // 1024:,} KiB):")
+    print(f"{'block':>15} | {'rows':>6} | {'1 query (ms)':>12} | {'16 queries (ms)':>15}")
+    print(
+        f"{'float32':>15} | {'':>6} | {median_latency_ms(lambda: embeddings_matrix @ query):>12.1f} | "
+        f"{median_latency_ms(lambda: embeddings_matrix @ batch):>15.1f}"
+    )
+    for block_bytes in BLOCK_BYTES:
+        quantized_embeddings.block_size = block_bytes // (4 * EMBEDDING_DIM)
+        print(
+            f"{f'int8 {block_bytes // 1024:,} KiB':>15} | {quantized_embeddings.block_size:>6,} | "
+            f"{median_latency_ms(lambda: quantized_embeddings @ query):>12.1f} | "
+            f"{median_latency_ms(lambda: quantized_embeddings @ batch):>15.1f}"
+        )
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_N_ROWS
+    embeddings_matrix = create_embeddings_matrix(n_rows)
+    df_names = pl.DataFrame({"name": [f"package-{i}" for i in range(n_rows)]})
+    rng = np.random.default_rng(1)
+    queries = embeddings_matrix[rng.integers(n_rows, size=N_QUERIES)]
+    queries = SimpleVectorDatabase._normalize(queries + 0.05 * rng.standard_normal(queries.shape, dtype=np.float32))
+
+    exact_database = SimpleVectorDatabase(MagicMock(), df_names, embeddings_matrix=embeddings_matrix)
+    exact_results, exact_latencies = evaluate(exact_database, queries)
+
+    print(f"Searching {n_rows:,} x {EMBEDDING_DIM} embeddings, top_k={TOP_K}, rescore_multiplier={RESCORE_MULTIPLIER}:")
+    print(f"{'embeddings':>10} | {'size (MB)':>10} | {f'recall@{TOP_K}':>10} | {'p50 (ms)':>9} | {'p99 (ms)':>9}")
+    print(
+        f"{'float32':>10} | {embeddings_matrix.nbytes / 1024**2:>10,.0f} | {1:>10.3f} | "
+        f"{np.percentile(exact_latencies, 50):>9.2f} | {np.percentile(exact_latencies, 99):>9.2f}"
+    )
+    for dtype in [np.float16, np.int8]:
+        quantized_embeddings = QuantizedEmbeddings.quantize(embeddings_matrix, dtype)
+        quantized_database = SimpleVectorDatabase(
+            MagicMock(),
+            df_names,
+            embeddings_matrix=embeddings_matrix,
+            quantized_embeddings=quantized_embeddings,
+            rescore_multiplier=RESCORE_MULTIPLIER,
+        )
+        results, latencies = evaluate(quantized_database, queries)
+        recall = np.mean([len(np.intersect1d(a, b)) / TOP_K for a, b in zip(results, exact_results)])
+        print(
+            f"{np.dtype(dtype).name:>10} | {quantized_embeddings.nbytes / 1024**2:>10,.0f} | {recall:>10.3f} | "
+            f"{np.percentile(latencies, 50):>9.2f} | {np.percentile(latencies, 99):>9.2f}"
+        )
+
+    benchmark_block_sizes(embeddings_matrix, queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of the per-request work between the vector search and the response: fetching the metadata of the matches
+and scoring them.
+
+Compares two methods:
+    - join: join the matches with the packages DataFrame by name, score the joined columns, sort and select,
+        as the API did before the package metadata was stored in row-aligned arrays.
+    - arrays: gather precomputed log1p(weekly_downloads) by row index, score with `calculate_score_from_arrays`
+        and select the best matches with `top_k_indices`, as the API does now.
+
+Usage:
+    poetry run python benchmarks/benchmark_scoring.py [n_packages]
+"""
+
+import sys
+import time
+
+import numpy as np
+import polars as pl
+
+from pypi_scout.api.package_metadata import PackageMetadata
+from pypi_scout.embeddings.vector_index import top_k_indices
+from pypi_scout.utils.score_calculator import calculate_score_from_arrays
+
+DEFAULT_N_PACKAGES = 400_000
+TOP_KS = [10, 50, 100]
+N_REQUESTS = 100
+
+
+def score_with_join(df_packages: pl.DataFrame, df_matches: pl.DataFrame, top_k: int) -> list:
+    df_matches = df_matches.join(df_packages, how="left", on="name", coalesce=True)
+    scores = calculate_score_from_arrays(
+        df_matches["similarity"].to_numpy(), np.log1p(df_matches["weekly_downloads"].to_numpy())
+    )
+    df_matches = df_matches.with_columns(score=scores).sort("score", descending=True).head(top_k)
+    return df_matches.select(["name", "similarity", "summary", "weekly_downloads"]).to_dicts()
+
+
+def score_with_arrays(
+    package_metadata: PackageMetadata, rows: np.ndarray, similarities: np.ndarray, top_k: int
+) -> list:
+    scores = calculate_score_from_arrays(similarities, package_metadata.log_weekly_downloads[rows])
+    best = top_k_indices(scores, top_k)
+    return package_metadata.get_matches(rows[best], similarities[best])
+
+
+def main():
+    n_packages = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_N_PACKAGES
+    rng = np.random.default_rng(0)
+    df_packages = pl.DataFrame(
+        {
+            "name": [f"package-{i}" for i in range(n_packages)],
+            "summary": [f"A summary of package {i}." for i in range(n_packages)],
+            "weekly_downloads": rng.lognormal(6, 3, n_packages).astype(np.int64),
+        }
+    )
+    package_metadata = PackageMetadata.from_packages(df_packages, df_packages["name"])
+    names = df_packages["name"]
+
+    print(f"Scoring the matches of {N_REQUESTS} requests against {n_packages:,} packages:")
+    print(f"{'top_k':>6} | {'join (ms)':>10} | {'arrays (ms)':>12} | {'speed-up':>9}")
+    for top_k in TOP_KS:
+        requests = []
+        for _ in range(N_REQUESTS):
+            rows = rng.choice(n_packages, size=top_k * 3, replace=False)
+            similarities = np.sort(rng.random(top_k * 3, dtype=np.float32))[::-1]
+            requests.append((rows, similarities))
+
+        start = time.perf_counter()
+        for rows, similarities in requests:
+            score_with_join(df_packages, pl.DataFrame({"name": names[rows], "similarity": similarities}), top_k)
+        join_ms = (time.perf_counter() - start) * 1000 / N_REQUESTS
+
+        start = time.perf_counter()
+        for rows, similarities in requests:
+            score_with_arrays(package_metadata, rows, similarities, top_k)
+        arrays_ms = (time.perf_counter() - start) * 1000 / N_REQUESTS
+
+        print(f"{top_k:>6} | {join_ms:>10.3f} | {arrays_ms:>12.3f} | {join_ms / arrays_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
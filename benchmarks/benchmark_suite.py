@@ -0,0 +1,365 @@
+"""
+Benchmark suite that measures the main steps of the pipeline and the API on synthetic datasets of increasing size, and
+writes the results as JSON, so that a run on one commit can be compared with a run on another.
+
+The datasets are generated from a fixed seed: packages with README-like markdown descriptions and log-normally
+distributed downloads, and embeddings that are either uniformly random or clustered. Every benchmark runs in a fresh
+process per dataset size, so that the memory and caches of one benchmark do not affect the next, and reports its peak
+memory usage next to its timings. The queries are encoded by a stub encoder, so the timings do not include a model.
+
+Benchmarks:
+    - find_similar: latency of `SimpleVectorDatabase.find_similar`, and of its encode, similarity and join stages.
+    - scoring: `calculate_score_from_arrays` and `top_k_indices` on the top_k * 3 candidates of a query, and
+        `PackageMetadata.get_matches` on the best top_k, as in the API, and the score of all packages.
+    - description_cleaner: throughput of `DescriptionCleaner.clean` and `FastDescriptionCleaner.clean`, on at most
+        --max-text-rows descriptions.
+    - raw_data_reader: `RawDataReader.read` of the raw dataset.
+    - api_data_loader: `ApiDataLoader.load_dataset`, and its phases, with the embeddings memory-mapped as in the API.
+    - api_search: end-to-end latency of `/api/search` through the FastAPI app in-process, including the query
+        batcher, and the stages reported in its `Server-Timing` header.
+
+Usage, from the root of the repository:
+    poetry run python -m benchmarks.benchmark_suite [--sizes 10000 100000 1000000] [--benchmarks find_similar ...]
+        [--embeddings random|clustered] [--output results.json] [--compare baseline.json]
+
+or `make benchmark ARGS="--sizes 10000 --compare benchmarks/results/<commit>.json"`.
+
+A 1M x 768 embeddings matrix takes 3 GB of memory.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from unittest.mock import patch
+
+import fastapi
+import numpy as np
+import polars as pl
+
+from benchmarks.synthetic_data import StubEncoder, generate_embeddings, generate_packages
+from pypi_scout.api.data_loader import ApiDataLoader
+from pypi_scout.api.package_metadata import PackageMetadata
+from pypi_scout.config import Config
+from pypi_scout.data.description_cleaner import DescriptionCleaner, FastDescriptionCleaner
+from pypi_scout.data.raw_data_reader import RawDataReader
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.embeddings.vector_index import top_k_indices
+from pypi_scout.utils.memory import get_peak_memory_usage_mb
+from pypi_scout.utils.metrics import StageTimer
+from pypi_scout.utils.score_calculator import calculate_score_from_arrays
+
+BENCHMARKS = [
+    "find_similar",
+    "scoring",
+    "description_cleaner",
+    "raw_data_reader",
+    "api_data_loader",
+    "api_search",
+]
+# The benchmarks that need the raw dataset with descriptions, which is slower to generate than the other datasets.
+TEXT_BENCHMARKS = {"description_cleaner", "raw_data_reader"}
+DEFAULT_SIZES = [10_000, 100_000]
+DEFAULT_DIM = 768
+N_CLUSTERS = 500
+TOP_K = 10
+N_QUERIES = 200
+N_WARMUP_QUERIES = 10
+N_REPEATS = 5
+DEFAULT_MAX_TEXT_ROWS = 100_000
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def write_datasets(data_dir: Path, n_packages: int, dim: int, clustered: bool, with_raw_dataset: bool) -> None:
+    """
+    Writes the files that the API reads, and optionally the raw dataset, like `process_raw_dataset` and
+    `create_vector_embeddings` would.
+    """
+    config = Config(DATA_DIR=data_dir)
+    df_packages = generate_packages(n_packages)
+    if with_raw_dataset:
+        df_packages.write_csv(data_dir / config.RAW_DATASET_CSV_NAME)
+
+    df_packages = df_packages.select("name", "summary", weekly_downloads="number_of_downloads")
+    df_packages.write_csv(data_dir / config.DATASET_FOR_API_CSV_NAME)
+    df_packages.select("name").write_parquet(data_dir / config.EMBEDDINGS_NAMES_PARQUET_NAME)
+    embeddings = generate_embeddings(n_packages, dim, n_clusters=N_CLUSTERS if clustered else None)
+    np.save(data_dir / config.EMBEDDINGS_NPY_NAME, embeddings)
+
+
+def create_queries(n_queries: int) -> list:
+    # The queries are all different, so every query misses the query embedding and response caches.
+    return [f"library for parsing data number {i}" for i in range(n_queries)]
+
+
+def summarize_latencies(durations: list) -> dict:
+    durations_ms = np.array(durations) * 1000
+    return {
+        "p50_ms": float(np.percentile(durations_ms, 50)),
+        "p99_ms": float(np.percentile(durations_ms, 99)),
+        "mean_ms": float(durations_ms.mean()),
+    }
+
+
+def benchmark_find_similar(data_dir: Path, args: argparse.Namespace) -> dict:
+    config = Config(DATA_DIR=data_dir)
+    vector_database = SimpleVectorDatabase(
+        embeddings_model=StubEncoder(args.dim),
+        df_embeddings=pl.read_parquet(data_dir / config.EMBEDDINGS_NAMES_PARQUET_NAME),
+        embeddings_matrix=np.load(data_dir / config.EMBEDDINGS_NPY_NAME),
+        query_embedding_cache_size=0,
+    )
+    for query in create_queries(N_WARMUP_QUERIES):
+        vector_database.find_similar(query, top_k=TOP_K * 3)
+
+    durations, timers = [], []
+    for query in create_queries(args.n_queries):
+        timer = StageTimer()
+        start = time.perf_counter()
+        vector_database.find_similar(query, top_k=TOP_K * 3, timer=timer)
+        durations.append(time.perf_counter() - start)
+        timers.append(timer)
+
+    stages = {
+        f"{stage}_mean_ms": float(np.mean([timer.durations[stage] for timer in timers]) * 1000)
+        for stage in timers[0].durations
+    }
+    return {**summarize_latencies(durations), **stages}
+
+
+def benchmark_scoring(data_dir: Path, args: argparse.Namespace) -> dict:
+    df_packages = pl.read_csv(data_dir / Config(DATA_DIR=data_dir).DATASET_FOR_API_CSV_NAME)
+    package_metadata = PackageMetadata.from_packages(df_packages, df_packages["name"])
+    n_packages = len(df_packages)
+
+    # The candidates of a query are the rows of its top_k * 3 most similar packages, sorted by similarity.
+    rng = np.random.default_rng(0)
+    candidates = [
+        (
+            rng.choice(n_packages, size=min(TOP_K * 3, n_packages), replace=False),
+            np.sort(rng.random(min(TOP_K * 3, n_packages), dtype=np.float32))[::-1],
+        )
+        for _ in range(args.n_queries)
+    ]
+
+    scoring_durations, join_durations = [], []
+    for rows, similarities in candidates:
+        start = time.perf_counter()
+        scores = calculate_score_from_arrays(similarities, package_metadata.log_weekly_downloads[rows])
+        best = top_k_indices(scores, TOP_K)
+        scoring_durations.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        package_metadata.get_matches(rows[best], similarities[best])
+        join_durations.append(time.perf_counter() - start)
+
+    similarities = rng.random(n_packages, dtype=np.float32)
+    all_packages_durations = []
+    for _ in range(N_REPEATS):
+        start = time.perf_counter()
+        calculate_score_from_arrays(similarities, package_metadata.log_weekly_downloads)
+        all_packages_durations.append(time.perf_counter() - start)
+
+    return {
+        **{f"candidates_{name}": value for name, value in summarize_latencies(scoring_durations).items()},
+        **{f"join_{name}": value for name, value in summarize_latencies(join_durations).items()},
+        "all_packages_ms": float(np.median(all_packages_durations) * 1000),
+    }
+
+
+def benchmark_description_cleaner(data_dir: Path, args: argparse.Namespace) -> dict:
+    df = pl.read_csv(data_dir / Config(DATA_DIR=data_dir).RAW_DATASET_CSV_NAME, n_rows=args.max_text_rows)
+    df = df.select("description")
+
+    results = {"n_rows": len(df)}
+    for cleaner in [DescriptionCleaner(), FastDescriptionCleaner()]:
+        start = time.perf_counter()
+        cleaner.clean(df, "description", "description_cleaned")
+        results[f"{type(cleaner).__name__}_rows_per_s"] = len(df) / (time.perf_counter() - start)
+    return results
+
+
+def benchmark_raw_data_reader(data_dir: Path, args: argparse.Namespace) -> dict:
+    raw_dataset_path = data_dir / Config(DATA_DIR=data_dir).RAW_DATASET_CSV_NAME
+    start = time.perf_counter()
+    df = RawDataReader(raw_dataset_path).read()
+    duration = time.perf_counter() - start
+    return {
+        "read_s": duration,
+        "rows_per_s": len(df) / duration,
+        "file_mb": raw_dataset_path.stat().st_size / 1024**2,
+    }
+
+
+def benchmark_api_data_loader(data_dir: Path, args: argparse.Namespace) -> dict:
+    timer = StageTimer()
+    start = time.perf_counter()
+    ApiDataLoader(Config(DATA_DIR=data_dir), timer=timer).load_dataset()
+    duration = time.perf_counter() - start
+    return {"load_dataset_s": duration, **{f"{phase}_s": value for phase, value in timer.durations.items()}}
+
+
+def benchmark_api_search(data_dir: Path, args: argparse.Namespace) -> dict:
+    # The API is configured when its module is imported, so the configuration and the model are patched before that.
+    os.environ["SEARCH_RATE_LIMIT"] = "1000000/minute"
+    with patch("pypi_scout.config.Config", partial(Config, DATA_DIR=data_dir, SERVER_TIMING_HEADER=True)), patch(
+        "pypi_scout.embeddings.embeddings_model.load_embeddings_model", return_value=StubEncoder(args.dim)
+    ):
+        from fastapi.testclient import TestClient
+
+        import pypi_scout.api.main as api
+
+    with TestClient(api.app) as client:
+        for query in create_queries(N_WARMUP_QUERIES):
+            client.post("/api/search", json={"query": f"warmup {query}", "top_k": TOP_K})
+
+        durations, stages = [], {}
+        for query in create_queries(args.n_queries):
+            start = time.perf_counter()
+            response = client.post("/api/search", json={"query": query, "top_k": TOP_K})
+            durations.append(time.perf_counter() - start)
+            response.raise_for_status()
+            for entry in response.headers["Server-Timing"].split(", "):
+                stage, duration = entry.split(";dur=")
+                stages.setdefault(stage, []).append(float(duration))
+
+    return {**summarize_latencies(durations), **{f"{stage}_mean_ms": float(np.mean(d)) for stage, d in stages.items()}}
+
+
+def run_benchmark(benchmark: str, data_dir: Path, args: argparse.Namespace, results) -> None:
+    logging.disable(logging.INFO)
+    start = time.perf_counter()
+    metrics = globals()[f"benchmark_{benchmark}"](data_dir, args)
+    results[benchmark] = {
+        **metrics,
+        "total_s": time.perf_counter() - start,
+        "peak_memory_mb": get_peak_memory_usage_mb(),
+    }
+
+
+def get_metadata(args: argparse.Namespace) -> dict:
+    def git(*command: str) -> str:
+        try:
+            result = subprocess.run(["git", *command], capture_output=True, text=True, check=True)  # noqa: S603, S607
+            return result.stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return "unknown"
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "polars": pl.__version__,
+        "fastapi": fastapi.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """
+    Prints the change of every metric relative to the baseline, and returns the number of metrics that got worse by
+    more than `threshold`. Metrics that end in `_per_s` are better when higher, all other timings when lower.
+    """
+    baseline_metrics = {(run["benchmark"], run["n_packages"]): run["metrics"] for run in baseline["results"]}
+    print(f"\nCompared with commit {baseline['metadata']['commit']} ({baseline['metadata']['timestamp']}):")
+    print(f"{'benchmark':>20} | {'packages':>9} | {'metric':>36} | {'baseline':>10} | {'current':>10} | {'change':>8}")
+
+    n_regressions = 0
+    for run in results["results"]:
+        previous = baseline_metrics.get((run["benchmark"], run["n_packages"]))
+        if previous is None:
+            continue
+        for metric, value in run["metrics"].items():
+            if metric not in previous or metric.startswith("n_") or not previous[metric]:
+                continue
+            change = value / previous[metric] - 1
+            is_regression = -change > threshold if metric.endswith("_per_s") else change > threshold
+            n_regressions += is_regression
+            print(
+                f"{run['benchmark']:>20} | {run['n_packages']:>9,} | {metric:>36} | {previous[metric]:>10.3f} | "
+                f"{value:>10.3f} | {change:>+8.1%}{'  <- regression' if is_regression else ''}"
+            )
+    return n_regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of packages.")
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--embeddings", choices=["random", "clustered"], default="clustered")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="Dimension of the embeddings.")
+    parser.add_argument("--n-queries", type=int, default=N_QUERIES, help="Number of queries per latency benchmark.")
+    parser.add_argument("--max-text-rows", type=int, default=DEFAULT_MAX_TEXT_ROWS, help="Rows to clean at most.")
+    parser.add_argument("--output", type=Path, help="Path of the JSON results. Defaults to results/<commit>.json.")
+    parser.add_argument("--compare", type=Path, help="Path of the JSON results of a previous run to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change that counts as a regression.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    metadata = get_metadata(args)
+    # Polars is multi-threaded, so we use "spawn" rather than "fork" to start the processes.
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager()
+
+    runs = []
+    for n_packages in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_dir = Path(tmp_dir)
+            print(f"Generating {n_packages:,} packages with {args.embeddings} {args.dim}-dimensional embeddings...")
+            # The datasets are also written in a separate process: on Linux, the peak RSS of a process is inherited
+            # by the processes it starts, so the parent process should stay small.
+            with_raw_dataset = bool(TEXT_BENCHMARKS.intersection(args.benchmarks))
+            process = context.Process(
+                target=write_datasets,
+                args=(data_dir, n_packages, args.dim, args.embeddings == "clustered", with_raw_dataset),
+            )
+            process.start()
+            process.join()
+
+            for benchmark in args.benchmarks:
+                results = manager.dict()
+                process = context.Process(target=run_benchmark, args=(benchmark, data_dir, args, results))
+                process.start()
+                process.join()
+                if benchmark not in results:
+                    print(f"{benchmark:>20} | {n_packages:>9,} | failed with exit code {process.exitcode}")
+                    continue
+
+                metrics = dict(results[benchmark])
+                runs.append({"benchmark": benchmark, "n_packages": n_packages, "metrics": metrics})
+                summary = ", ".join(f"{name}={value:,.3f}" for name, value in metrics.items())
+                print(f"{benchmark:>20} | {n_packages:>9,} | {summary}")
+
+    output = args.output or RESULTS_DIR / f"{metadata['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    results = {"metadata": metadata, "results": runs}
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote the results to `{output}`.")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            n_regressions = compare(results, json.load(f), args.threshold)
+        print(f"{n_regressions} metrics regressed by more than {args.threshold:.0%}.")
+        if n_regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Micro-benchmark comparing a full `np.argsort` with the `np.argpartition` based top-k selection
+used by the vector indexes.
+
+Usage:
+    poetry run python benchmarks/benchmark_top_k.py
+"""
+
+import timeit
+
+import numpy as np
+
+from pypi_scout.embeddings.vector_index import top_k_indices
+
+N_ROWS = [100_000, 500_000, 1_000_000]
+TOP_K = 300
+N_REPEATS = 20
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>10} | {'argsort (ms)':>14} | {'argpartition (ms)':>18} | {'speedup':>8}")
+    for n_rows in N_ROWS:
+        similarities = rng.uniform(-1, 1, size=n_rows).astype(np.float32)
+
+        argsort_time = timeit.timeit(lambda s=similarities: np.argsort(s)[::-1][:TOP_K], number=N_REPEATS)
+        argpartition_time = timeit.timeit(lambda s=similarities: top_k_indices(s, TOP_K), number=N_REPEATS)
+
+        print(
+            f"{n_rows:>10,} | {argsort_time / N_REPEATS * 1000:>14.2f} | "
+            f"{argpartition_time / N_REPEATS * 1000:>18.2f} | {argsort_time / argpartition_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
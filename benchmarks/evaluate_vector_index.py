@@ -0,0 +1,90 @@
+"""
+Evaluates the recall@k and latency of the IVF vector index against the exact search, for a range of n_probe values.
+
+If `embeddings.parquet` exists in the configured data directory, its embeddings are used. Otherwise, synthetic
+clustered embeddings are generated. The queries are perturbed copies of randomly selected embeddings.
+
+Usage:
+    poetry run python benchmarks/evaluate_vector_index.py
+"""
+
+import time
+
+import numpy as np
+import polars as pl
+
+from pypi_scout.config import Config
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.embeddings.vector_index import ExactIndex, IVFIndex
+
+TOP_K = 30
+N_QUERIES = 200
+N_PROBES = [1, 4, 8, 16, 32, 64, 128]
+N_SYNTHETIC_ROWS = 200_000
+N_SYNTHETIC_CLUSTERS = 500
+EMBEDDING_DIM = 768
+
+
+def load_embeddings_matrix(config: Config) -> np.ndarray:
+    embeddings_path = config.DATA_DIR / config.EMBEDDINGS_PARQUET_NAME
+    if embeddings_path.exists():
+        print(f"Using embeddings from `{embeddings_path}`.")
+        return SimpleVectorDatabase.create_embeddings_matrix(pl.read_parquet(embeddings_path)["embeddings"])
+
+    print(f"`{embeddings_path}` not found. Using {N_SYNTHETIC_ROWS:,} synthetic clustered embeddings.")
+    rng = np.random.default_rng(0)
+    cluster_centers = rng.standard_normal((N_SYNTHETIC_CLUSTERS, EMBEDDING_DIM), dtype=np.float32)
+    embeddings = cluster_centers[rng.integers(N_SYNTHETIC_CLUSTERS, size=N_SYNTHETIC_ROWS)]
+    embeddings += rng.standard_normal(embeddings.shape, dtype=np.float32)
+    return SimpleVectorDatabase._normalize(embeddings)
+
+
+def create_queries(embeddings_matrix: np.ndarray) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    queries = embeddings_matrix[rng.integers(len(embeddings_matrix), size=N_QUERIES)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape, dtype=np.float32)
+    return SimpleVectorDatabase._normalize(queries)
+
+
+def evaluate(index, embeddings_matrix: np.ndarray, queries: np.ndarray) -> tuple:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        indices, _ = index.search(embeddings_matrix, query, TOP_K)
+        latencies.append(time.perf_counter() - start)
+        results.append(indices)
+    return results, np.array(latencies) * 1000
+
+
+def main():
+    config = Config()
+    embeddings_matrix = load_embeddings_matrix(config)
+    queries = create_queries(embeddings_matrix)
+
+    exact_results, exact_latencies = evaluate(ExactIndex(), embeddings_matrix, queries)
+
+    start = time.perf_counter()
+    centroids = IVFIndex.train_centroids(embeddings_matrix, n_lists=config.IVF_N_LISTS)
+    assignments = IVFIndex.assign(embeddings_matrix, centroids)
+    print(f"Built IVF index with {len(centroids):,} lists in {time.perf_counter() - start:.1f}s.\n")
+
+    print(f"{'index':>16} | {f'recall@{TOP_K}':>10} | {'p50 (ms)':>9} | {'p99 (ms)':>9}")
+    print(
+        f"{'exact':>16} | {1:>10.3f} | {np.percentile(exact_latencies, 50):>9.2f} | "
+        f"{np.percentile(exact_latencies, 99):>9.2f}"
+    )
+    for n_probe in N_PROBES:
+        if n_probe > len(centroids):
+            break
+        ivf_results, ivf_latencies = evaluate(IVFIndex(centroids, assignments, n_probe), embeddings_matrix, queries)
+        recall = np.mean(
+            [len(np.intersect1d(ivf, exact)) / len(exact) for ivf, exact in zip(ivf_results, exact_results)]
+        )
+        print(
+            f"{f'ivf n_probe={n_probe}':>16} | {recall:>10.3f} | {np.percentile(ivf_latencies, 50):>9.2f} | "
+            f"{np.percentile(ivf_latencies, 99):>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Load test for the `/api/search` endpoint of a running API. It sends searches from a number of concurrent clients,
+while polling `/api/health`, and reports the p50/p99 latencies and the number of rejected (503) requests.
+
+The search endpoint is rate limited per client IP, so start the API with a higher limit, for example:
+    SEARCH_RATE_LIMIT=100000/minute poetry run uvicorn pypi_scout.api.main:app
+
+Usage:
+    poetry run python benchmarks/load_test_search.py [--url http://localhost:8000] [--clients 16] [--requests 400]
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+QUERIES = [
+    "http client",
+    "dataframe library",
+    "plotting library for scientific figures",
+    "async web framework",
+    "command line argument parser",
+    "machine learning model serving",
+    "read and write excel files",
+    "orm for postgres",
+]
+
+
+async def run_client(client: httpx.AsyncClient, url: str, n_requests: int, offset: int, results: dict) -> None:
+    for i in range(n_requests):
+        query = f"{QUERIES[(offset + i) % len(QUERIES)]} {offset}-{i}"
+        start = time.perf_counter()
+        response = await client.post(f"{url}/api/search", json={"query": query, "top_k": 25})
+        results.setdefault(response.status_code, []).append(time.perf_counter() - start)
+
+
+async def poll_health(client: httpx.AsyncClient, url: str, latencies: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(f"{url}/api/health")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.1)
+
+
+def format_latencies(latencies: list) -> str:
+    latencies_ms = np.array(latencies) * 1000
+    return f"p50 {np.percentile(latencies_ms, 50):8.1f} ms | p99 {np.percentile(latencies_ms, 99):8.1f} ms"
+
+
+async def main(url: str, n_clients: int, n_requests: int) -> None:
+    results: dict = {}
+    health_latencies: list = []
+    stop = asyncio.Event()
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        health_task = asyncio.create_task(poll_health(client, url, health_latencies, stop))
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[run_client(client, url, n_requests // n_clients, offset, results) for offset in range(n_clients)]
+        )
+        duration = time.perf_counter() - start
+        stop.set()
+        await health_task
+
+    n_total = sum(len(latencies) for latencies in results.values())
+    print(f"{n_total} requests from {n_clients} concurrent clients in {duration:.1f}s ({n_total / duration:.1f} req/s)")
+    for status_code, latencies in sorted(results.items()):
+        print(f"  status {status_code}: {len(latencies):5} requests | {format_latencies(latencies)}")
+    print(f"  health checks: {len(health_latencies):5} requests | {format_latencies(health_latencies)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.clients, args.requests))
@@ -0,0 +1,123 @@
+"""
+Generators for synthetic data that resembles the PyPI dataset, shared by the benchmarks.
+"""
+
+import zlib
+from typing import Optional
+
+import numpy as np
+import polars as pl
+
+WORDS = (
+    "a fast simple library for parsing data with python async http client server api json yaml orm database "
+    "testing plugin command line tool machine learning model training image processing web framework utilities "
+    "configuration logging validation schema type hints support extension wrapper interface"
+).split()
+
+
+def _sentence(rng: np.random.Generator, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS, size=n_words)).capitalize() + "."
+
+
+def generate_description(rng: np.random.Generator, n_paragraphs: int) -> str:
+    """
+    Generates a package description in the style of a PyPI README: markdown headers, badges, images, links,
+    code blocks and lists, and occasionally some HTML.
+    """
+    name = rng.choice(WORDS)
+    parts = [
+        f"# {name}",
+        f"[![Build](https://github.com/user/{name}/actions/workflows/ci.yml/badge.svg)](https://github.com/user/{name}) "
+        f"[![PyPI](https://img.shields.io/pypi/v/{name}.svg)](https://pypi.org/project/{name}/)",
+    ]
+    for i in range(n_paragraphs):
+        kind = rng.integers(0, 6)
+        if kind == 0:
+            parts.append(f"## {_sentence(rng, 3)}")
+        elif kind == 1:
+            parts.append(f"![screenshot](https://raw.githubusercontent.com/user/{name}/main/docs/image_{i}.png)")
+        elif kind == 2:
+            parts.append(f"```python\nimport {name}\n{name}.run(debug=True)\n```")
+        elif kind == 3:
+            parts.append("\n".join(f"* {_sentence(rng, 5)}" for _ in range(3)))
+        elif kind == 4 and rng.random() < 0.3:
+            parts.append(f'<p align="center"><img src="logo.png" alt="{name}"></p>')
+        else:
+            parts.append(
+                f"{_sentence(rng, 12)} See [the documentation](https://{name}.readthedocs.io) or "
+                f"www.example.com/{name} for __more__ details. {_sentence(rng, 8)}"
+            )
+    return "\n\n".join(parts)
+
+
+def generate_descriptions(n_rows: int, seed: int = 0) -> list:
+    """
+    Generates n_rows descriptions with a long-tailed number of paragraphs, like real READMEs.
+    """
+    rng = np.random.default_rng(seed)
+    n_paragraphs = np.minimum(rng.geometric(0.1, size=n_rows), 100)
+    return [generate_description(rng, int(n)) for n in n_paragraphs]
+
+
+def generate_packages(n_rows: int, n_unique_descriptions: int = 20_000, seed: int = 0) -> pl.DataFrame:
+    """
+    Generates the packages of a raw dataset: name, summary, description and number_of_downloads. The weekly downloads
+    are log-normally distributed, like those on PyPI. Generating a description takes about half a millisecond, so for
+    large datasets, at most `n_unique_descriptions` descriptions are generated and repeated.
+    """
+    rng = np.random.default_rng(seed)
+    descriptions = generate_descriptions(min(n_rows, n_unique_descriptions), seed=seed)
+    return pl.DataFrame(
+        {
+            "name": [f"package-{i}" for i in range(n_rows)],
+            "summary": [f"A {WORDS[i % len(WORDS)]} library for {WORDS[(i * 7) % len(WORDS)]}" for i in range(n_rows)],
+            "description": [descriptions[i % len(descriptions)] for i in range(n_rows)],
+            "number_of_downloads": rng.lognormal(mean=6, sigma=3, size=n_rows).astype(np.int64),
+        }
+    )
+
+
+def generate_embeddings(
+    n_rows: int, dim: int, n_clusters: Optional[int] = None, seed: int = 0, chunk_size: int = 100_000
+) -> np.ndarray:
+    """
+    Generates an L2-normalized float32 embeddings matrix. The embeddings are either uniformly random, or, with
+    `n_clusters`, drawn around that many cluster centers, which is closer to real embeddings and to how the IVF
+    index partitions them. The matrix is generated in chunks, so the peak memory is not much more than the matrix.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim), dtype=np.float32) if n_clusters else None
+    embeddings = np.empty((n_rows, dim), dtype=np.float32)
+    for start in range(0, n_rows, chunk_size):
+        chunk = embeddings[start : start + chunk_size]
+        chunk[:] = rng.standard_normal(chunk.shape, dtype=np.float32)
+        if centers is not None:
+            chunk += 2 * centers[rng.integers(n_clusters, size=len(chunk))]
+        chunk /= np.linalg.norm(chunk, axis=1, keepdims=True)
+    return embeddings
+
+
+class StubEncoder:
+    """
+    Stands in for the embeddings model, so that the search can be measured without the cost of running a model. Every
+    text is encoded into a random vector that is seeded by the text, so the same query always gets the same embedding.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.max_seq_length = 512
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False, normalize_embeddings=False):
+        texts = [sentences] if isinstance(sentences, str) else sentences
+        embeddings = np.stack(
+            [
+                np.random.default_rng(zlib.crc32(text.encode())).standard_normal(self.dim, dtype=np.float32)
+                for text in texts
+            ]
+        )
+        if normalize_embeddings:
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings[0] if isinstance(sentences, str) else embeddings
@@ -1,78 +1,337 @@
 import logging
-from typing import Tuple
+import re
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
 
+import numpy as np
 import polars as pl
 
-from pypi_scout.config import Config, StorageBackend
+from pypi_scout.api.package_metadata import PackageMetadata
+from pypi_scout.config import Config, EmbeddingsQuantization, SearchMode, StorageBackend, VectorIndexType
+from pypi_scout.embeddings.bm25_index import BM25Index
+from pypi_scout.embeddings.quantized_embeddings import QuantizedEmbeddings
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.embeddings.vector_index import ExactIndex, IVFIndex, VectorIndex
 from pypi_scout.utils.blob_io import BlobIO
+from pypi_scout.utils.metrics import StageTimer
+
+# The names of the versions that `upload_processed_datasets` publishes, which sort in the order in which they were
+# created. Only directories with such a name are removed by `ApiDataLoader.remove_older_versions`.
+VERSION_PATTERN = re.compile(r"\d{8}T\d{6}Z(-\d{2})?")
+
+
+@dataclass
+class ApiDataset:
+    """
+    The datasets that the API needs. The rows of `embeddings_matrix` and `quantized_embeddings` are aligned
+    with the rows of `df_embeddings`.
+
+    If `embeddings_matrix` is None, the embeddings are stored in the `embeddings` column of `df_embeddings`.
+    `package_metadata` is created from `df_packages` once the embeddings are loaded, with rows aligned in the same way.
+
+    If the embeddings have multiple vectors per package, `row_to_package` contains the package index of every row, and
+    the rows of `package_metadata` are aligned with the packages in order of first occurrence instead.
+
+    `bm25_index` is only loaded with SearchMode.HYBRID. `bm25_document_rows` then holds the row of the package of every
+    document in the index, aligned like `package_metadata`, or -1 for packages that have no embedding.
+
+    `version` is the version of the datasets, or None if the datasets are not versioned.
+    """
+
+    df_packages: pl.DataFrame
+    df_embeddings: pl.DataFrame
+    embeddings_matrix: Optional[np.ndarray] = None
+    quantized_embeddings: Optional[QuantizedEmbeddings] = None
+    package_metadata: Optional[PackageMetadata] = None
+    row_to_package: Optional[np.ndarray] = None
+    bm25_index: Optional[BM25Index] = None
+    bm25_document_rows: Optional[np.ndarray] = None
+    version: Optional[str] = None
 
 
 class ApiDataLoader:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, version: Optional[str] = None, timer: Optional[StageTimer] = None):
+        """
+        Initializes the ApiDataLoader.
+
+        Args:
+            config (Config): The configuration.
+            version (Optional[str], optional): The version of the datasets to load, as returned by
+                `read_dataset_version`. The datasets are then read from the directory in DATA_DIR, or the prefix in the
+                blob container, with that name. If None, they are read from DATA_DIR or the root of the container.
+                Defaults to None.
+            timer (Optional[StageTimer], optional): Measures the phases of loading the datasets. Defaults to None.
+        """
         self.config = config
+        self.version = version
+        self.timer = timer or StageTimer()
+        self.data_dir = config.DATA_DIR / version if version is not None else config.DATA_DIR
+
+    @staticmethod
+    def read_dataset_version(config: Config) -> Optional[str]:
+        """
+        Returns the latest published version of the datasets, or None if config.VERSIONED_DATASETS is False.
+        """
+        if not config.VERSIONED_DATASETS:
+            return None
+
+        if config.STORAGE_BACKEND == StorageBackend.BLOB:
+            version = ApiDataLoader._create_blob_io(config).download_text(config.DATASET_VERSION_FILE_NAME)
+        else:
+            version = (config.DATA_DIR / config.DATASET_VERSION_FILE_NAME).read_text()
+        return version.strip()
 
-    def load_dataset(self) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    @staticmethod
+    def remove_older_versions(config: Config, version: str) -> None:
+        """
+        Removes the directories of the versions that were published before `version` from DATA_DIR and from the blob
+        cache. Newer versions are kept, since another worker of the API may be loading them. A worker that still
+        serves an older version keeps the files that it has memory-mapped until it swaps in the new version.
+        """
+        parent_dirs = [config.DATA_DIR]
+        if config.BLOB_CACHE_DIR_NAME is not None:
+            parent_dirs.append(config.DATA_DIR / config.BLOB_CACHE_DIR_NAME)
+
+        for parent_dir in parent_dirs:
+            if not parent_dir.is_dir():
+                continue
+            for version_dir in parent_dir.iterdir():
+                if not version_dir.is_dir() or not VERSION_PATTERN.fullmatch(version_dir.name):
+                    continue
+                if version_dir.name < version:
+                    logging.info(f"Removing older version `{version_dir.name}` of the datasets from `{parent_dir}`...")
+                    shutil.rmtree(version_dir, ignore_errors=True)
+
+    def load_dataset(self) -> ApiDataset:
+        """
+        Loads the packages dataset and the embeddings, and creates the package metadata with rows aligned to the
+        embeddings.
+
+        If config.MEMORY_MAP_EMBEDDINGS is True, the embeddings dataset only contains the package names, and the
+        embeddings are loaded as a read-only memory-mapped matrix with rows aligned to that dataset.
+        """
+        if self.version is not None:
+            logging.info(f"Loading version `{self.version}` of the datasets...")
         if self.config.STORAGE_BACKEND == StorageBackend.LOCAL:
-            df_packages, df_embeddings = self._load_local_dataset()
+            with self.timer.stage("read"):
+                dataset = self._load_local_dataset()
         elif self.config.STORAGE_BACKEND == StorageBackend.BLOB:
-            df_packages, df_embeddings = self._load_blob_dataset()
+            with self.timer.stage("download"):
+                dataset = self._load_blob_dataset()
         else:
             raise ValueError(f"Unexpected value found for STORAGE_BACKEND: {self.config.STORAGE_BACKEND}")  # noqa: TRY003
 
-        df_embeddings = self._drop_rows_from_embeddings_that_do_not_appear_in_packages(df_embeddings, df_packages)
-        return df_packages, df_embeddings
+        if self.config.EMBEDDINGS_QUANTIZATION != EmbeddingsQuantization.NONE:
+            with self.timer.stage("quantized_embeddings"):
+                dataset.quantized_embeddings = self._load_quantized_embeddings()
+
+        with self.timer.stage("package_metadata"):
+            dataset = self._drop_rows_from_embeddings_that_do_not_appear_in_packages(dataset)
+            package_names = dataset.df_embeddings["name"]
+            if "chunk_index" in dataset.df_embeddings.columns:
+                logging.info("The embeddings contain a vector per chunk of the package descriptions.")
+                package_names = package_names.unique(maintain_order=True)
+                dataset.row_to_package = self._get_rows_of_names(dataset.df_embeddings["name"], package_names)
+            dataset.package_metadata = PackageMetadata.from_packages(dataset.df_packages, package_names)
+
+        if self.config.SEARCH_MODE == SearchMode.HYBRID:
+            with self.timer.stage("bm25_index"):
+                dataset.bm25_index = self._load_bm25_index()
+                dataset.bm25_document_rows = self._get_rows_of_names(pl.Series(dataset.bm25_index.names), package_names)
+        dataset.version = self.version
+        return dataset
+
+    def load_vector_index(self, df_embeddings: pl.DataFrame) -> VectorIndex:
+        if self.config.VECTOR_INDEX_TYPE == VectorIndexType.EXACT:
+            return ExactIndex()
 
-    def _load_local_dataset(self) -> Tuple[pl.DataFrame, pl.DataFrame]:
-        packages_dataset_path = self.config.DATA_DIR / self.config.DATASET_FOR_API_CSV_NAME
-        embeddings_dataset_path = self.config.DATA_DIR / self.config.EMBEDDINGS_PARQUET_NAME
+        if self.config.VECTOR_INDEX_TYPE == VectorIndexType.IVF:
+            if "ivf_list" not in df_embeddings.columns:
+                raise ValueError(  # noqa: TRY003
+                    "The `embeddings` dataset has no `ivf_list` column. Re-run `create_vector_embeddings` with VECTOR_INDEX_TYPE set to IVF."
+                )
+            df_centroids = self._load_ivf_centroids()
+            centroids = SimpleVectorDatabase.create_embeddings_matrix(df_centroids["centroids"])
+            logging.info(
+                f"Using IVF vector index with {len(centroids):,} clusters and n_probe={self.config.IVF_N_PROBE}."
+            )
+            return IVFIndex(centroids, df_embeddings["ivf_list"].to_numpy(), n_probe=self.config.IVF_N_PROBE)
+
+        raise ValueError(f"Unexpected value found for VECTOR_INDEX_TYPE: {self.config.VECTOR_INDEX_TYPE}")  # noqa: TRY003
+
+    def _load_local_dataset(self) -> ApiDataset:
+        packages_dataset_path = self.data_dir / self.config.DATASET_FOR_API_CSV_NAME
 
         logging.info(f"Reading packages dataset from `{packages_dataset_path}`...")
         df_packages = pl.read_csv(packages_dataset_path)
         self._log_packages_dataset_info(df_packages)
 
+        if self.config.MEMORY_MAP_EMBEDDINGS:
+            embeddings_names_path = self.data_dir / self.config.EMBEDDINGS_NAMES_PARQUET_NAME
+            logging.info(f"Reading embeddings names from `{embeddings_names_path}`...")
+            df_embeddings = pl.read_parquet(embeddings_names_path)
+            self._log_embeddings_dataset_info(df_embeddings)
+            embeddings_matrix = self._memory_map_embeddings_matrix(self.data_dir / self.config.EMBEDDINGS_NPY_NAME)
+            return ApiDataset(df_packages, df_embeddings, embeddings_matrix)
+
+        embeddings_dataset_path = self.data_dir / self.config.EMBEDDINGS_PARQUET_NAME
         logging.info(f"Reading embeddings from `{embeddings_dataset_path}`...")
         df_embeddings = pl.read_parquet(embeddings_dataset_path)
         self._log_embeddings_dataset_info(df_embeddings)
 
-        return df_packages, df_embeddings
+        return ApiDataset(df_packages, df_embeddings)
 
-    def _load_blob_dataset(self) -> Tuple[pl.DataFrame, pl.DataFrame]:
-        blob_io = BlobIO(
-            self.config.STORAGE_BACKEND_BLOB_ACCOUNT_NAME,
-            self.config.STORAGE_BACKEND_BLOB_CONTAINER_NAME,
-            self.config.STORAGE_BACKEND_BLOB_KEY,
-        )
+    def _load_blob_dataset(self) -> ApiDataset:
+        blob_io = self._get_blob_io()
 
         logging.info(
             f"Downloading `{self.config.DATASET_FOR_API_CSV_NAME}` from container `{self.config.STORAGE_BACKEND_BLOB_CONTAINER_NAME}`..."
         )
-        df_packages = blob_io.download_csv_to_df(self.config.DATASET_FOR_API_CSV_NAME)
+        df_packages = blob_io.download_csv_to_df(self._get_blob_name(self.config.DATASET_FOR_API_CSV_NAME))
         self._log_packages_dataset_info(df_packages)
 
+        if self.config.MEMORY_MAP_EMBEDDINGS:
+            logging.info(
+                f"Downloading `{self.config.EMBEDDINGS_NAMES_PARQUET_NAME}` from container `{self.config.STORAGE_BACKEND_BLOB_CONTAINER_NAME}`..."
+            )
+            df_embeddings = blob_io.download_parquet_to_df(
+                self._get_blob_name(self.config.EMBEDDINGS_NAMES_PARQUET_NAME)
+            )
+            self._log_embeddings_dataset_info(df_embeddings)
+
+            embeddings_matrix_path = self._download_to_data_dir(blob_io, self.config.EMBEDDINGS_NPY_NAME)
+            embeddings_matrix = self._memory_map_embeddings_matrix(embeddings_matrix_path)
+            return ApiDataset(df_packages, df_embeddings, embeddings_matrix)
+
         logging.info(
             f"Downloading `{self.config.EMBEDDINGS_PARQUET_NAME}` from container `{self.config.STORAGE_BACKEND_BLOB_CONTAINER_NAME}`..."
         )
-        df_embeddings = blob_io.download_parquet_to_df(self.config.EMBEDDINGS_PARQUET_NAME)
+        df_embeddings = blob_io.download_parquet_to_df(self._get_blob_name(self.config.EMBEDDINGS_PARQUET_NAME))
         self._log_embeddings_dataset_info(df_embeddings)
 
-        return df_packages, df_embeddings
+        return ApiDataset(df_packages, df_embeddings)
+
+    def _load_quantized_embeddings(self) -> QuantizedEmbeddings:
+        file_names = [self.config.QUANTIZED_EMBEDDINGS_NPY_NAME, self.config.QUANTIZATION_SCALES_NPY_NAME]
+        if self.config.STORAGE_BACKEND == StorageBackend.BLOB:
+            blob_io = self._get_blob_io()
+            codes_path, scales_path = (self._download_to_data_dir(blob_io, file_name) for file_name in file_names)
+        else:
+            codes_path, scales_path = (self.data_dir / file_name for file_name in file_names)
+
+        logging.info(f"Memory-mapping quantized embeddings from `{codes_path}`...")
+        quantized_embeddings = QuantizedEmbeddings.load(codes_path, scales_path)
+        logging.info(
+            f"Memory-mapped quantized embeddings with shape {quantized_embeddings.shape} "
+            f"and dtype {quantized_embeddings.codes.dtype}."
+        )
+        return quantized_embeddings
+
+    def _load_bm25_index(self) -> BM25Index:
+        if self.config.STORAGE_BACKEND == StorageBackend.BLOB:
+            bm25_index_path = self._download_to_data_dir(self._get_blob_io(), self.config.BM25_INDEX_NPZ_NAME)
+        else:
+            bm25_index_path = self.data_dir / self.config.BM25_INDEX_NPZ_NAME
+
+        logging.info(f"Reading BM25 index from `{bm25_index_path}`...")
+        return BM25Index.load(bm25_index_path)
+
+    def _load_ivf_centroids(self) -> pl.DataFrame:
+        if self.config.STORAGE_BACKEND == StorageBackend.BLOB:
+            logging.info(
+                f"Downloading `{self.config.IVF_CENTROIDS_PARQUET_NAME}` from container `{self.config.STORAGE_BACKEND_BLOB_CONTAINER_NAME}`..."
+            )
+            return self._get_blob_io().download_parquet_to_df(
+                self._get_blob_name(self.config.IVF_CENTROIDS_PARQUET_NAME)
+            )
+
+        centroids_path = self.data_dir / self.config.IVF_CENTROIDS_PARQUET_NAME
+        logging.info(f"Reading IVF centroids from `{centroids_path}`...")
+        return pl.read_parquet(centroids_path)
+
+    def _download_to_data_dir(self, blob_io: BlobIO, file_name: str) -> Path:
+        # A memory map needs a file on disk, so these files are downloaded into the data directory. Every version is
+        # downloaded into its own directory, so the files that a previous version has memory-mapped are not overwritten.
+        local_file_path = self.data_dir / file_name
+        blob_name = self._get_blob_name(file_name)
+        logging.info(
+            f"Downloading `{blob_name}` from container `{self.config.STORAGE_BACKEND_BLOB_CONTAINER_NAME}` to `{local_file_path}`..."
+        )
+        blob_io.download_to_file(blob_name, local_file_path)
+        return local_file_path
+
+    def _get_blob_name(self, file_name: str) -> str:
+        return f"{self.version}/{file_name}" if self.version is not None else file_name
+
+    def _get_blob_io(self) -> BlobIO:
+        return self._create_blob_io(self.config)
+
+    @staticmethod
+    def _create_blob_io(config: Config) -> BlobIO:
+        return BlobIO(
+            config.STORAGE_BACKEND_BLOB_ACCOUNT_NAME,
+            config.STORAGE_BACKEND_BLOB_CONTAINER_NAME,
+            config.STORAGE_BACKEND_BLOB_KEY,
+            max_concurrency=config.BLOB_MAX_CONCURRENCY,
+            cache_dir=config.DATA_DIR / config.BLOB_CACHE_DIR_NAME if config.BLOB_CACHE_DIR_NAME is not None else None,
+        )
+
+    @staticmethod
+    def _memory_map_embeddings_matrix(path: Path) -> np.ndarray:
+        """
+        Memory-maps the embeddings matrix read-only. The pages are loaded lazily from the OS page cache,
+        which is shared between all worker processes that map the same file.
+        """
+        logging.info(f"Memory-mapping embeddings matrix from `{path}`...")
+        embeddings_matrix = np.load(path, mmap_mode="r")
+        logging.info(f"Memory-mapped embeddings matrix with shape {embeddings_matrix.shape}.")
+        return embeddings_matrix
+
+    @staticmethod
+    def _get_rows_of_names(names: pl.Series, package_names: pl.Series) -> np.ndarray:
+        # Returns the index of each name in `package_names`, or -1 if it does not occur there.
+        df_package_indices = pl.DataFrame({"name": package_names, "package_index": np.arange(len(package_names))})
+        df_names = pl.DataFrame({"name": names}).join(df_package_indices, on="name", how="left", coalesce=True)
+        return df_names["package_index"].fill_null(-1).to_numpy()
 
     @staticmethod
     def _log_packages_dataset_info(df_packages: pl.DataFrame) -> None:
-        logging.info(f"Finished loading the `packages` dataset. Number of rows in dataset: {len(df_packages):,}")
-        logging.info(df_packages.describe())
+        ApiDataLoader._log_dataset_info("packages", df_packages)
 
     @staticmethod
     def _log_embeddings_dataset_info(df_embeddings: pl.DataFrame) -> None:
-        logging.info(f"Finished loading the `embeddings` dataset. Number of rows in dataset: {len(df_embeddings):,}")
-        logging.info(df_embeddings.describe())
+        ApiDataLoader._log_dataset_info("embeddings", df_embeddings)
+
+    @staticmethod
+    def _log_dataset_info(dataset_name: str, df: pl.DataFrame) -> None:
+        logging.info(
+            f"Finished loading the `{dataset_name}` dataset. Number of rows in dataset: {len(df):,}. "
+            f"Columns: {df.columns}. Estimated size: {df.estimated_size('mb'):,.1f} MB"
+        )
+        # Describing the dataset computes statistics over every column, which takes seconds for the full datasets,
+        # so it is only done when debug logging is enabled.
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(df.describe())
 
     @staticmethod
-    def _drop_rows_from_embeddings_that_do_not_appear_in_packages(df_embeddings, df_packages):
+    def _drop_rows_from_embeddings_that_do_not_appear_in_packages(dataset: ApiDataset) -> ApiDataset:
         # We only keep the packages in the vector dataset that also occur in the packages dataset.
         # In theory, this should never drop something. But still good to keep as a fail-safe to prevent issues in the API.
         logging.info("Dropping packages in the `embeddings` dataset that do not occur in the `packages` dataset...")
-        logging.info(f"Number of rows before dropping: {len(df_embeddings):,}...")
-        df_embeddings = df_embeddings.join(df_packages, on="name", how="semi")
-        logging.info(f"Number of rows after dropping: {len(df_embeddings):,}...")
-        return df_embeddings
+        logging.info(f"Number of rows before dropping: {len(dataset.df_embeddings):,}...")
+        mask = dataset.df_embeddings["name"].is_in(dataset.df_packages["name"])
+        if not mask.all():
+            dataset.df_embeddings = dataset.df_embeddings.filter(mask)
+            # This copies the selected rows into memory, so the matrices are no longer shared between workers.
+            if dataset.embeddings_matrix is not None:
+                logging.warning("Rows were dropped, so the embeddings matrix is copied out of its memory map.")
+                dataset.embeddings_matrix = np.ascontiguousarray(dataset.embeddings_matrix[mask.to_numpy()])
+            if dataset.quantized_embeddings is not None:
+                dataset.quantized_embeddings = QuantizedEmbeddings(
+                    np.ascontiguousarray(dataset.quantized_embeddings.codes[mask.to_numpy()]),
+                    dataset.quantized_embeddings.scales,
+                )
+        logging.info(f"Number of rows after dropping: {len(dataset.df_embeddings):,}...")
+        return dataset
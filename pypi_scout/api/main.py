@@ -1,23 +1,35 @@
 import logging
+import secrets
+import time
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from sentence_transformers import SentenceTransformer
+from fastapi.responses import PlainTextResponse, Response
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 from starlette.requests import Request
 
 from pypi_scout.api.data_loader import ApiDataLoader
-from pypi_scout.api.models import QueryModel, SearchResponse
+from pypi_scout.api.models import BatchQueryModel, BatchSearchResponse, QueryModel, SearchResponse
+from pypi_scout.api.query_batcher import QueryBatcher
+from pypi_scout.api.search_executor import SearchExecutor, SearchQueueFullError
+from pypi_scout.api.search_snapshot import SearchSnapshot, SnapshotReloader, create_search_snapshot
 from pypi_scout.config import Config
+from pypi_scout.embeddings.embeddings_model import load_embeddings_model
 from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.embeddings.vector_index import top_k_indices
 from pypi_scout.utils.logging import setup_logging
-from pypi_scout.utils.score_calculator import calculate_score
+from pypi_scout.utils.memory import get_peak_memory_usage_mb
+from pypi_scout.utils.metrics import MetricsRegistry, StageTimer
+from pypi_scout.utils.score_calculator import calculate_score_from_arrays
 
 setup_logging()
 logging.info("Initializing backend...")
+startup_start = time.perf_counter()
 
 limiter = Limiter(key_func=get_remote_address)
 app = FastAPI()
@@ -27,6 +39,42 @@ app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 load_dotenv()
 config = Config()
 
+# Upper bounds in seconds of the histogram buckets for the phases of loading the model and the datasets.
+LOAD_PHASE_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+metrics = MetricsRegistry()
+http_requests = metrics.counter(
+    "pypi_scout_http_requests_total", "Number of HTTP requests by route and status code.", ["method", "path", "status"]
+)
+http_request_duration = metrics.histogram(
+    "pypi_scout_http_request_duration_seconds", "Duration of HTTP requests by route.", ["method", "path"]
+)
+search_stage_duration = metrics.histogram(
+    "pypi_scout_search_stage_seconds",
+    "Duration of the stages of the searches. Encoding and similarity are measured once per batch of queries.",
+    ["stage"],
+)
+response_cache_requests = metrics.counter(
+    "pypi_scout_response_cache_requests_total", "Number of lookups in the search response cache.", ["result"]
+)
+load_phase_duration = metrics.histogram(
+    "pypi_scout_load_phase_seconds",
+    "Duration of the phases of loading the model and every version of the datasets.",
+    ["phase"],
+    buckets=LOAD_PHASE_BUCKETS,
+)
+
+
+def _create_load_timer() -> StageTimer:
+    return StageTimer(observe=lambda phase, seconds: load_phase_duration.observe(seconds, phase=phase))
+
+
+def _create_search_timer(durations: Optional[Dict[str, float]] = None) -> StageTimer:
+    return StageTimer(
+        observe=lambda stage, seconds: search_stage_duration.observe(seconds, stage=stage), durations=durations
+    )
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -35,15 +83,90 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-data_loader = ApiDataLoader(config)
-df_packages, df_embeddings = data_loader.load_dataset()
+# The model does not depend on the datasets, so it is loaded once and shared by every snapshot of the datasets.
+startup_timer = _create_load_timer()
+with startup_timer.stage("model"):
+    model = load_embeddings_model(config, download=True)
+snapshot_reloader = SnapshotReloader(
+    create_search_snapshot(config, model, ApiDataLoader.read_dataset_version(config), timer=startup_timer),
+    load_snapshot=lambda version: create_search_snapshot(config, model, version, timer=_create_load_timer()),
+    get_latest_version=lambda: ApiDataLoader.read_dataset_version(config),
+    remove_older_versions=lambda version: ApiDataLoader.remove_older_versions(config, version),
+)
+if config.DATASET_RELOAD_INTERVAL_SECONDS is not None:
+    if not config.VERSIONED_DATASETS:
+        raise ValueError("DATASET_RELOAD_INTERVAL_SECONDS requires VERSIONED_DATASETS.")  # noqa: TRY003
+    snapshot_reloader.start_watching(config.DATASET_RELOAD_INTERVAL_SECONDS)
+
+search_executor = SearchExecutor(
+    max_concurrency=config.SEARCH_MAX_CONCURRENCY, max_queue_size=config.SEARCH_MAX_QUEUE_SIZE
+)
+query_batcher = QueryBatcher(
+    process_batch=lambda queries: _search_batch_with_durations(queries),
+    executor=search_executor,
+    max_batch_size=config.SEARCH_BATCH_MAX_SIZE,
+    max_wait_ms=config.SEARCH_BATCH_MAX_WAIT_MS,
+)
+
+logging.info(
+    f"Backend initialized in {time.perf_counter() - startup_start:.1f}s. "
+    f"Peak memory usage: {get_peak_memory_usage_mb():,.0f} MB"
+)
+
 
-model = SentenceTransformer(config.EMBEDDINGS_MODEL_NAME)
-vector_database = SimpleVectorDatabase(embeddings_model=model, df_embeddings=df_embeddings)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # The path of the matched route rather than the requested path, so that the number of label values is bounded.
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    http_request_duration.observe(time.perf_counter() - start, method=request.method, path=path)
+    http_requests.inc(method=request.method, path=path, status=str(response.status_code))
+    return response
+
+
+@app.on_event("shutdown")
+def shutdown_search_executor():
+    snapshot_reloader.stop_watching()
+    search_executor.shutdown()
+
+
+@app.get("/api/health")
+async def health():
+    return {"status": "ok", "dataset_version": snapshot_reloader.snapshot.version}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Returns the request, search stage, response cache and loading metrics in the Prometheus text exposition format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/api/admin/reload", status_code=202)
+async def reload_datasets(request: Request, force: bool = False):
+    """
+    Loads the latest version of the datasets in the background, and swaps it in once it is loaded. Requests are served
+    from the current version until then. With `force`, the datasets are reloaded even if the version is unchanged.
+    Requires the ADMIN_TOKEN as bearer token, and is disabled if no ADMIN_TOKEN is configured.
+    """
+    if config.ADMIN_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    authorization = request.headers.get("Authorization", "")
+    if not secrets.compare_digest(authorization.encode(), f"Bearer {config.ADMIN_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+    started = snapshot_reloader.reload_in_background(force=force)
+    return {
+        "status": "started" if started else "already_reloading",
+        "dataset_version": snapshot_reloader.snapshot.version,
+    }
 
 
 @app.post("/api/search", response_model=SearchResponse)
-@limiter.limit("6/minute")
+@limiter.limit(config.SEARCH_RATE_LIMIT)
 async def search(query: QueryModel, request: Request):
     """
     Search for the packages whose summary and description have the highest similarity to the query.
@@ -54,21 +177,147 @@ async def search(query: QueryModel, request: Request):
     if query.top_k > 100:
         raise HTTPException(status_code=400, detail="top_k cannot be larger than 100.")
 
-    logging.info(f"Searching for similar projects. Query: '{query.query}'")
-    df_matches = vector_database.find_similar(query.query, top_k=int(query.top_k * 3))
-    df_matches = df_matches.join(df_packages, how="left", on="name")
-    logging.info(
-        f"Fetched the {len(df_matches)} most similar projects. Calculating the weighted scores and filtering..."
+    # The response cache belongs to the snapshot, so it is replaced together with the datasets.
+    response_cache = snapshot_reloader.snapshot.response_cache
+    cache_key = (
+        SimpleVectorDatabase.normalize_query(query.query),
+        query.top_k,
+        config.WEIGHT_SIMILARITY,
+        config.WEIGHT_WEEKLY_DOWNLOADS,
     )
+    cached_response = response_cache.get(cache_key)
+    if response_cache.max_size > 0:
+        response_cache_requests.inc(result="hit" if cached_response is not None else "miss")
+    if cached_response is not None:
+        return _create_json_response(cached_response, _create_search_timer())
+
+    # Encoding the query and searching is CPU-bound, so the query batcher runs it in the search executor to keep
+    # the event loop free. Queries that arrive close together are encoded and searched as a single batch.
+    try:
+        response, search_durations = await query_batcher.submit(query)
+    except SearchQueueFullError:
+        logging.warning(f"Search queue is full with {search_executor.n_pending} pending batches. Rejecting request.")
+        raise HTTPException(status_code=503, detail="The server is busy. Please try again later.") from None
+
+    response_cache.put(cache_key, response)
+    return _create_json_response(response, _create_search_timer(search_durations))
 
-    df_matches = calculate_score(
-        df_matches, weight_similarity=config.WEIGHT_SIMILARITY, weight_weekly_downloads=config.WEIGHT_WEEKLY_DOWNLOADS
+
+@app.post("/api/search/batch", response_model=BatchSearchResponse)
+@limiter.limit(config.BATCH_SEARCH_RATE_LIMIT)
+async def search_batch(batch: BatchQueryModel, request: Request):
+    """
+    Search for the best matches for multiple queries at once. The queries are encoded with a single call to the model,
+    compared to the embeddings with a single matrix multiplication, and scored together.
+    The results are returned in the same order as the queries.
+    """
+
+    if len(batch.queries) > config.BATCH_SEARCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400, detail=f"A batch cannot contain more than {config.BATCH_SEARCH_MAX_QUERIES} queries."
+        )
+    if not batch.queries:
+        return BatchSearchResponse(results=[])
+    if any(query.top_k > 100 for query in batch.queries):
+        raise HTTPException(status_code=400, detail="top_k cannot be larger than 100.")
+
+    # The batch is already complete, so it bypasses the query batcher and runs directly in the search executor.
+    try:
+        responses, _ = await search_executor.run(_search_batch, batch.queries)
+    except SearchQueueFullError:
+        logging.warning(f"Search queue is full with {search_executor.n_pending} pending batches. Rejecting request.")
+        raise HTTPException(status_code=503, detail="The server is busy. Please try again later.") from None
+
+    return BatchSearchResponse(results=responses)
+
+
+def _create_json_response(response: SearchResponse, timer: StageTimer) -> Response:
+    # The response is serialized here rather than by FastAPI, so that the serialization is measured as well.
+    with timer.stage("serialization"):
+        body = response.model_dump_json()
+    headers = {"Server-Timing": timer.server_timing()} if config.SERVER_TIMING_HEADER else None
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _search_batch_with_durations(queries: List[QueryModel]) -> List[Tuple[SearchResponse, Dict[str, float]]]:
+    # Every query in the batch is reported with the durations of the stages of the whole batch.
+    responses, timer = _search_batch(queries)
+    return [(response, timer.durations) for response in responses]
+
+
+def _search_batch(queries: List[QueryModel]) -> Tuple[List[SearchResponse], StageTimer]:
+    logging.info(f"Searching for similar projects. Queries: {[query.query for query in queries]}")
+    timer = _create_search_timer()
+    # The snapshot is taken once, so the whole batch is searched in the same version of the datasets, even if a new
+    # version is swapped in meanwhile.
+    snapshot = snapshot_reloader.snapshot
+    vector_database = snapshot.vector_database
+    package_metadata = snapshot.package_metadata
+    # Fetch enough matches for the query with the largest top_k. The matches are sorted by similarity,
+    # so the matches for the other queries are the first rows.
+    top_k = max(query.top_k for query in queries)
+    if snapshot.popularity_ranker is not None:
+        with timer.stage("encode"):
+            query_embeddings = vector_database.encode_queries([query.query for query in queries])
+        with timer.stage("similarity"):
+            ranked = snapshot.popularity_ranker.rank(query_embeddings, top_k=top_k, n_candidates=int(top_k * 3))
+        with timer.stage("join"):
+            responses = [
+                SearchResponse(matches=package_metadata.get_matches(rows[: query.top_k], similarities[: query.top_k]))
+                for (rows, similarities), query in zip(ranked, queries)
+            ]
+    elif snapshot.hybrid_searcher is not None:
+        matches = snapshot.hybrid_searcher.search_batch(
+            [query.query for query in queries], n_candidates=int(top_k * 3), timer=timer
+        )
+        responses = [
+            _create_search_response(
+                snapshot,
+                rows[: int(query.top_k * 3)],
+                similarities[: int(query.top_k * 3)],
+                query,
+                timer,
+                relevance=fused_scores[: int(query.top_k * 3)],
+            )
+            for (rows, fused_scores, similarities), query in zip(matches, queries)
+        ]
+    else:
+        matches = vector_database.find_similar_indices_batch(
+            [query.query for query in queries], top_k=int(top_k * 3), timer=timer
+        )
+        responses = [
+            _create_search_response(
+                snapshot, rows[: int(query.top_k * 3)], similarities[: int(query.top_k * 3)], query, timer
+            )
+            for (rows, similarities), query in zip(matches, queries)
+        ]
+
+    logging.info(
+        f"Returning the best matches. Stages: {timer.server_timing()}. "
+        f"Query embedding cache: {vector_database.query_embedding_cache.stats()}. "
+        f"Query batcher: {query_batcher.stats()}"
     )
-    df_matches = df_matches.sort("score", descending=True)
+    return responses, timer
 
-    if len(df_matches) > query.top_k:
-        df_matches = df_matches.head(query.top_k)
 
-    logging.info(f"Returning the {len(df_matches)} best matches.")
-    df_matches = df_matches.select(["name", "similarity", "summary", "weekly_downloads"])
-    return SearchResponse(matches=df_matches.to_dicts())
+def _create_search_response(
+    snapshot: SearchSnapshot,
+    rows: np.ndarray,
+    similarities: np.ndarray,
+    query: QueryModel,
+    timer: StageTimer,
+    relevance: Optional[np.ndarray] = None,
+) -> SearchResponse:
+    package_metadata = snapshot.package_metadata
+    # The package metadata is aligned with the embeddings matrix, so the rows of the matches index it directly.
+    # With hybrid search, the fused score is the relevance that is weighted against the weekly downloads.
+    with timer.stage("scoring"):
+        scores = calculate_score_from_arrays(
+            relevance if relevance is not None else similarities,
+            package_metadata.log_weekly_downloads[rows],
+            weight_similarity=config.WEIGHT_SIMILARITY,
+            weight_weekly_downloads=config.WEIGHT_WEEKLY_DOWNLOADS,
+        )
+        best = top_k_indices(scores, query.top_k)
+    with timer.stage("join"):
+        return SearchResponse(matches=package_metadata.get_matches(rows[best], similarities[best]))
@@ -6,6 +6,10 @@ class QueryModel(BaseModel):
     top_k: int
 
 
+class BatchQueryModel(BaseModel):
+    queries: list[QueryModel]
+
+
 class Match(BaseModel):
     name: str
     summary: str
@@ -17,3 +21,7 @@ class SearchResponse(BaseModel):
     matches: list[Match]
     warning: bool = False
     warning_message: str = None
+
+
+class BatchSearchResponse(BaseModel):
+    results: list[SearchResponse]
@@ -0,0 +1,61 @@
+import logging
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+import polars as pl
+
+
+@dataclass
+class PackageMetadata:
+    """
+    The package metadata that the API returns and scores, stored as NumPy arrays with rows aligned to the rows of the
+    embeddings matrix. The metadata of the matches of a search can then be gathered with the row indices that the vector
+    index returns, without joining on the package name.
+
+    `log_weekly_downloads` holds log1p(weekly_downloads), so it does not need to be computed per request.
+    """
+
+    name: np.ndarray
+    summary: np.ndarray
+    weekly_downloads: np.ndarray
+    log_weekly_downloads: np.ndarray
+
+    @classmethod
+    def from_packages(cls, df_packages: pl.DataFrame, names: pl.Series) -> "PackageMetadata":
+        """
+        Creates the metadata for the packages in `names`, in the same order.
+
+        Args:
+            df_packages (pl.DataFrame): DataFrame with 'name', 'summary' and 'weekly_downloads' columns.
+            names (pl.Series): The package names, in the order of the rows of the embeddings matrix.
+        """
+        # A left join keeps the order of the left DataFrame. Duplicate names would add rows and break the alignment.
+        df = names.to_frame("name").join(
+            df_packages.unique("name", keep="first", maintain_order=True), how="left", on="name", coalesce=True
+        )
+        logging.info(f"Created row-aligned package metadata for {len(df):,} packages.")
+        weekly_downloads = df["weekly_downloads"].fill_null(0).to_numpy()
+        return cls(
+            name=df["name"].to_numpy(),
+            summary=df["summary"].to_numpy(),
+            weekly_downloads=weekly_downloads,
+            log_weekly_downloads=np.log1p(weekly_downloads).astype(np.float32),
+        )
+
+    def __len__(self) -> int:
+        return len(self.name)
+
+    def get_matches(self, rows: np.ndarray, similarities: np.ndarray) -> List[dict]:
+        """
+        Returns the name, summary and weekly downloads of the packages in `rows`, together with their similarity.
+        """
+        return [
+            {"name": name, "summary": summary, "similarity": similarity, "weekly_downloads": weekly_downloads}
+            for name, summary, similarity, weekly_downloads in zip(
+                self.name[rows].tolist(),
+                self.summary[rows].tolist(),
+                similarities.tolist(),
+                self.weekly_downloads[rows].tolist(),
+            )
+        ]
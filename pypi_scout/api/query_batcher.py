@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, List, Tuple
+
+from pypi_scout.api.search_executor import SearchExecutor
+
+
+class QueryBatcher:
+    """
+    Coalesces queries that arrive close together into batches, so that they can be encoded and searched
+    with a single forward pass of the embeddings model and a single matrix-matrix product.
+
+    A batch is processed as soon as it contains `max_batch_size` queries, or `max_wait_ms` milliseconds after its first
+    query arrived, whichever comes first. Batches are processed by `process_batch` in the `SearchExecutor`, which should
+    return one result per query, in the same order. Each caller of `submit` receives its own result.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        executor: SearchExecutor,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+    ):
+        self.process_batch = process_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        # Only accessed from the event loop thread, so these do not need a lock.
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self._flush_handle = None
+        self._tasks: set = set()
+
+        self.n_batches = 0
+        self.n_queries = 0
+        self.largest_batch_size = 0
+        self.total_wait_ms = 0.0
+        self.longest_wait_ms = 0.0
+
+    async def submit(self, query: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.n_batches,
+            "queries": self.n_queries,
+            "mean_batch_size": self.n_queries / self.n_batches if self.n_batches else 0.0,
+            "largest_batch_size": self.largest_batch_size,
+            "mean_wait_ms": self.total_wait_ms / self.n_queries if self.n_queries else 0.0,
+            "longest_wait_ms": self.longest_wait_ms,
+        }
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        self._record_batch(batch)
+        # Keep a reference to the task, so that it is not garbage collected before it is done.
+        task = asyncio.ensure_future(self._process(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, batch: List[Tuple[Any, asyncio.Future, float]]) -> None:
+        try:
+            results = await self.executor.run(self.process_batch, [query for query, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            # The future is done if the client disconnected and the request was cancelled.
+            if not future.done():
+                future.set_result(result)
+
+    def _record_batch(self, batch: List[Tuple[Any, asyncio.Future, float]]) -> None:
+        now = time.perf_counter()
+        wait_times_ms = [(now - enqueued_at) * 1000 for _, _, enqueued_at in batch]
+
+        self.n_batches += 1
+        self.n_queries += len(batch)
+        self.largest_batch_size = max(self.largest_batch_size, len(batch))
+        self.total_wait_ms += sum(wait_times_ms)
+        self.longest_wait_ms = max(self.longest_wait_ms, *wait_times_ms)
+        logging.info(f"Processing a batch of {len(batch)} queries, after waiting up to {max(wait_times_ms):.1f} ms.")
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class SearchQueueFullError(Exception):
+    """
+    Raised when a task is submitted to a `SearchExecutor` whose queue is full.
+    """
+
+
+class SearchExecutor:
+    """
+    Runs CPU-bound search work in a bounded thread pool, so that it does not block the asyncio event loop.
+
+    At most `max_concurrency` tasks run at the same time, and at most `max_queue_size` tasks wait for a free thread.
+    Submitting a task beyond that raises a `SearchQueueFullError`, so that callers can shed load instead of
+    letting latency grow without bound. The encoding model, NumPy and Polars release the GIL during the heavy work,
+    so the threads run in parallel.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue_size: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="search")
+        # Decremented by the thread that completes a task, so it is guarded by a lock.
+        self._n_pending = 0
+        self._n_pending_lock = threading.Lock()
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        with self._n_pending_lock:
+            if self._n_pending >= self.max_concurrency + self.max_queue_size:
+                raise SearchQueueFullError()
+            self._n_pending += 1
+
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._release()
+            raise
+        # A task is only released when it is done, rather than when the awaiting coroutine is cancelled, for example
+        # because the client disconnected, since a task that is already running keeps its thread until it returns.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future: Optional[Future] = None) -> None:
+        with self._n_pending_lock:
+            self._n_pending -= 1
+
+    @property
+    def n_pending(self) -> int:
+        """
+        The number of tasks that are running or waiting for a free thread.
+        """
+        return self._n_pending
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
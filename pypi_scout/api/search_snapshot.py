@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from pypi_scout.api.data_loader import ApiDataLoader
+from pypi_scout.api.package_metadata import PackageMetadata
+from pypi_scout.config import Config, RankingMode, SearchMode
+from pypi_scout.embeddings.embeddings_model import EmbeddingsModel
+from pypi_scout.embeddings.hybrid_search import HybridSearcher
+from pypi_scout.embeddings.popularity_ranker import PopularityRanker
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.utils.lru_cache import LRUCache
+from pypi_scout.utils.metrics import StageTimer
+
+
+@dataclass
+class SearchSnapshot:
+    """
+    Everything that the API searches for a single version of the datasets. A request takes the current snapshot once,
+    and uses only that snapshot, so a request that is in flight while a new version is swapped in is completed with the
+    version that it started with.
+
+    The response cache belongs to the snapshot, so it never serves results from a previously loaded version.
+    """
+
+    version: Optional[str]
+    package_metadata: PackageMetadata
+    vector_database: SimpleVectorDatabase
+    popularity_ranker: Optional[PopularityRanker] = None
+    hybrid_searcher: Optional[HybridSearcher] = None
+    response_cache: LRUCache = field(default_factory=lambda: LRUCache(0))
+
+
+def create_search_snapshot(
+    config: Config, model: EmbeddingsModel, version: Optional[str], timer: Optional[StageTimer] = None
+) -> SearchSnapshot:
+    """
+    Loads the given version of the datasets, and creates the vector database and rankers that search them. The model is
+    shared between snapshots, since it does not depend on the datasets. The phases of loading the datasets and creating
+    the vector database are measured with `timer`, if given.
+    """
+    timer = timer or StageTimer()
+    data_loader = ApiDataLoader(config, version, timer=timer)
+    dataset = data_loader.load_dataset()
+    with timer.stage("vector_index"):
+        vector_index = data_loader.load_vector_index(dataset.df_embeddings)
+    with timer.stage("embeddings_matrix"):
+        vector_database = SimpleVectorDatabase(
+            embeddings_model=model,
+            df_embeddings=dataset.df_embeddings,
+            vector_index=vector_index,
+            embeddings_matrix=dataset.embeddings_matrix,
+            quantized_embeddings=dataset.quantized_embeddings,
+            rescore_multiplier=config.RESCORE_MULTIPLIER,
+            query_embedding_cache_size=config.QUERY_EMBEDDING_CACHE_SIZE,
+            row_to_package=dataset.row_to_package,
+        )
+
+    # With a global ranking mode, the packages are ranked by similarity and popularity over the full catalog,
+    # rather than by re-ranking the most similar candidates.
+    popularity_ranker = None
+    if config.RANKING_MODE != RankingMode.CANDIDATES:
+        popularity_ranker = PopularityRanker(
+            vector_database,
+            dataset.package_metadata.log_weekly_downloads,
+            weight_similarity=config.GLOBAL_RANKING_WEIGHT_SIMILARITY,
+            weight_weekly_downloads=config.GLOBAL_RANKING_WEIGHT_WEEKLY_DOWNLOADS,
+            early_exit=config.RANKING_MODE == RankingMode.GLOBAL_EARLY_EXIT,
+            block_size=config.GLOBAL_RANKING_BLOCK_SIZE,
+        )
+
+    # With the hybrid search mode, the candidates of the vector search are fused with those of a BM25 index.
+    hybrid_searcher = None
+    if config.SEARCH_MODE == SearchMode.HYBRID:
+        if popularity_ranker is not None:
+            raise ValueError("SearchMode.HYBRID requires RankingMode.CANDIDATES.")  # noqa: TRY003
+        hybrid_searcher = HybridSearcher(
+            vector_database,
+            dataset.bm25_index,
+            dataset.bm25_document_rows,
+            dataset.package_metadata.name,
+            rrf_k=config.RRF_K,
+        )
+
+    logging.info(f"Loaded version `{dataset.version}` of the datasets. Phases: {timer.summary()}")
+    return SearchSnapshot(
+        version=dataset.version,
+        package_metadata=dataset.package_metadata,
+        vector_database=vector_database,
+        popularity_ranker=popularity_ranker,
+        hybrid_searcher=hybrid_searcher,
+        response_cache=LRUCache(config.RESPONSE_CACHE_SIZE),
+    )
+
+
+class SnapshotReloader:
+    """
+    Holds the current `SearchSnapshot`, and replaces it with a new one when a new version of the datasets is published.
+
+    The new snapshot is loaded next to the current one, which keeps serving requests, and is then swapped in with a
+    single assignment. The previous snapshot is released once the last request that uses it is completed. If loading
+    the new snapshot fails, the current snapshot is kept. At most one snapshot is loaded at a time.
+
+    After a version is swapped in, the files of older versions are removed with `remove_older_versions`, if given.
+    """
+
+    def __init__(
+        self,
+        snapshot: SearchSnapshot,
+        load_snapshot: Callable[[Optional[str]], SearchSnapshot],
+        get_latest_version: Callable[[], Optional[str]],
+        remove_older_versions: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        Initializes the SnapshotReloader.
+
+        Args:
+            snapshot (SearchSnapshot): The snapshot to serve until the first reload.
+            load_snapshot (Callable[[Optional[str]], SearchSnapshot]): Loads the snapshot of a version.
+            get_latest_version (Callable[[], Optional[str]]): Returns the latest published version, or None if the
+                datasets are not versioned.
+            remove_older_versions (Optional[Callable[[str], None]], optional): Removes the files of the versions
+                that are older than the version that was swapped in. Defaults to None.
+        """
+        self._snapshot = snapshot
+        self._load_snapshot = load_snapshot
+        self._get_latest_version = get_latest_version
+        self._remove_older_versions = remove_older_versions
+        self._reload_lock = threading.Lock()
+        self._stop_watching = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def snapshot(self) -> SearchSnapshot:
+        return self._snapshot
+
+    @property
+    def is_reloading(self) -> bool:
+        return self._reload_lock.locked()
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Loads and swaps in the latest version, if it differs from the version of the current snapshot. Datasets without
+        a version are always reloaded. With `force`, the latest version is reloaded even if it is already served.
+        Waits for a reload that is already in progress.
+
+        Returns:
+            bool: Whether a new snapshot was swapped in.
+        """
+        with self._reload_lock:
+            return self._reload(force)
+
+    def reload_in_background(self, force: bool = False) -> bool:
+        """
+        Starts `reload` in a background thread, unless a reload is already in progress.
+
+        Returns:
+            bool: Whether the reload was started.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+
+        def reload_and_release():
+            try:
+                self._reload(force)
+            finally:
+                self._reload_lock.release()
+
+        threading.Thread(target=reload_and_release, name="snapshot-reload", daemon=True).start()
+        return True
+
+    def start_watching(self, interval_seconds: float) -> None:
+        """
+        Checks for a new version every `interval_seconds` seconds in a background thread, until `stop_watching`.
+        """
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval_seconds,), name="snapshot-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self, interval_seconds: float) -> None:
+        while not self._stop_watching.wait(interval_seconds):
+            self.reload()
+
+    def _reload(self, force: bool) -> bool:
+        try:
+            version = self._get_latest_version()
+            if not force and version is not None and version == self._snapshot.version:
+                return False
+
+            logging.info(f"Loading version `{version}` of the datasets, while serving `{self._snapshot.version}`...")
+            start = time.perf_counter()
+            snapshot = self._load_snapshot(version)
+        except Exception:
+            logging.exception(f"Failed to reload the datasets. Still serving version `{self._snapshot.version}`.")
+            return False
+
+        self._snapshot = snapshot
+        logging.info(f"Swapped in version `{version}` of the datasets after {time.perf_counter() - start:.1f}s.")
+
+        if self._remove_older_versions is not None and version is not None:
+            try:
+                self._remove_older_versions(version)
+            except Exception:
+                logging.exception(f"Failed to remove the versions of the datasets older than `{version}`.")
+        return True
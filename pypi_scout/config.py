@@ -9,12 +9,58 @@ class StorageBackend(Enum):
     BLOB = "BLOB"
 
 
+class EmbeddingsQuantization(Enum):
+    NONE = "NONE"
+    FLOAT16 = "FLOAT16"
+    INT8 = "INT8"
+
+
+class VectorIndexType(Enum):
+    EXACT = "EXACT"
+    IVF = "IVF"
+
+
+class EmbeddingsChunking(Enum):
+    NONE = "NONE"
+    MEAN_POOLED = "MEAN_POOLED"
+    MULTI_VECTOR = "MULTI_VECTOR"
+
+
+class EncoderBackend(Enum):
+    TORCH = "TORCH"
+    ONNX = "ONNX"
+    ONNX_INT8 = "ONNX_INT8"
+
+
+class SearchMode(Enum):
+    VECTOR = "VECTOR"
+    HYBRID = "HYBRID"
+
+
+class RankingMode(Enum):
+    CANDIDATES = "CANDIDATES"
+    GLOBAL = "GLOBAL"
+    GLOBAL_EARLY_EXIT = "GLOBAL_EARLY_EXIT"
+
+
 @dataclass
 class Config:
     # Name of the model used for generating vector embeddings from text.
     # See https://sbert.net/docs/sentence_transformer/pretrained_models.html for available models.
     EMBEDDINGS_MODEL_NAME = "all-mpnet-base-v2"
 
+    # Backend that runs the embeddings model, both in `create_vector_embeddings` and for the queries in the API. Can be
+    # EncoderBackend.TORCH, ONNX or ONNX_INT8. ONNX runs the model with ONNX Runtime, which has less overhead per call
+    # than PyTorch on the CPU. ONNX_INT8 runs a copy of the model with weights that are dynamically quantized to int8,
+    # which is smaller and faster, but creates slightly different embeddings. Both require the `onnx` extra
+    # (`poetry install --extras onnx`), and that `export_onnx_model` has exported EMBEDDINGS_MODEL_NAME to the directory
+    # ONNX_MODEL_DIR_NAME in DATA_DIR. With StorageBackend.BLOB, the API downloads that directory from the container.
+    # The packages and the queries should be embedded by the same backend, so changing this value requires re-running
+    # `create_vector_embeddings`, which then encodes every text again. With ONNX or ONNX_INT8, the texts are encoded in
+    # a single process, and EMBEDDINGS_N_PROCESSES is ignored.
+    ENCODER_BACKEND: EncoderBackend = EncoderBackend.TORCH
+    ONNX_MODEL_DIR_NAME = "onnx_model"
+
     # Boolean to overwrite raw data file if it already exists
     OVERWRITE: bool = True
 
@@ -35,6 +81,79 @@ class Config:
     # For example; it needs the name, weekly downloads, and the summary, but not the (cleaned) description.
     EMBEDDINGS_PARQUET_NAME = "embeddings.parquet"
 
+    # Boolean to reuse the embeddings in an existing EMBEDDINGS_PARQUET_NAME in `create_vector_embeddings`. The hash of
+    # the text that each embedding was generated from is stored next to it, and only the packages with a new or changed
+    # text are encoded. EMBEDDINGS_MODEL_NAME, ENCODER_BACKEND and the chunking settings are part of the hash, so all
+    # texts are encoded again after they change. Set to False to generate all embeddings from scratch.
+    INCREMENTAL_EMBEDDINGS: bool = True
+
+    # Boolean to encode the texts in `create_vector_embeddings` in order of their length, so that each batch contains
+    # texts of similar length and less time is spent on padding. The embeddings are stored in the original order.
+    EMBEDDINGS_SORT_BY_LENGTH: bool = True
+
+    # Number of worker processes that encode the texts in `create_vector_embeddings`, each with its own copy of the
+    # model and its share of the CPU cores. If None, one worker per CPU core is used. Set to 1 to encode the texts in
+    # the main process.
+    EMBEDDINGS_N_PROCESSES: int | None = 1
+
+    # How `create_vector_embeddings` embeds package descriptions that are longer than the maximum sequence length of
+    # the model. Can be EmbeddingsChunking.NONE, MEAN_POOLED or MULTI_VECTOR. With EmbeddingsChunking.NONE, the summary
+    # and description are embedded as a single text, and the model only sees its first tokens. With MEAN_POOLED or
+    # MULTI_VECTOR, the text is split into chunks of at most EMBEDDINGS_CHUNK_MAX_TOKENS tokens that overlap by
+    # EMBEDDINGS_CHUNK_OVERLAP_TOKENS tokens, and only the first EMBEDDINGS_MAX_CHUNKS_PER_PACKAGE chunks are embedded.
+    # MEAN_POOLED stores the mean of the chunk embeddings, so the API is unchanged. MULTI_VECTOR stores every chunk
+    # embedding, and the API scores a package by its most similar chunk. This makes the embeddings up to
+    # EMBEDDINGS_MAX_CHUNKS_PER_PACKAGE times larger, and does not support the global ranking modes.
+    # If EMBEDDINGS_CHUNK_MAX_TOKENS is None, the maximum sequence length of the model is used.
+    EMBEDDINGS_CHUNKING: EmbeddingsChunking = EmbeddingsChunking.NONE
+    EMBEDDINGS_CHUNK_MAX_TOKENS: int | None = None
+    EMBEDDINGS_CHUNK_OVERLAP_TOKENS = 32
+    EMBEDDINGS_MAX_CHUNKS_PER_PACKAGE = 4
+
+    # Name of the directory in DATA_DIR in which `create_vector_embeddings` stores the embeddings after every batch.
+    # If the script is interrupted, it resumes from the last completed batch when it is started again with the same
+    # processed dataset. The checkpoint is removed once all embeddings are generated.
+    EMBEDDINGS_CHECKPOINT_DIR_NAME = "embeddings_checkpoint"
+
+    # Filename for the L2-normalized float32 embeddings matrix, stored as a `.npy` file so the API can memory-map it.
+    EMBEDDINGS_NPY_NAME = "embeddings.npy"
+
+    # Filename for the package names, with rows aligned to the rows of the embeddings matrix in EMBEDDINGS_NPY_NAME.
+    EMBEDDINGS_NAMES_PARQUET_NAME = "embeddings_names.parquet"
+
+    # Boolean to memory-map the embeddings matrix in EMBEDDINGS_NPY_NAME in the API, rather than reading the embeddings
+    # from EMBEDDINGS_PARQUET_NAME. Memory-mapped embeddings are loaded nearly instantly, and share memory between workers.
+    MEMORY_MAP_EMBEDDINGS: bool = True
+
+    # Quantization of the embeddings that are searched by the API. Can be EmbeddingsQuantization.NONE, FLOAT16 or INT8.
+    # With FLOAT16 or INT8, the API searches a quantized copy of the embeddings matrix that is 2x or 4x smaller, and
+    # re-scores the best RESCORE_MULTIPLIER * top_k candidates with the float32 embeddings matrix. Changing this value
+    # requires re-running `create_vector_embeddings`. Note that most CPUs have no native float16 arithmetic, so FLOAT16
+    # saves memory at the cost of latency, while INT8 saves memory and is about as fast as the float32 search.
+    EMBEDDINGS_QUANTIZATION: EmbeddingsQuantization = EmbeddingsQuantization.NONE
+    RESCORE_MULTIPLIER = 4
+
+    # Filenames for the quantized embeddings matrix and the scale per dimension that is used to dequantize it.
+    # Only created if EMBEDDINGS_QUANTIZATION is not EmbeddingsQuantization.NONE.
+    QUANTIZED_EMBEDDINGS_NPY_NAME = "embeddings_quantized.npy"
+    QUANTIZATION_SCALES_NPY_NAME = "embeddings_quantization_scales.npy"
+
+    # Filename for the centroids of the IVF vector index. Only created if VECTOR_INDEX_TYPE is VectorIndexType.IVF.
+    IVF_CENTROIDS_PARQUET_NAME = "ivf_centroids.parquet"
+
+    # Boolean to process the raw dataset in batches of RAW_DATASET_BATCH_SIZE packages in `process_raw_dataset`, rather
+    # than loading it into memory at once. This bounds the peak memory usage by the batch size instead of the size of
+    # the dataset, at the cost of reading the raw dataset twice. The packages in the processed datasets are then
+    # in the order of the raw dataset, rather than sorted by weekly downloads.
+    STREAM_RAW_DATASET: bool = False
+    RAW_DATASET_BATCH_SIZE = 100_000
+
+    # Number of worker processes used to clean the package descriptions in `process_raw_dataset`, and the number of
+    # rows that are sent to a worker at a time. If None, one worker per CPU core is used. Set to 1 to clean the
+    # descriptions in the main process.
+    CLEANING_N_WORKERS: int | None = None
+    CLEANING_CHUNK_SIZE = 10_000
+
     # Google Drive file ID for downloading the raw dataset.
     GOOGLE_FILE_ID = "12AH8PwKvZqRhXBf9uS1qRZq1-k3gIhhG"
 
@@ -49,6 +168,103 @@ class Config:
     WEIGHT_SIMILARITY = 0.5
     WEIGHT_WEEKLY_DOWNLOADS = 0.5
 
+    # How the API retrieves the candidate packages for a query. Can be SearchMode.VECTOR or SearchMode.HYBRID.
+    # SearchMode.VECTOR only uses the similarity of the embeddings. SearchMode.HYBRID also searches a BM25 index of the
+    # names, summaries and cleaned descriptions, and fuses both rankings with reciprocal rank fusion, with the constant
+    # RRF_K. The fused rank then takes the place of the similarity in the score. A query that is the name of a package
+    # skips the embeddings model, and uses the embedding of that package instead. SearchMode.HYBRID requires
+    # RankingMode.CANDIDATES, and that `process_raw_dataset` is run with it, to create the BM25 index.
+    SEARCH_MODE: SearchMode = SearchMode.VECTOR
+    RRF_K = 60
+
+    # Filename for the BM25 index. Only created if SEARCH_MODE is SearchMode.HYBRID. Only the first
+    # BM25_MAX_TOKENS_PER_DOCUMENT tokens of each package are indexed, and terms that occur in fewer than
+    # BM25_MIN_DOCUMENT_FREQUENCY packages are left out. A value above 1 makes the index smaller, but also drops the
+    # terms that only a single package contains, which are the ones that the vector search is most likely to miss.
+    BM25_INDEX_NPZ_NAME = "bm25_index.npz"
+    BM25_MAX_TOKENS_PER_DOCUMENT = 512
+    BM25_MIN_DOCUMENT_FREQUENCY = 1
+
+    # How the API ranks the packages for a query. Can be RankingMode.CANDIDATES, GLOBAL or GLOBAL_EARLY_EXIT.
+    # RankingMode.CANDIDATES fetches the top_k * 3 most similar packages, and re-ranks those with the weights above,
+    # normalizing the similarity and weekly downloads over those candidates only. RankingMode.GLOBAL computes the score
+    # for every package, with the weekly downloads normalized once over all packages when the API starts.
+    # RankingMode.GLOBAL_EARLY_EXIT returns the same ranking, but stops scoring once no remaining package can make it
+    # into the top_k. See `PopularityRanker` for details.
+    RANKING_MODE: RankingMode = RankingMode.CANDIDATES
+
+    # Weights for the global ranking modes. These are separate from the weights above, because the cosine similarity
+    # is not normalized per query, so its range is much narrower than that of the normalized weekly downloads.
+    GLOBAL_RANKING_WEIGHT_SIMILARITY = 0.8
+    GLOBAL_RANKING_WEIGHT_WEEKLY_DOWNLOADS = 0.2
+
+    # Number of packages that are scored at a time by RankingMode.GLOBAL_EARLY_EXIT, in order of descending popularity.
+    GLOBAL_RANKING_BLOCK_SIZE = 4096
+
+    # Vector index used by the API to find the packages that are most similar to a query. Can be either
+    # VectorIndexType.EXACT or VectorIndexType.IVF. VectorIndexType.EXACT compares the query to every package.
+    # VectorIndexType.IVF clusters the embeddings when they are created, and only compares the query to the packages in
+    # the IVF_N_PROBE clusters that are closest to the query. This is faster, but approximate. Changing this to
+    # VectorIndexType.IVF requires re-running `create_vector_embeddings`.
+    VECTOR_INDEX_TYPE: VectorIndexType = VectorIndexType.EXACT
+
+    # Number of clusters in the IVF vector index. If None, 4 * sqrt(number of packages) clusters are used.
+    IVF_N_LISTS: int | None = None
+
+    # Number of IVF clusters to search per query. Higher values increase recall, at the cost of latency.
+    IVF_N_PROBE = 32
+
+    # Maximum number of query embeddings that the API keeps in an LRU cache, keyed by the normalized query
+    # (case-folded, with collapsed whitespace). Set to 0 to disable the cache.
+    QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+    # Maximum number of search responses that the API keeps in an LRU cache, keyed by the normalized query, top_k and
+    # the score weights. The cache is cleared when the dataset is (re)loaded. Set to 0 to disable the cache.
+    RESPONSE_CACHE_SIZE = 0
+
+    # Maximum number of searches that the API runs in parallel in its thread pool, and the maximum number of searches
+    # that can wait for a free thread. Searches beyond that are rejected with a 503, rather than slowing down all requests.
+    SEARCH_MAX_CONCURRENCY = 2
+    SEARCH_MAX_QUEUE_SIZE = 32
+
+    # Queries that arrive within SEARCH_BATCH_MAX_WAIT_MS milliseconds of each other are encoded and searched as a
+    # single batch of at most SEARCH_BATCH_MAX_SIZE queries. The maximum queue size above then applies to batches.
+    # Set SEARCH_BATCH_MAX_SIZE to 1 to disable batching.
+    SEARCH_BATCH_MAX_SIZE = 16
+    SEARCH_BATCH_MAX_WAIT_MS = 5.0
+
+    # Rate limit per client IP for the search endpoint, in the format of the `limits` library.
+    # Can be overridden with the SEARCH_RATE_LIMIT environment variable, for example to run a load test.
+    SEARCH_RATE_LIMIT: str = "6/minute"
+
+    # Maximum number of queries in a single request to the batch search endpoint, and the rate limit per client IP
+    # for that endpoint. The rate limit can be overridden with the BATCH_SEARCH_RATE_LIMIT environment variable.
+    BATCH_SEARCH_MAX_QUERIES = 100
+    BATCH_SEARCH_RATE_LIMIT: str = "2/minute"
+
+    # Boolean to add a `Server-Timing` header to the responses of the search endpoint, with the duration in milliseconds
+    # of every stage of the search, like encoding the query and computing the similarities. Browsers show these in their
+    # developer tools. The stages are always recorded as histograms on the `/metrics` endpoint. The header reveals how
+    # long the search took, and how much of that was spent on the embeddings model, so it is off by default.
+    SERVER_TIMING_HEADER: bool = False
+
+    # Boolean to publish every run of `upload_processed_datasets` as a new version of the datasets, rather than
+    # overwriting the previous files. The datasets are then copied to a directory in DATA_DIR, or uploaded under a prefix
+    # in the blob container, that is named after the time of the upload, and the file DATASET_VERSION_FILE_NAME is
+    # replaced with that name once all datasets are in place. The API reads the datasets of the version in that file.
+    # Because the files of a version are never overwritten, the API can load a new version while it still serves
+    # requests from the memory-mapped files of the previous one.
+    VERSIONED_DATASETS: bool = False
+    DATASET_VERSION_FILE_NAME = "dataset_version.txt"
+
+    # Number of seconds between two checks of the API for a new version of the datasets in DATASET_VERSION_FILE_NAME.
+    # A new version is loaded in a background thread, next to the one that is being served, and swapped in once it is
+    # loaded, so the API keeps serving requests during the reload and temporarily needs memory for both versions.
+    # Requires VERSIONED_DATASETS. If None, the API only reloads the datasets when the admin endpoint
+    # `/api/admin/reload` is called with the ADMIN_TOKEN environment variable as bearer token.
+    DATASET_RELOAD_INTERVAL_SECONDS: float | None = None
+    ADMIN_TOKEN: str | None = None
+
     # Storage backend configuration. Can be either StorageBackend.LOCAL or StorageBackend.BLOB.
     # If StorageBackend.BLOB, the processed dataset will be uploaded to Blob, and the backend API
     # will read the data from there, rather than from a local data directory. In order to use StorageBackend.BLOB,
@@ -58,7 +274,20 @@ class Config:
     STORAGE_BACKEND_BLOB_CONTAINER_NAME: str | None = None
     STORAGE_BACKEND_BLOB_KEY: str | None = None
 
+    # Number of parallel connections per blob upload or download. Large blobs are downloaded in ranges of a few MB.
+    BLOB_MAX_CONCURRENCY = 8
+
+    # Name of the directory in DATA_DIR in which the API caches the datasets that it downloads from blob storage. A
+    # cached dataset is only downloaded again if the ETag of its blob changed, so a restart skips unchanged datasets.
+    # The files that the API memory-maps are downloaded to DATA_DIR and validated in the same way.
+    # If None, the datasets are downloaded into memory every time.
+    BLOB_CACHE_DIR_NAME: str | None = "blob_cache"
+
     def __post_init__(self) -> None:
+        self.SEARCH_RATE_LIMIT = os.getenv("SEARCH_RATE_LIMIT", self.SEARCH_RATE_LIMIT)
+        self.BATCH_SEARCH_RATE_LIMIT = os.getenv("BATCH_SEARCH_RATE_LIMIT", self.BATCH_SEARCH_RATE_LIMIT)
+        self.ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", self.ADMIN_TOKEN)
+
         if os.getenv("STORAGE_BACKEND") == "BLOB":
             self.STORAGE_BACKEND = StorageBackend.BLOB
             self.STORAGE_BACKEND_BLOB_ACCOUNT_NAME = os.getenv("STORAGE_BACKEND_BLOB_ACCOUNT_NAME")
@@ -1,5 +1,8 @@
+import csv
+import logging
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterator, List, Set, Tuple
 
 import polars as pl
 
@@ -31,3 +34,99 @@ class RawDataReader:
             description=pl.col("description").fill_null(""),
         )
         return df
+
+    def read_in_batches(self, batch_size: int, frac_data_to_include: float = 1.0) -> Iterator[pl.DataFrame]:
+        """
+        Reads the raw dataset in batches, and yields the same rows and columns as `read` without loading the full
+        dataset into memory. The rows are yielded in the order of the raw dataset rather than sorted by weekly
+        downloads, and of packages that occur more than once, the first occurrence is kept. Rows of which the number of
+        downloads is not an integer are dropped with a warning, rather than failing the whole dataset.
+
+        The raw dataset is read twice, row by row, with the csv module, which splits rows correctly also when a quoted
+        description contains line breaks. The first pass only keeps the name, number of downloads and whether there
+        is a text of each row, to select the rows to keep, and the second pass collects the selected rows into
+        batches, so peak memory is bounded by `batch_size` rather than by the size of the dataset.
+
+        Args:
+            batch_size (int): The number of rows per batch.
+            frac_data_to_include (float, optional): Only keep this fraction of the packages with the most weekly
+                downloads. Defaults to 1.0.
+
+        Yields:
+            DataFrame: The processed rows of a batch.
+        """
+        rows_to_keep = self._select_rows(frac_data_to_include)
+        logging.info(f"Selected {len(rows_to_keep):,} packages from the raw dataset.")
+
+        columns, rows = self._iterate_rows()
+        batch = []
+        for row_index, row in enumerate(rows):
+            if row_index in rows_to_keep:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    yield self._create_batch(batch, columns)
+                    batch = []
+        if batch:
+            yield self._create_batch(batch, columns)
+
+    def _select_rows(self, frac_data_to_include: float) -> Set[int]:
+        """
+        Returns the indices of the rows to keep: the first valid occurrence of every package that has a text.
+        """
+        columns, rows = self._iterate_rows()
+        name_index, downloads_index = columns.index("name"), columns.index("number_of_downloads")
+        summary_index, description_index = columns.index("summary"), columns.index("description")
+
+        names, number_of_downloads, has_text = [], [], []
+        for row in rows:
+            names.append(row[name_index])
+            number_of_downloads.append(row[downloads_index] or None)
+            has_text.append(bool(row[summary_index] or row[description_index]))
+
+        df = pl.DataFrame(
+            {"name": names, "number_of_downloads": number_of_downloads, "has_text": has_text},
+            schema={"name": pl.String, "number_of_downloads": pl.String, "has_text": pl.Boolean},
+        )
+        df = df.with_row_index("row_index")
+        df = df.with_columns(weekly_downloads=pl.col("number_of_downloads").cast(pl.Int32, strict=False))
+        is_invalid = pl.col("number_of_downloads").is_not_null() & pl.col("weekly_downloads").is_null()
+        n_invalid = df.select(is_invalid.sum()).item()
+        if n_invalid:
+            logging.warning(f"Dropping {n_invalid:,} rows of which number_of_downloads is not an integer.")
+            df = df.filter(~is_invalid)
+
+        df = df.unique(subset="name", keep="first", maintain_order=True)
+        df = df.filter(pl.col("has_text"))
+        df = df.sort("weekly_downloads", descending=True)
+        df = df.head(round(frac_data_to_include * len(df)))
+        return set(df["row_index"].to_list())
+
+    def _iterate_rows(self) -> Tuple[List[str], Iterator[List[str]]]:
+        """
+        Returns the column names and an iterator over the rows of the raw dataset, which reads one row at a time.
+        """
+
+        def iterate_rows() -> Iterator[List[str]]:
+            with open(self.raw_dataset, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                next(reader)
+                yield from reader
+
+        with open(self.raw_dataset, newline="", encoding="utf-8") as f:
+            columns = next(csv.reader(f))
+        # Package descriptions can be larger than the default field size limit of the csv module.
+        csv.field_size_limit(2**31 - 1)
+        return columns, iterate_rows()
+
+    @staticmethod
+    def _create_batch(rows: List[List[str]], columns: List[str]) -> pl.DataFrame:
+        df = pl.DataFrame(rows, schema={column: pl.String for column in columns}, orient="row")
+        # The csv module reads empty fields as empty strings, while Polars reads them as null.
+        df = df.with_columns(pl.all().replace("", None))
+        df = df.with_columns(weekly_downloads=pl.col("number_of_downloads").cast(pl.Int32))
+        df = df.drop("number_of_downloads")
+        df = df.with_columns(
+            summary=pl.col("summary").fill_null(""),
+            description=pl.col("description").fill_null(""),
+        )
+        return df
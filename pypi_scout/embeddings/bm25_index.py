@@ -0,0 +1,253 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+from pypi_scout.embeddings.vector_index import top_k_indices
+
+# Terms are the lowercased runs of letters and digits, and longer terms than this are not indexed.
+TOKEN_PATTERN = r"[^\W_]+"  # noqa: S105
+MAX_TERM_BYTES = 32
+# A query sums its postings into an array of scores for every document if it has more than 1 / DENSE_SCORES_RATIO
+# postings per document, and otherwise only sums the scores of the documents in its postings.
+DENSE_SCORES_RATIO = 16
+
+
+def tokenize_query(query: str) -> List[str]:
+    """
+    Splits a query into its unique terms, in the same way as the documents are split by `BM25IndexBuilder`.
+    """
+    return list(dict.fromkeys(re.findall(TOKEN_PATTERN, query.lower())))
+
+
+@dataclass
+class BM25Index:
+    """
+    An inverted index that ranks documents by their Okapi BM25 score for a query.
+
+    The postings are stored in flat arrays, grouped by term: the documents that contain the term with index `i` in the
+    sorted `vocabulary` are `documents[offsets[i] : offsets[i + 1]]`, and `term_frequencies` holds the number of times
+    the term occurs in each of them. A term is looked up with a binary search in the vocabulary, and a query only reads
+    the postings of its own terms, so a query with rare terms takes microseconds.
+    """
+
+    vocabulary: np.ndarray
+    offsets: np.ndarray
+    documents: np.ndarray
+    term_frequencies: np.ndarray
+    document_lengths: np.ndarray
+    names: List[str]
+    k1: float = 1.2
+    b: float = 0.75
+    # The length normalization k1 * (1 - b + b * length / average_length) of every document, computed once.
+    length_normalization: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        average_length = self.document_lengths.mean() if len(self.document_lengths) else 1.0
+        self.length_normalization = (
+            self.k1 * (1 - self.b + self.b * self.document_lengths / max(average_length, 1.0))
+        ).astype(np.float32)
+
+    @property
+    def n_documents(self) -> int:
+        return len(self.document_lengths)
+
+    def search(self, query: str, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the documents with the highest BM25 score for the query. Documents that contain none of the terms of
+        the query are never returned.
+
+        Args:
+            query (str): The query string.
+            top_k (int): The maximum number of documents to retrieve.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The document indices and their scores, sorted by descending score.
+        """
+        postings = [self._get_postings(term) for term in tokenize_query(query)]
+        postings = [(documents, weights) for documents, weights in postings if len(documents)]
+        if not postings:
+            return np.array([], dtype=np.intp), np.array([], dtype=np.float32)
+
+        documents = np.concatenate([documents for documents, _ in postings])
+        weights = np.concatenate([weights for _, weights in postings])
+        if len(documents) * DENSE_SCORES_RATIO < self.n_documents:
+            # Sum the weights per document over the postings of the query terms only, without an array of scores for
+            # every document in the index.
+            documents, inverse = np.unique(documents, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights).astype(np.float32)
+            indices = top_k_indices(scores, top_k)
+            return documents[indices].astype(np.intp), scores[indices]
+
+        # For common terms, summing into an array of scores for every document is faster than sorting the postings.
+        # Every posting has a positive weight, so the documents with a score of 0 contain none of the terms.
+        scores = np.bincount(documents, weights=weights, minlength=self.n_documents).astype(np.float32)
+        indices = top_k_indices(scores, top_k)
+        indices = indices[scores[indices] > 0]
+        return indices.astype(np.intp), scores[indices]
+
+    def _get_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        term_bytes = term.encode()
+        term_index = np.searchsorted(self.vocabulary, term_bytes)
+        if term_index == len(self.vocabulary) or self.vocabulary[term_index] != term_bytes:
+            return np.array([], dtype=np.uint32), np.array([], dtype=np.float32)
+
+        start, end = self.offsets[term_index], self.offsets[term_index + 1]
+        documents = self.documents[start:end]
+        term_frequencies = self.term_frequencies[start:end].astype(np.float32)
+        document_frequency = end - start
+        idf = np.log1p((self.n_documents - document_frequency + 0.5) / (document_frequency + 0.5))
+        weights = idf * term_frequencies * (self.k1 + 1) / (term_frequencies + self.length_normalization[documents])
+        return documents, weights
+
+    def save(self, path: Path) -> None:
+        """
+        Stores the index as an uncompressed `.npz` file. The names are stored as a single UTF-8 encoded buffer.
+        """
+        np.savez(
+            path,
+            vocabulary=self.vocabulary,
+            offsets=self.offsets,
+            documents=self.documents,
+            term_frequencies=self.term_frequencies,
+            document_lengths=self.document_lengths,
+            names=np.frombuffer("\n".join(self.names).encode(), dtype=np.uint8),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as arrays:
+            index = cls(
+                vocabulary=arrays["vocabulary"],
+                offsets=arrays["offsets"],
+                documents=arrays["documents"],
+                term_frequencies=arrays["term_frequencies"],
+                document_lengths=arrays["document_lengths"],
+                names=arrays["names"].tobytes().decode().split("\n") if arrays["names"].size else [],
+            )
+        logging.info(
+            f"Loaded BM25 index with {index.n_documents:,} documents, {len(index.vocabulary):,} terms and "
+            f"{len(index.documents):,} postings ({index.nbytes / 1024**2:,.1f} MB)."
+        )
+        return index
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in [self.vocabulary, self.offsets, self.documents, self.term_frequencies, self.document_lengths]
+        )
+
+
+class BM25IndexBuilder:
+    """
+    Builds a `BM25Index` from batches of documents, so that the documents do not have to be in memory at once.
+    Only the postings are kept in memory between batches, as (term id, document, term frequency) triples.
+    """
+
+    def __init__(self, max_tokens_per_document: Optional[int] = None, batch_size: int = 10_000):
+        """
+        Initializes the BM25IndexBuilder.
+
+        Args:
+            max_tokens_per_document (Optional[int], optional): The maximum number of tokens that is indexed per
+                document, counted from the start of the document. If None, all tokens are indexed. Defaults to None.
+            batch_size (int, optional): The number of documents that are tokenized at a time. Defaults to 10_000.
+        """
+        self.max_tokens_per_document = max_tokens_per_document
+        self.batch_size = batch_size
+        self._df_vocabulary = pl.DataFrame(schema={"term": pl.Utf8, "term_id": pl.UInt32})
+        self._postings: List[pl.DataFrame] = []
+        self._document_lengths: List[pl.Series] = []
+        self._names: List[pl.Series] = []
+        self._n_documents = 0
+
+    def add_documents(self, df: pl.DataFrame, text_columns: List[str], name_column: str = "name") -> None:
+        """
+        Adds the rows of the DataFrame as documents to the index. The text of a document is the concatenation of
+        the text columns.
+        """
+        for start in range(0, len(df), self.batch_size):
+            self._add_batch(df.slice(start, self.batch_size), text_columns, name_column)
+
+    def build(self, min_document_frequency: int = 1) -> BM25Index:
+        """
+        Creates the index from the documents that were added. Terms that occur in fewer than `min_document_frequency`
+        documents are left out of the index.
+        """
+        df_postings = (
+            pl.concat(self._postings)
+            if self._postings
+            else pl.DataFrame(schema={"term_id": pl.UInt32, "document": pl.UInt32, "term_frequency": pl.UInt16})
+        )
+        df_terms = (
+            df_postings.group_by("term_id")
+            .len()
+            .filter(pl.col("len") >= min_document_frequency)
+            .join(self._df_vocabulary, on="term_id")
+            .sort("term")
+            .with_row_index("index")
+        )
+        df_postings = (
+            df_postings.join(df_terms.select("term_id", "index"), on="term_id")
+            .sort("index", "document")
+            .select("document", "term_frequency")
+        )
+
+        index = BM25Index(
+            vocabulary=np.array([term.encode() for term in df_terms["term"]], dtype=f"S{MAX_TERM_BYTES}"),
+            offsets=np.concatenate([[0], np.cumsum(df_terms["len"].to_numpy())]).astype(np.int64),
+            documents=df_postings["document"].to_numpy(),
+            term_frequencies=df_postings["term_frequency"].to_numpy(),
+            document_lengths=pl.concat(self._document_lengths).to_numpy() if self._document_lengths else np.array([]),
+            names=pl.concat(self._names).to_list() if self._names else [],
+        )
+        logging.info(
+            f"Built BM25 index with {index.n_documents:,} documents, {len(index.vocabulary):,} terms and "
+            f"{len(index.documents):,} postings ({index.nbytes / 1024**2:,.1f} MB)."
+        )
+        return index
+
+    def _add_batch(self, df: pl.DataFrame, text_columns: List[str], name_column: str) -> None:
+        tokens = pl.concat_str([pl.col(column).fill_null("") for column in text_columns], separator=" ")
+        tokens = tokens.str.to_lowercase().str.extract_all(TOKEN_PATTERN)
+        if self.max_tokens_per_document is not None:
+            tokens = tokens.list.head(self.max_tokens_per_document)
+
+        df_tokens = df.select(
+            document=pl.int_range(self._n_documents, self._n_documents + len(df), dtype=pl.UInt32),
+            term=tokens,
+        )
+        self._document_lengths.append(df_tokens["term"].list.len().cast(pl.UInt32))
+        self._names.append(df[name_column])
+        self._n_documents += len(df)
+
+        df_postings = (
+            df_tokens.explode("term")
+            .filter(pl.col("term").is_not_null() & (pl.col("term").str.len_bytes() <= MAX_TERM_BYTES))
+            .group_by("term", "document")
+            .len()
+        )
+        self._update_vocabulary(df_postings["term"].unique())
+        self._postings.append(
+            df_postings.join(self._df_vocabulary, on="term").select(
+                "term_id",
+                "document",
+                term_frequency=pl.col("len").clip(upper_bound=np.iinfo(np.uint16).max).cast(pl.UInt16),
+            )
+        )
+
+    def _update_vocabulary(self, terms: pl.Series) -> None:
+        new_terms = terms.filter(~terms.is_in(self._df_vocabulary["term"]))
+        first_id = len(self._df_vocabulary)
+        df_new_terms = pl.DataFrame(
+            {
+                "term": new_terms,
+                "term_id": pl.int_range(first_id, first_id + len(new_terms), dtype=pl.UInt32, eager=True),
+            }
+        )
+        self._df_vocabulary = pl.concat([self._df_vocabulary, df_new_terms])
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingsCheckpoint:
+    """
+    Stores embeddings on disk while they are being generated, so that an interrupted job can resume where it stopped.
+
+    The embeddings are written to a preallocated, memory-mapped `.npy` file, and the number of completed rows is
+    stored in a small JSON file after every batch. The embeddings do not have to be completed in row order: the
+    caller decides which rows belong to the first `n_completed_rows` that are processed. The checkpoint only resumes
+    if its fingerprint, which should identify the texts and the order in which they are processed, is unchanged.
+    """
+
+    EMBEDDINGS_FILE_NAME = "embeddings.npy"
+    STATE_FILE_NAME = "state.json"
+
+    def __init__(self, directory: Path, fingerprint: str):
+        """
+        Initializes the EmbeddingsCheckpoint, and reads the state of a previous run if its fingerprint matches.
+
+        Args:
+            directory (Path): The directory in which the checkpoint is stored.
+            fingerprint (str): A hash of the texts and the order in which they are processed.
+        """
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+        self.n_completed_rows = 0
+        self.embeddings: Optional[np.ndarray] = None
+
+        state = self._read_state()
+        if state is not None and state["fingerprint"] == fingerprint:
+            self.n_completed_rows = state["n_completed_rows"]
+            self.embeddings = np.lib.format.open_memmap(self.directory / self.EMBEDDINGS_FILE_NAME, mode="r+")
+        elif state is not None:
+            logging.info(f"Ignoring the checkpoint in `{self.directory}`, because it was created for other texts.")
+
+    def create(self, shape: Tuple[int, int]) -> np.ndarray:
+        """
+        Creates the memory-mapped embeddings matrix with the given shape, discarding any previous checkpoint.
+        """
+        self.remove()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.embeddings = np.lib.format.open_memmap(
+            self.directory / self.EMBEDDINGS_FILE_NAME, mode="w+", dtype=np.float32, shape=shape
+        )
+        self.n_completed_rows = 0
+        return self.embeddings
+
+    def save(self, n_completed_rows: int) -> None:
+        """
+        Flushes the embeddings to disk, and then records that the first `n_completed_rows` rows are complete.
+        The state file is replaced atomically, so an interruption never leaves a partially written state.
+        """
+        self.embeddings.flush()
+        self.n_completed_rows = n_completed_rows
+        state_path = self.directory / self.STATE_FILE_NAME
+        temporary_state_path = state_path.with_suffix(".tmp")
+        with open(temporary_state_path, "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "n_completed_rows": n_completed_rows}, f)
+        os.replace(temporary_state_path, state_path)
+
+    def remove(self) -> None:
+        """
+        Removes the checkpoint from disk.
+        """
+        self.embeddings = None
+        for file_name in [self.STATE_FILE_NAME, self.EMBEDDINGS_FILE_NAME]:
+            (self.directory / file_name).unlink(missing_ok=True)
+
+    def _read_state(self) -> Optional[dict]:
+        state_path = self.directory / self.STATE_FILE_NAME
+        if not state_path.exists() or not (self.directory / self.EMBEDDINGS_FILE_NAME).exists():
+            return None
+        with open(state_path) as f:
+            return json.load(f)
@@ -1,28 +1,78 @@
+import hashlib
 import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Union
 
+import numpy as np
 import polars as pl
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
+from pypi_scout.embeddings.embeddings_checkpoint import EmbeddingsCheckpoint
+from pypi_scout.embeddings.onnx_encoder import OnnxEncoder
+from pypi_scout.embeddings.text_chunker import TextChunker
+
 
 class VectorEmbeddingCreator:
     def __init__(
         self,
-        embeddings_model: SentenceTransformer,
+        embeddings_model: Union[SentenceTransformer, OnnxEncoder],
         embedding_column_name: str = "embeddings",
         batch_size: int = 128,
+        hash_column_name: str = "text_hash",
+        sort_by_length: bool = False,
+        n_processes: int = 1,
+        checkpoint_dir: Optional[Path] = None,
+        text_chunker: Optional[TextChunker] = None,
+        model_id: str = "",
     ):
         """
         Initializes the VectorEmbeddingCreator with a SentenceTransformer model, embedding column name, and batch size.
 
+        With `sort_by_length`, the texts are encoded in order of their length rather than in the order of the
+        DataFrame, so that every batch contains texts of similar length and little time is spent on padding tokens.
+        With `n_processes` > 1, the batches are encoded by a pool of worker processes that each load the model. In both
+        cases, the embeddings are returned in the order of the DataFrame.
+
+        With a `checkpoint_dir`, the embeddings are written to a memory-mapped file in that directory after every
+        batch. If the job is interrupted, calling `add_embeddings` again with the same texts resumes after the last
+        completed batch. The checkpoint is removed once all embeddings have been added to the DataFrame.
+
+        With a `text_chunker`, every text is split into chunks that fit in the maximum sequence length of the model,
+        and the embedding of a text is the mean of the L2-normalized embeddings of its chunks.
+
         Args:
-            embeddings_model (SentenceTransformer): The SentenceTransformer model to generate embeddings.
+            embeddings_model (Union[SentenceTransformer, OnnxEncoder]): The model to generate embeddings. An
+                `OnnxEncoder` only supports `n_processes` = 1.
             embedding_column_name (str, optional): The name of the column to store embeddings. Defaults to 'embeddings'.
             batch_size (int, optional): The size of batches to process at a time. Defaults to 128.
+            hash_column_name (str, optional): The name of the column to store the hash of the text that each embedding
+                was generated from. Defaults to 'text_hash'.
+            sort_by_length (bool, optional): Whether to encode the texts in order of their length. Defaults to False.
+            n_processes (int, optional): The number of worker processes that encode the texts. The texts are always
+                sorted by length if this is larger than 1. Defaults to 1.
+            checkpoint_dir (Optional[Path], optional): The directory in which to store a checkpoint of the embeddings.
+                If None, the embeddings are only kept in memory. Defaults to None.
+            text_chunker (Optional[TextChunker], optional): The chunker used to split the texts before they are encoded.
+                If None, the texts are encoded as a whole, and truncated by the model. Defaults to None.
+            model_id (str, optional): Identifies the model and how it is run, like its name and backend. It is part of
+                the hash of every text, so that embeddings of another model are not reused by `update_embeddings`.
+                Defaults to "".
         """
+        if n_processes > 1 and isinstance(embeddings_model, OnnxEncoder):
+            raise ValueError("An OnnxEncoder encodes the texts in a single process.")  # noqa: TRY003
+
         self.model = embeddings_model
         self.embedding_column_name = embedding_column_name
         self.batch_size = batch_size
+        self.hash_column_name = hash_column_name
+        self.sort_by_length = sort_by_length
+        self.n_processes = n_processes
+        self.checkpoint_dir = checkpoint_dir
+        self.text_chunker = text_chunker
+        self.model_id = model_id
 
     def add_embeddings(self, df: pl.DataFrame, text_column: str) -> pl.DataFrame:
         """
@@ -35,26 +85,180 @@ class VectorEmbeddingCreator:
         Returns:
             pl.DataFrame: The DataFrame with an additional column containing embeddings.
         """
-        logging.info("Splitting DataFrame into batches...")
-        df_chunks = self._split_dataframe_in_batches(df, batch_size=self.batch_size)
-        all_embeddings = []
+        texts = df[text_column].to_list()
+        if self.text_chunker is not None:
+            chunks = self.text_chunker.chunk_texts(texts)
+            texts = [chunk for text_chunks in chunks for chunk in text_chunks]
+            logging.info(f"Split {len(chunks):,} texts into {len(texts):,} chunks.")
 
-        logging.info("Generating embeddings...")
-        for chunk in tqdm(df_chunks, desc="Generating embeddings", unit="batch"):
-            embeddings = self._generate_embeddings(chunk, text_column)
-            all_embeddings.extend(embeddings)
+        order = self._get_encoding_order(texts)
+        checkpoint = (
+            EmbeddingsCheckpoint(self.checkpoint_dir, self._fingerprint(texts, order, self.model_id))
+            if self.checkpoint_dir is not None
+            else None
+        )
 
-        df = df.with_columns(pl.Series(self.embedding_column_name, all_embeddings))
+        embeddings = self._generate_embeddings(texts, order, checkpoint)
+        if self.text_chunker is not None:
+            embeddings = self._mean_pool(embeddings, np.array([len(text_chunks) for text_chunks in chunks]))
+        df = df.with_columns(pl.Series(self.embedding_column_name, embeddings))
+        if checkpoint is not None:
+            checkpoint.remove()
         return df
 
-    def _generate_embeddings(self, chunk: pl.DataFrame, text_column: str) -> list:
-        embeddings = self.model.encode(list(chunk[text_column]), show_progress_bar=False)
-        return embeddings
+    def update_embeddings(
+        self, df: pl.DataFrame, text_column: str, df_previous: Optional[pl.DataFrame] = None
+    ) -> pl.DataFrame:
+        """
+        Adds embeddings and a hash of the text to the DataFrame, reusing the embeddings in `df_previous` for texts
+        with the same hash. Only the texts that are new or changed since `df_previous` was created are encoded.
+
+        Args:
+            df (pl.DataFrame): The Polars DataFrame to which embeddings will be added.
+            text_column (str): The column name containing text to generate embeddings for.
+            df_previous (Optional[pl.DataFrame], optional): A DataFrame with the embedding and hash columns, as returned
+                by an earlier call to this method. If None, embeddings are generated for every row. Defaults to None.
+
+        Returns:
+            pl.DataFrame: The DataFrame with additional columns containing the embeddings and the hashes of the texts.
+        """
+        hashes = self.hash_texts(df[text_column], salt=self._hash_salt())
+        df = df.with_columns(pl.Series(self.hash_column_name, hashes, dtype=pl.Utf8))
+        if df_previous is None or self.hash_column_name not in df_previous.columns:
+            logging.info("No previous embeddings with text hashes found, so embeddings are generated for every row.")
+            return self.add_embeddings(df, text_column)
+
+        df_previous = df_previous.select(self.hash_column_name, self.embedding_column_name).unique(
+            subset=self.hash_column_name, keep="first"
+        )
+        df = df.with_row_index("row_index").join(df_previous, on=self.hash_column_name, how="left", coalesce=True)
+        is_changed = df[self.embedding_column_name].is_null()
+        df_reused = df.filter(~is_changed)
+        logging.info(
+            f"Reusing {len(df_reused):,} embeddings of unchanged texts, and generating {is_changed.sum():,} embeddings "
+            f"of new or changed texts."
+        )
+
+        df_changed = df.filter(is_changed).drop(self.embedding_column_name)
+        if len(df_changed):
+            df_changed = self.add_embeddings(df_changed, text_column).with_columns(
+                pl.col(self.embedding_column_name).cast(df_reused.schema[self.embedding_column_name])
+            )
+            df = pl.concat([df_reused, df_changed]).sort("row_index")
+        return df.drop("row_index")
 
     @staticmethod
-    def _split_dataframe_in_batches(df: pl.DataFrame, batch_size: int) -> list:
+    def hash_texts(texts: pl.Series, salt: str = "") -> list:
         """
-        Splits a Polars DataFrame into batches.
+        Hashes each text with BLAKE2b. Unlike `pl.Series.hash`, the hashes are stable across versions of Polars,
+        so they can be stored and compared in a later run. The salt is prepended to every text.
+        """
+        return [hashlib.blake2b((salt + text).encode(), digest_size=16).hexdigest() for text in texts]
+
+    def _hash_salt(self) -> str:
+        # Embeddings of different models are not comparable, and the embedding of a chunked text is different from that
+        # of the whole text, so the model and the chunking settings are part of the hash, and embeddings are not reused
+        # after they change.
+        salt = f"model:{self.model_id}:" if self.model_id else ""
+        if self.text_chunker is not None:
+            chunker = self.text_chunker
+            salt += f"chunked:{chunker.max_tokens}:{chunker.overlap_tokens}:{chunker.max_chunks}:"
+        return salt
+
+    @staticmethod
+    def _mean_pool(chunk_embeddings: np.ndarray, n_chunks_per_text: np.ndarray) -> np.ndarray:
         """
-        n_chunks = (df.height + batch_size - 1) // batch_size
-        return [df.slice(i * batch_size, batch_size) for i in range(n_chunks)]
+        Returns the mean of the L2-normalized embeddings of the chunks of each text. The chunks of a text are
+        consecutive rows of `chunk_embeddings`, and every text has at least one chunk.
+        """
+        if len(n_chunks_per_text) == 0:
+            return chunk_embeddings
+        norms = np.linalg.norm(chunk_embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        starts = np.concatenate([[0], np.cumsum(n_chunks_per_text)[:-1]])
+        return np.add.reduceat(chunk_embeddings / norms, starts, axis=0) / n_chunks_per_text[:, None]
+
+    def _get_encoding_order(self, texts: list) -> np.ndarray:
+        """
+        Returns the order in which the texts are encoded. If the texts are sorted by length, the length is measured in
+        characters, which `SentenceTransformer.encode` also uses to sort the texts within a single call, and which is
+        much cheaper to compute than the number of tokens.
+        """
+        if self.sort_by_length or self.n_processes > 1:
+            return np.argsort([len(text) for text in texts], kind="stable")
+        return np.arange(len(texts))
+
+    @staticmethod
+    def _fingerprint(texts: list, order: np.ndarray, model_id: str = "") -> str:
+        fingerprint = hashlib.blake2b(model_id.encode() + order.tobytes(), digest_size=16)
+        for text in texts:
+            fingerprint.update(text.encode())
+            fingerprint.update(b"\x00")
+        return fingerprint.hexdigest()
+
+    def _generate_embeddings(
+        self, texts: list, order: np.ndarray, checkpoint: Optional[EmbeddingsCheckpoint]
+    ) -> np.ndarray:
+        """
+        Encodes the texts in buckets of `batch_size` * `n_processes` texts in the given order, and writes the embeddings
+        back in the original order of the texts. With a checkpoint, the buckets that it already contains are skipped.
+        """
+        n_completed_rows = 0
+        embeddings = None
+        if checkpoint is not None and checkpoint.embeddings is not None:
+            n_completed_rows, embeddings = checkpoint.n_completed_rows, checkpoint.embeddings
+            logging.info(
+                f"Resuming from the checkpoint in `{checkpoint.directory}` with {n_completed_rows:,} of {len(texts):,} "
+                f"embeddings completed."
+            )
+
+        bucket_size = self.batch_size * self.n_processes
+        logging.info(f"Generating embeddings with {self.n_processes} process(es)...")
+        with self._multi_process_pool() as pool, tqdm(
+            desc="Generating embeddings", total=len(texts), initial=n_completed_rows, unit="text"
+        ) as progress_bar:
+            for start in range(n_completed_rows, len(texts), bucket_size):
+                bucket = order[start : start + bucket_size]
+                bucket_embeddings = self._encode([texts[i] for i in bucket], pool)
+                if embeddings is None:
+                    shape = (len(texts), bucket_embeddings.shape[1])
+                    embeddings = checkpoint.create(shape) if checkpoint is not None else np.empty(shape, np.float32)
+
+                embeddings[bucket] = bucket_embeddings
+                if checkpoint is not None:
+                    checkpoint.save(start + len(bucket))
+                progress_bar.update(len(bucket))
+
+        return embeddings if embeddings is not None else np.empty((0, 0), dtype=np.float32)
+
+    def _encode(self, texts: list, pool: Optional[dict]) -> np.ndarray:
+        if pool is None:
+            return self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+        return self.model.encode_multi_process(texts, pool, batch_size=self.batch_size, chunk_size=self.batch_size)
+
+    @contextmanager
+    def _multi_process_pool(self) -> Iterator[Optional[dict]]:
+        """
+        Starts a pool of `n_processes` worker processes on the CPU, or yields None if `n_processes` is 1. Each worker
+        is limited to its share of the CPU cores, so the workers do not compete for the same cores.
+        """
+        if self.n_processes == 1:
+            yield None
+            return
+
+        n_threads = str(max(1, (os.cpu_count() or 1) // self.n_processes))
+        previous_n_threads = os.environ.get("OMP_NUM_THREADS")
+        # The workers are spawned, so they read the number of threads from the environment when they import torch.
+        os.environ["OMP_NUM_THREADS"] = n_threads
+        try:
+            pool = self.model.start_multi_process_pool(["cpu"] * self.n_processes)
+        finally:
+            if previous_n_threads is None:
+                del os.environ["OMP_NUM_THREADS"]
+            else:
+                os.environ["OMP_NUM_THREADS"] = previous_n_threads
+
+        try:
+            yield pool
+        finally:
+            self.model.stop_multi_process_pool(pool)
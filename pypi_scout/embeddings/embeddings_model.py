@@ -0,0 +1,53 @@
+import json
+import logging
+from typing import Union
+
+from sentence_transformers import SentenceTransformer
+
+from pypi_scout.config import Config, EncoderBackend, StorageBackend
+from pypi_scout.embeddings.onnx_encoder import MANIFEST_FILE_NAME, OnnxEncoder
+from pypi_scout.utils.blob_io import BlobIO
+
+# The models that can encode texts into embeddings. They share the `encode` method and the attributes that the vector
+# database and the embeddings creator use.
+EmbeddingsModel = Union[SentenceTransformer, OnnxEncoder]
+
+
+def load_embeddings_model(config: Config, download: bool = False) -> EmbeddingsModel:
+    """
+    Loads the embeddings model for config.ENCODER_BACKEND. With an ONNX backend and `download`, the exported model is
+    first downloaded from the blob container, if config.STORAGE_BACKEND is StorageBackend.BLOB.
+    """
+    if config.ENCODER_BACKEND == EncoderBackend.TORCH:
+        return SentenceTransformer(config.EMBEDDINGS_MODEL_NAME)
+
+    if config.ENCODER_BACKEND not in (EncoderBackend.ONNX, EncoderBackend.ONNX_INT8):
+        raise ValueError(f"Unexpected value found for ENCODER_BACKEND: {config.ENCODER_BACKEND}")  # noqa: TRY003
+
+    if download and config.STORAGE_BACKEND == StorageBackend.BLOB:
+        download_onnx_model(config)
+    return OnnxEncoder(
+        config.DATA_DIR / config.ONNX_MODEL_DIR_NAME, quantized=config.ENCODER_BACKEND == EncoderBackend.ONNX_INT8
+    )
+
+
+def download_onnx_model(config: Config) -> None:
+    """
+    Downloads the files of the exported ONNX model, as listed in its manifest, from the directory ONNX_MODEL_DIR_NAME
+    in the blob container to the same directory in DATA_DIR. Files that are unchanged are not downloaded again.
+    """
+    blob_io = BlobIO(
+        config.STORAGE_BACKEND_BLOB_ACCOUNT_NAME,
+        config.STORAGE_BACKEND_BLOB_CONTAINER_NAME,
+        config.STORAGE_BACKEND_BLOB_KEY,
+        max_concurrency=config.BLOB_MAX_CONCURRENCY,
+    )
+    model_dir = config.DATA_DIR / config.ONNX_MODEL_DIR_NAME
+    logging.info(
+        f"Downloading the ONNX embeddings model from container `{config.STORAGE_BACKEND_BLOB_CONTAINER_NAME}` to `{model_dir}`..."
+    )
+    blob_io.download_to_file(f"{config.ONNX_MODEL_DIR_NAME}/{MANIFEST_FILE_NAME}", model_dir / MANIFEST_FILE_NAME)
+    with open(model_dir / MANIFEST_FILE_NAME) as f:
+        file_names = json.load(f)["files"]
+    for file_name in file_names:
+        blob_io.download_to_file(f"{config.ONNX_MODEL_DIR_NAME}/{file_name}", model_dir / file_name)
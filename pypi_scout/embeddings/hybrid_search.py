@@ -0,0 +1,131 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pypi_scout.embeddings.bm25_index import BM25Index
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.utils.metrics import StageTimer
+
+
+def normalize_package_name(name: str) -> str:
+    """
+    Normalizes a package name as PyPI does (PEP 503), so that `Typing_Extensions` matches `typing-extensions`.
+    """
+    return re.sub(r"[-_.]+", "-", name.strip()).lower()
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuses rankings of row indices with reciprocal rank fusion: every row scores 1 / (k + rank) in each ranking that
+    it appears in, with ranks starting at 1, and the scores are summed over the rankings.
+
+    Args:
+        rankings (List[np.ndarray]): The rankings, each sorted from the best to the worst row.
+        k (int, optional): The constant that dampens the influence of the rows at the top of each ranking.
+            Defaults to 60.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The rows in any of the rankings and their fused scores, sorted by descending
+            fused score. Ties keep the order of the row indices.
+    """
+    rows = np.concatenate([np.asarray(ranking, dtype=np.intp) for ranking in rankings])
+    scores = np.concatenate([1 / (k + np.arange(1, len(ranking) + 1)) for ranking in rankings])
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    fused_scores = np.bincount(inverse, weights=scores, minlength=len(unique_rows))
+    order = np.argsort(-fused_scores, kind="stable")
+    return unique_rows[order], fused_scores[order]
+
+
+class HybridSearcher:
+    """
+    Finds the packages for a query by fusing a vector search and a BM25 search with reciprocal rank fusion, so that
+    queries with package names or rare terms also find the packages that contain them literally.
+
+    If a query is the name of a package, that package is added as a ranking of its own, and its embedding is used as
+    the query embedding, so the embeddings model is skipped and the other results are the packages most similar to it.
+    """
+
+    def __init__(
+        self,
+        vector_database: SimpleVectorDatabase,
+        bm25_index: BM25Index,
+        document_rows: np.ndarray,
+        package_names: np.ndarray,
+        rrf_k: int = 60,
+    ):
+        """
+        Initializes the HybridSearcher.
+
+        Args:
+            vector_database (SimpleVectorDatabase): The vector database, with a single embedding per package.
+            bm25_index (BM25Index): The BM25 index of the packages.
+            document_rows (np.ndarray): For every document in the BM25 index, the row of the package in the embeddings
+                matrix, or -1 if the package has no embedding.
+            package_names (np.ndarray): The package names, with rows aligned to the embeddings matrix.
+            rrf_k (int, optional): The constant of the reciprocal rank fusion. Defaults to 60.
+        """
+        if vector_database.row_to_package is not None:
+            raise ValueError("Hybrid search requires a single embedding per package.")  # noqa: TRY003
+
+        self.vector_database = vector_database
+        self.bm25_index = bm25_index
+        self.document_rows = document_rows
+        self.rrf_k = rrf_k
+        self.rows_by_name: Dict[str, int] = {
+            normalize_package_name(name): row for row, name in enumerate(package_names)
+        }
+
+    def search_batch(
+        self, queries: List[str], n_candidates: int, timer: Optional[StageTimer] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Finds the best matches for each query in a batch.
+
+        Args:
+            queries (List[str]): The query strings.
+            n_candidates (int): The number of matches to fetch from each of the searches, and to return per query.
+            timer (Optional[StageTimer], optional): Measures the `encode`, `similarity`, `lexical` and `fusion` stages.
+                Defaults to None.
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray, np.ndarray]]: For each query, the rows of the matches in the embeddings
+                matrix, their fused scores, and their cosine similarity to the query, sorted by descending fused score.
+        """
+        timer = timer or StageTimer()
+        exact_rows = [self.rows_by_name.get(normalize_package_name(query)) for query in queries]
+        with timer.stage("encode"):
+            query_embeddings = self._get_query_embeddings(queries, exact_rows)
+        with timer.stage("similarity"):
+            vector_matches = self.vector_database.search_embeddings_batch(query_embeddings, n_candidates)
+        with timer.stage("lexical"):
+            lexical_matches = [self.bm25_index.search(query, n_candidates)[0] for query in queries]
+
+        results = []
+        with timer.stage("fusion"):
+            for exact_row, query_embedding, (vector_rows, _), documents in zip(
+                exact_rows, query_embeddings, vector_matches, lexical_matches
+            ):
+                lexical_rows = self.document_rows[documents]
+                rankings = [vector_rows, lexical_rows[lexical_rows >= 0]]
+                if exact_row is not None:
+                    rankings.append(np.array([exact_row]))
+
+                rows, fused_scores = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+                rows, fused_scores = rows[:n_candidates], fused_scores[:n_candidates]
+                similarities = self.vector_database.embeddings_matrix[rows] @ query_embedding
+                results.append((rows, fused_scores, similarities))
+        return results
+
+    def _get_query_embeddings(self, queries: List[str], exact_rows: List[Optional[int]]) -> np.ndarray:
+        query_embeddings = np.empty((len(queries), self.vector_database.embeddings_matrix.shape[1]), dtype=np.float32)
+        is_exact = np.array([row is not None for row in exact_rows], dtype=bool)
+        if is_exact.any():
+            query_embeddings[is_exact] = self.vector_database.embeddings_matrix[
+                [row for row in exact_rows if row is not None]
+            ]
+        if not is_exact.all():
+            query_embeddings[~is_exact] = self.vector_database.encode_queries(
+                [query for query, exact in zip(queries, is_exact) if not exact]
+            )
+        return query_embeddings
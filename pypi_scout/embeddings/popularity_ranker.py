@@ -0,0 +1,163 @@
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.embeddings.vector_index import top_k_indices
+
+
+class PopularityRanker:
+    """
+    Ranks all packages in the catalog by a combined score of similarity and popularity:
+
+        score = weight_similarity * similarity + weight_weekly_downloads * popularity
+
+    where `similarity` is the cosine similarity to the query, and `popularity` is log1p(weekly downloads), min-max
+    normalized once over the full catalog. Unlike re-ranking the most similar candidates, a very popular package
+    with a slightly lower similarity can still be returned, and the score of a package does not depend on which
+    other packages happened to be fetched.
+
+    Without early exit, the score is computed for every package in a single vectorized pass.
+
+    With early exit, the ranking follows the threshold algorithm: the vector index provides the `n_candidates`
+    most similar packages, so any other package has a similarity of at most that of the last candidate. The other
+    packages are then scored in blocks in order of descending popularity, until the upper bound on the score of the
+    remaining packages drops below the top_k-th best score found so far. This is exact if the vector index is,
+    and is cheapest when the rows of the embeddings matrix are stored in order of descending popularity, so that
+    every block is a contiguous slice.
+    """
+
+    def __init__(
+        self,
+        vector_database: SimpleVectorDatabase,
+        log_weekly_downloads: np.ndarray,
+        weight_similarity: float = 0.8,
+        weight_weekly_downloads: float = 0.2,
+        early_exit: bool = True,
+        block_size: int = 4096,
+    ):
+        """
+        Initializes the PopularityRanker.
+
+        Args:
+            vector_database (SimpleVectorDatabase): The vector database with the embeddings matrix to rank.
+            log_weekly_downloads (np.ndarray): log1p of the weekly downloads of each package, with rows aligned to the
+                embeddings matrix of the vector database.
+            weight_similarity (float, optional): Weight for the similarity in the score. Defaults to 0.8.
+            weight_weekly_downloads (float, optional): Weight for the popularity in the score. Defaults to 0.2.
+            early_exit (bool, optional): Whether to stop scoring once no remaining package can reach the top_k.
+                Defaults to True.
+            block_size (int, optional): The number of packages that are scored at a time with early exit.
+                Defaults to 4096.
+        """
+        if vector_database.row_to_package is not None:
+            raise ValueError("Ranking by popularity requires a single embedding per package.")  # noqa: TRY003
+
+        self.vector_database = vector_database
+        self.weight_similarity = weight_similarity
+        self.weight_weekly_downloads = weight_weekly_downloads
+        self.early_exit = early_exit
+        self.block_size = block_size
+
+        log_weekly_downloads = np.asarray(log_weekly_downloads, dtype=np.float32)
+        value_range = np.ptp(log_weekly_downloads) if len(log_weekly_downloads) else 0
+        self.popularity = (
+            (log_weekly_downloads - log_weekly_downloads.min()) / value_range
+            if value_range > 0
+            else np.zeros_like(log_weekly_downloads)
+        )
+
+        # The row indices in order of descending popularity. None if the rows are already in that order.
+        self.popularity_order: Optional[np.ndarray] = None
+        if np.any(np.diff(self.popularity) > 0):
+            self.popularity_order = np.argsort(-self.popularity, kind="stable")
+            if early_exit:
+                logging.warning(
+                    "The embeddings are not stored in order of descending popularity, so the ranking with early exit "
+                    "has to gather the rows of every block. Re-run `create_vector_embeddings` to store them in order."
+                )
+
+    def rank(self, query_embeddings: np.ndarray, top_k: int, n_candidates: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Ranks the packages for each of the L2-normalized query embeddings in a matrix of shape (n_queries, dim).
+
+        Args:
+            query_embeddings (np.ndarray): The query embeddings, as returned by `SimpleVectorDatabase.encode_queries`.
+            top_k (int): The number of packages to return per query.
+            n_candidates (int): The number of most similar packages to fetch from the vector index per query before
+                scanning by popularity. Only used with early exit.
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray]]: For each query, the row indices and similarities of the top_k
+                packages, sorted by descending score.
+        """
+        if self.early_exit:
+            return [
+                self._rank_with_early_exit(query_embedding, candidates, top_k)
+                for query_embedding, candidates in zip(
+                    query_embeddings, self.vector_database.search_embeddings_batch(query_embeddings, n_candidates)
+                )
+            ]
+
+        similarities = (self.vector_database.embeddings_matrix @ query_embeddings.T).T
+        results = []
+        for query_similarities in similarities:
+            scores = self.weight_similarity * query_similarities + self.weight_weekly_downloads * self.popularity
+            indices = top_k_indices(scores, top_k)
+            results.append((indices, query_similarities[indices]))
+        return results
+
+    def _rank_with_early_exit(
+        self, query_embedding: np.ndarray, candidates: Tuple[np.ndarray, np.ndarray], top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        candidate_rows, candidate_similarities = candidates
+        n_rows = len(self.popularity)
+        if len(candidate_rows) >= n_rows:
+            # The vector index returned every package, so there is nothing left to scan.
+            max_other_similarity = -np.inf
+        else:
+            max_other_similarity = candidate_similarities[-1] if len(candidate_similarities) else np.inf
+
+        rows, similarities = candidate_rows, candidate_similarities
+        scores = self._score(rows, similarities)
+        best = top_k_indices(scores, top_k)
+        rows, similarities, scores = rows[best], similarities[best], scores[best]
+
+        n_scanned = 0
+        for start in range(0, n_rows, self.block_size):
+            block_rows = self._popularity_ordered_rows(start, start + self.block_size)
+            threshold = scores[-1] if len(scores) >= top_k else -np.inf
+            upper_bound = (
+                self.weight_similarity * max_other_similarity
+                + self.weight_weekly_downloads * self.popularity[block_rows[0]]
+            )
+            if upper_bound <= threshold:
+                break
+
+            block_similarities = self._block_embeddings(start, block_rows) @ query_embedding
+            is_new = ~np.isin(block_rows, candidate_rows)
+            block_rows, block_similarities = block_rows[is_new], block_similarities[is_new]
+            n_scanned += len(block_rows)
+
+            rows = np.concatenate([rows, block_rows])
+            similarities = np.concatenate([similarities, block_similarities])
+            scores = np.concatenate([scores, self._score(block_rows, block_similarities)])
+            best = top_k_indices(scores, top_k)
+            rows, similarities, scores = rows[best], similarities[best], scores[best]
+
+        logging.info(f"Ranked by popularity with early exit after scanning {n_scanned:,} of {n_rows:,} packages.")
+        return rows, similarities
+
+    def _score(self, rows: np.ndarray, similarities: np.ndarray) -> np.ndarray:
+        return self.weight_similarity * similarities + self.weight_weekly_downloads * self.popularity[rows]
+
+    def _popularity_ordered_rows(self, start: int, end: int) -> np.ndarray:
+        if self.popularity_order is None:
+            return np.arange(start, min(end, len(self.popularity)))
+        return self.popularity_order[start:end]
+
+    def _block_embeddings(self, start: int, block_rows: np.ndarray) -> np.ndarray:
+        if self.popularity_order is None:
+            return self.vector_database.embeddings_matrix[start : start + len(block_rows)]
+        return self.vector_database.embeddings_matrix[block_rows]
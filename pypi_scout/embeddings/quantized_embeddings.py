@@ -0,0 +1,84 @@
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# The number of bytes of float32 rows that are dequantized at a time when computing similarities. Blocks of about the
+# size of the L2 cache are fastest: smaller blocks spend more time per row in the Python loop, and larger blocks are
+# evicted from the cache between the cast and the dot product.
+DEQUANTIZED_BLOCK_BYTES = 512 * 1024
+
+
+class QuantizedEmbeddings:
+    """
+    A float16 or int8 (scalar-quantized) copy of an L2-normalized embeddings matrix.
+
+    It supports `@` with a query embedding and indexing of rows, so it can be searched by the vector indexes
+    in the same way as a float32 embeddings matrix. The resulting similarities are approximate, so the best
+    candidates should be re-scored with the float32 embeddings.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray, block_size: Optional[int] = None):
+        """
+        Initializes the QuantizedEmbeddings.
+
+        Args:
+            codes (np.ndarray): The quantized embeddings matrix of shape (n_rows, dim), with dtype float16 or int8.
+            scales (np.ndarray): The float32 scale for every dimension, such that `codes * scales` approximates
+                the original embeddings matrix.
+            block_size (Optional[int], optional): The number of rows that are dequantized at a time when computing
+                similarities. If None, as many rows as fit in DEQUANTIZED_BLOCK_BYTES as float32. Defaults to None.
+        """
+        self.codes = codes
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self.block_size = block_size or max(1, DEQUANTIZED_BLOCK_BYTES // (4 * codes.shape[1]))
+
+    @classmethod
+    def quantize(cls, embeddings_matrix: np.ndarray, dtype: np.dtype) -> "QuantizedEmbeddings":
+        """
+        Quantizes an embeddings matrix to float16, or to int8 with a symmetric scale per dimension.
+        """
+        if np.dtype(dtype) == np.float16:
+            return cls(embeddings_matrix.astype(np.float16), np.ones(embeddings_matrix.shape[1], dtype=np.float32))
+
+        if np.dtype(dtype) == np.int8:
+            max_abs = np.abs(embeddings_matrix).max(axis=0)
+            scales = np.where(max_abs > 0, max_abs / 127, 1).astype(np.float32)
+            codes = np.clip(np.rint(embeddings_matrix / scales), -127, 127).astype(np.int8)
+            return cls(codes, scales)
+
+        raise ValueError(f"Unsupported dtype for quantized embeddings: {dtype}")  # noqa: TRY003
+
+    def save(self, codes_path: Path, scales_path: Path) -> None:
+        np.save(codes_path, self.codes)
+        np.save(scales_path, self.scales)
+
+    @classmethod
+    def load(cls, codes_path: Path, scales_path: Path, mmap_mode: Optional[str] = "r") -> "QuantizedEmbeddings":
+        return cls(np.load(codes_path, mmap_mode=mmap_mode), np.load(scales_path))
+
+    @property
+    def shape(self) -> tuple:
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, rows) -> np.ndarray:
+        return self.codes[rows].astype(np.float32) * self.scales
+
+    def __matmul__(self, query_embedding: np.ndarray) -> np.ndarray:
+        """
+        Computes the similarities with a query embedding of shape (dim,), or with a batch of shape (dim, n_queries).
+        """
+        # Folding the scales into the query means the codes only need to be cast, not rescaled.
+        scaled_query = query_embedding * self.scales.reshape((-1,) + (1,) * (query_embedding.ndim - 1))
+        similarities = np.empty((len(self.codes),) + query_embedding.shape[1:], dtype=np.float32)
+        for start in range(0, len(self.codes), self.block_size):
+            block = self.codes[start : start + self.block_size]
+            similarities[start : start + self.block_size] = block.astype(np.float32) @ scaled_query
+        return similarities
@@ -1,55 +1,267 @@
+import logging
+import time
+from typing import List, Optional, Tuple, Union
+
 import numpy as np
 import polars as pl
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from pypi_scout.embeddings.onnx_encoder import OnnxEncoder
+from pypi_scout.embeddings.quantized_embeddings import QuantizedEmbeddings
+from pypi_scout.embeddings.vector_index import ExactIndex, VectorIndex, top_k_indices
+from pypi_scout.utils.lru_cache import LRUCache
+from pypi_scout.utils.metrics import StageTimer
 
 
 class SimpleVectorDatabase:
     def __init__(
         self,
-        embeddings_model: SentenceTransformer,
+        embeddings_model: Union[SentenceTransformer, OnnxEncoder],
         df_embeddings: pl.DataFrame,
         embedding_column: str = "embeddings",
         processed_column: str = "embeddings_array",
+        vector_index: Optional[VectorIndex] = None,
+        embeddings_matrix: Optional[np.ndarray] = None,
+        quantized_embeddings: Optional[QuantizedEmbeddings] = None,
+        rescore_multiplier: int = 4,
+        query_embedding_cache_size: int = 1024,
+        row_to_package: Optional[np.ndarray] = None,
     ):
         """
         Initializes the SimpleVectorDatabase with a SentenceTransformer model and a DataFrame containing embeddings.
 
         Args:
-            embeddings_model (SentenceTransformer): The SentenceTransformer model to generate embeddings.
+            embeddings_model (Union[SentenceTransformer, OnnxEncoder]): The model to generate the query embeddings.
             df_embeddings (pl.DataFrame): The Polars DataFrame containing the initial embeddings.
             embedding_column (str, optional): The name of the column containing the original embeddings. Defaults to 'embeddings'.
+            vector_index (VectorIndex, optional): The index used to search the embeddings. Defaults to an `ExactIndex`.
+            embeddings_matrix (np.ndarray, optional): A precomputed, L2-normalized embeddings matrix with rows aligned to
+                `df_embeddings`, for example a memory-mapped one. If provided, `df_embeddings` does not need to contain
+                the embedding column. Defaults to creating the matrix from the embedding column.
+            quantized_embeddings (QuantizedEmbeddings, optional): A quantized copy of the embeddings matrix. If provided,
+                the vector index searches the quantized embeddings for top_k * rescore_multiplier candidates, which are
+                then re-scored with the float32 embeddings matrix. Defaults to None.
+            rescore_multiplier (int, optional): The number of candidates to re-score per requested match when using
+                quantized embeddings. Defaults to 4.
+            query_embedding_cache_size (int, optional): The maximum number of query embeddings to keep in an LRU cache,
+                keyed by the normalized query. Set to 0 to disable the cache. Defaults to 1024.
+            row_to_package (np.ndarray, optional): For multi-vector embeddings, the index of the package of every row
+                in the embeddings matrix and `df_embeddings`, numbered from 0 in order of first occurrence. A package is
+                then as similar to a query as its most similar row (max-sim), and the indices returned by the searches
+                are package indices, which index the first row of every package in `df_embeddings`. If None, every row
+                is a separate package. Defaults to None.
         """
         self.embeddings_model = embeddings_model
-        self.df_embeddings = df_embeddings
         self.embedding_column = embedding_column
-        self.embeddings_matrix = self._create_embeddings_matrix()
+        if embeddings_matrix is None:
+            embeddings_matrix = self.create_embeddings_matrix(df_embeddings[embedding_column])
+        self.embeddings_matrix = embeddings_matrix
+        # The embeddings are stored in the matrix, so the column is no longer needed.
+        self.df_embeddings = (
+            df_embeddings.drop(embedding_column) if embedding_column in df_embeddings.columns else df_embeddings
+        )
+        self.vector_index = vector_index or ExactIndex()
+        self.quantized_embeddings = quantized_embeddings
+        self.rescore_multiplier = rescore_multiplier
+        self.query_embedding_cache = LRUCache(query_embedding_cache_size)
 
-    def find_similar(self, query: str, top_k: int = 25) -> pl.DataFrame:
+        self.row_to_package = row_to_package
+        # The number of rows to fetch from the vector index to be sure to find top_k different packages.
+        self.max_rows_per_package = 1
+        if row_to_package is not None:
+            first_rows = np.unique(row_to_package, return_index=True)[1]
+            self.df_embeddings = self.df_embeddings[first_rows]
+            self.max_rows_per_package = int(np.bincount(row_to_package).max()) if len(row_to_package) else 1
+            logging.info(
+                f"Using {len(row_to_package):,} embeddings of {len(first_rows):,} packages, with at most "
+                f"{self.max_rows_per_package} embeddings per package."
+            )
+
+    def find_similar(self, query: str, top_k: int = 25, timer: Optional[StageTimer] = None) -> pl.DataFrame:
         """
         Finds the top_k most similar vectors in the database for a given query.
 
         Args:
             query (str): The query string to find similar vectors for.
             top_k (int, optional): The number of similar vectors to retrieve. Defaults to 25.
+            timer (Optional[StageTimer], optional): Measures the `encode`, `similarity` and `join` stages.
+                Defaults to None.
 
         Returns:
             pl.DataFrame: A Polars DataFrame containing the most similar vectors and their similarity scores.
         """
-        query_embedding = self.embeddings_model.encode(query, show_progress_bar=False)
+        timer = timer or StageTimer()
+        with timer.stage("encode"):
+            query_embedding = self.encode_query(query)
+        with timer.stage("similarity"):
+            top_k_indices, top_k_scores = self._search(query_embedding, top_k)
+        with timer.stage("join"):
+            return self._create_matches_df(top_k_indices, top_k_scores)
 
-        similarities = cosine_similarity([query_embedding], self.embeddings_matrix)[0]
+    def find_similar_batch(self, queries: List[str], top_k: int = 25) -> List[pl.DataFrame]:
+        """
+        Finds the top_k most similar vectors in the database for each query in a batch. The queries are encoded in a
+        single call to the embeddings model, and compared to the embeddings with a single matrix-matrix product.
 
-        top_k_indices = np.argsort(similarities)[::-1][:top_k]
-        top_k_scores = similarities[top_k_indices]
-        df_best_matches = self.df_embeddings[top_k_indices]
+        Args:
+            queries (List[str]): The query strings to find similar vectors for.
+            top_k (int, optional): The number of similar vectors to retrieve per query. Defaults to 25.
 
-        df_best_matches = df_best_matches.with_columns(pl.Series("similarity", top_k_scores))
-        df_best_matches = df_best_matches.drop(self.embedding_column)
+        Returns:
+            List[pl.DataFrame]: For each query, a Polars DataFrame like the one returned by `find_similar`.
+        """
+        return [
+            self._create_matches_df(top_k_indices, top_k_scores)
+            for top_k_indices, top_k_scores in self.find_similar_indices_batch(queries, top_k)
+        ]
+
+    def find_similar_indices_batch(
+        self, queries: List[str], top_k: int = 25, timer: Optional[StageTimer] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Like `find_similar_batch`, but returns the row indices of the matches and their similarity scores rather than
+        DataFrames, so that callers can gather data from arrays that are aligned with the embeddings matrix.
+
+        Args:
+            queries (List[str]): The query strings to find similar vectors for.
+            top_k (int, optional): The number of similar vectors to retrieve per query. Defaults to 25.
+            timer (Optional[StageTimer], optional): Measures the `encode` and `similarity` stages. Defaults to None.
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray]]: For each query, the row indices and similarity scores of the matches,
+                sorted by descending similarity.
+        """
+        timer = timer or StageTimer()
+        with timer.stage("encode"):
+            query_embeddings = self.encode_queries(queries)
+        with timer.stage("similarity"):
+            return self.search_embeddings_batch(query_embeddings, top_k)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """
+        Returns the L2-normalized embedding of the query. Embeddings are cached by the normalized query, so repeated
+        queries that only differ in case or whitespace skip the embeddings model.
+        """
+        normalized_query = self.normalize_query(query)
+        return self.query_embedding_cache.get_or_compute(
+            normalized_query, lambda: self._encode_normalized_query(normalized_query)
+        )
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Returns the L2-normalized embeddings of the queries as a matrix of shape (n_queries, dim).
+        Queries that are not in the cache are encoded in a single call to the embeddings model.
+        """
+        normalized_queries = [self.normalize_query(query) for query in queries]
+        query_embeddings = {query: self.query_embedding_cache.get(query) for query in normalized_queries}
 
+        queries_to_encode = [query for query, embedding in query_embeddings.items() if embedding is None]
+        if queries_to_encode:
+            embeddings = self.embeddings_model.encode(queries_to_encode, show_progress_bar=False)
+            embeddings = self._normalize(np.asarray(embeddings, dtype=np.float32))
+            for query, embedding in zip(queries_to_encode, embeddings):
+                self.query_embedding_cache.put(query, embedding)
+                query_embeddings[query] = embedding
+
+        return np.stack([query_embeddings[query] for query in normalized_queries])
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join(query.casefold().split())
+
+    def _encode_normalized_query(self, normalized_query: str) -> np.ndarray:
+        query_embedding = self.embeddings_model.encode(normalized_query, show_progress_bar=False)
+        return self._normalize(np.asarray(query_embedding, dtype=np.float32))
+
+    def _create_matches_df(self, top_k_indices: np.ndarray, top_k_scores: np.ndarray) -> pl.DataFrame:
+        df_best_matches = self.df_embeddings[top_k_indices]
+        df_best_matches = df_best_matches.with_columns(pl.Series("similarity", top_k_scores))
         return df_best_matches
 
-    def _create_embeddings_matrix(self) -> np.ndarray:
-        return np.stack(
-            self.df_embeddings[self.embedding_column].apply(lambda x: np.array(x, dtype=np.float32)).to_numpy()
+    def _search(self, query_embedding: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        n_rows = top_k * self.max_rows_per_package
+        if self.quantized_embeddings is None:
+            rows, similarities = self.vector_index.search(self.embeddings_matrix, query_embedding, n_rows)
+        else:
+            candidate_indices, _ = self.vector_index.search(
+                self.quantized_embeddings, query_embedding, n_rows * self.rescore_multiplier
+            )
+            rows, similarities = self._rescore(candidate_indices, query_embedding, n_rows)
+        return self._aggregate_rows_to_packages(rows, similarities, top_k)
+
+    def search_embeddings_batch(self, query_embeddings: np.ndarray, top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Returns the row indices and similarity scores of the top_k matches for each of the L2-normalized query
+        embeddings in a matrix of shape (n_queries, dim), as returned by `encode_queries`. With multi-vector
+        embeddings, the indices are package indices.
+        """
+        n_rows = top_k * self.max_rows_per_package
+        if self.quantized_embeddings is None:
+            results = self.vector_index.search_batch(self.embeddings_matrix, query_embeddings, n_rows)
+        else:
+            candidates = self.vector_index.search_batch(
+                self.quantized_embeddings, query_embeddings, n_rows * self.rescore_multiplier
+            )
+            results = [
+                self._rescore(candidate_indices, query_embedding, n_rows)
+                for (candidate_indices, _), query_embedding in zip(candidates, query_embeddings)
+            ]
+        return [self._aggregate_rows_to_packages(rows, similarities, top_k) for rows, similarities in results]
+
+    def _aggregate_rows_to_packages(
+        self, rows: np.ndarray, similarities: np.ndarray, top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Maps the rows, sorted by descending similarity, to the top_k packages with the most similar rows. Every package
+        can have at most `max_rows_per_package` rows, so top_k * `max_rows_per_package` rows contain the top_k packages.
+        """
+        if self.row_to_package is None:
+            return rows, similarities
+
+        packages = self.row_to_package[rows]
+        # The rows are sorted by descending similarity, so the first row of every package is its most similar one.
+        first_rows = np.sort(np.unique(packages, return_index=True)[1])[:top_k]
+        return packages[first_rows], similarities[first_rows]
+
+    def _rescore(
+        self, candidate_indices: np.ndarray, query_embedding: np.ndarray, top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Only the rows of the candidates are read from the float32 matrix, so when it is memory-mapped,
+        # most of it never has to be loaded into memory.
+        similarities = self.embeddings_matrix[candidate_indices] @ query_embedding
+        indices = top_k_indices(similarities, top_k)
+        return candidate_indices[indices], similarities[indices]
+
+    @staticmethod
+    def create_embeddings_matrix(embeddings: pl.Series) -> np.ndarray:
+        """
+        Creates a contiguous float32 matrix from an embeddings column, with every row L2-normalized once up front.
+        Since the rows are L2-normalized, the dot product of a row with a normalized query equals the cosine similarity.
+
+        The list column is exploded into its flat values buffer and reshaped, so no Python objects are created per row.
+        The only copy made is the normalized float32 matrix itself.
+        """
+        start = time.perf_counter()
+
+        if embeddings.dtype == pl.List:
+            lengths = embeddings.list.len()
+            if lengths.min() != lengths.max():
+                raise ValueError(f"All embeddings in column `{embeddings.name}` should have the same length.")  # noqa: TRY003
+
+        flat_embeddings = embeddings.explode().cast(pl.Float32).to_numpy()
+        embeddings_matrix = SimpleVectorDatabase._normalize(flat_embeddings.reshape(len(embeddings), -1))
+
+        logging.info(
+            f"Created embeddings matrix with shape {embeddings_matrix.shape} "
+            f"({embeddings_matrix.nbytes / 1024**2:,.1f} MB) in {time.perf_counter() - start:.2f}s."
         )
+        return np.ascontiguousarray(embeddings_matrix)
+
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        """
+        L2-normalizes a vector, or each row of a matrix. Zero vectors are left as they are.
+        """
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        norms[norms == 0] = 1
+        return embeddings / norms
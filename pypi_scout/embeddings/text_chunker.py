@@ -0,0 +1,67 @@
+from typing import Any, List
+
+# An upper bound on the average number of characters per token. Texts are cut to this many characters per token
+# that can fit in the chunks, so the tokenizer does not have to process the part of a long README that is never used.
+MAX_CHARACTERS_PER_TOKEN = 16
+
+
+class TextChunker:
+    """
+    Splits texts into windows of at most `max_tokens` tokens, so that each window fits in the maximum sequence length
+    of the embeddings model and no part of the text is silently truncated. Consecutive windows overlap by
+    `overlap_tokens` tokens, and at most `max_chunks` windows are created per text, starting at the beginning of the
+    text, so that the number of embeddings per package stays bounded.
+
+    The windows are cut at token boundaries, using the character offsets of the tokens, so each chunk is a substring
+    of the original text.
+    """
+
+    def __init__(self, tokenizer: Any, max_tokens: int, max_chunks: int, overlap_tokens: int = 0):
+        """
+        Initializes the TextChunker.
+
+        Args:
+            tokenizer (Any): The tokenizer of the embeddings model, as in `SentenceTransformer.tokenizer`. It should be
+                a fast Hugging Face tokenizer, which returns the character offsets of the tokens.
+            max_tokens (int): The maximum number of tokens per chunk, excluding special tokens.
+            max_chunks (int): The maximum number of chunks per text.
+            overlap_tokens (int, optional): The number of tokens that consecutive chunks have in common. Defaults to 0.
+        """
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens should be at least 0 and smaller than max_tokens.")  # noqa: TRY003
+
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.max_chunks = max_chunks
+        self.overlap_tokens = overlap_tokens
+
+    def chunk_texts(self, texts: List[str], batch_size: int = 1024) -> List[List[str]]:
+        """
+        Splits each of the texts into chunks. Every text results in at least one chunk, which is empty for an empty text.
+        The texts are tokenized in batches of `batch_size` texts.
+        """
+        stride = self.max_tokens - self.overlap_tokens
+        max_characters = ((self.max_chunks - 1) * stride + self.max_tokens) * MAX_CHARACTERS_PER_TOKEN
+        texts = [text[:max_characters] for text in texts]
+
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start : start + batch_size]
+            offsets = self.tokenizer(
+                batch, add_special_tokens=False, return_offsets_mapping=True, truncation=False, verbose=False
+            )["offset_mapping"]
+            chunks.extend(self._split_at_offsets(text, text_offsets) for text, text_offsets in zip(batch, offsets))
+        return chunks
+
+    def _split_at_offsets(self, text: str, offsets: List[tuple]) -> List[str]:
+        if len(offsets) <= self.max_tokens:
+            return [text]
+
+        chunks = []
+        stride = self.max_tokens - self.overlap_tokens
+        for start in range(0, len(offsets), stride):
+            end = min(start + self.max_tokens, len(offsets))
+            chunks.append(text[offsets[start][0] : offsets[end - 1][1]])
+            if end == len(offsets) or len(chunks) == self.max_chunks:
+                break
+        return chunks
@@ -0,0 +1,175 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def top_k_indices(similarities: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Returns the indices of the top_k highest similarities, sorted in descending order of similarity.
+
+    Uses `np.argpartition` to select the candidates in O(N), so that only the top_k selected candidates
+    need to be sorted rather than the full array.
+    """
+    if top_k >= len(similarities):
+        return np.argsort(similarities)[::-1]
+    if top_k <= 0:
+        return np.array([], dtype=np.intp)
+
+    candidate_indices = np.argpartition(similarities, -top_k)[-top_k:]
+    return candidate_indices[np.argsort(similarities[candidate_indices])[::-1]]
+
+
+class VectorIndex(ABC):
+    """
+    Interface for the search strategies that can be used by the `SimpleVectorDatabase`.
+
+    An index does not own the embeddings; it receives the L2-normalized embeddings matrix on every search,
+    so that the same index can be used regardless of how the matrix is stored.
+    """
+
+    @abstractmethod
+    def search(
+        self, embeddings_matrix: np.ndarray, query_embedding: np.ndarray, top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the rows in the embeddings matrix that are most similar to the query embedding.
+
+        Args:
+            embeddings_matrix (np.ndarray): The L2-normalized embeddings matrix of shape (n_rows, dim).
+            query_embedding (np.ndarray): The L2-normalized query embedding of shape (dim,).
+            top_k (int): The number of rows to retrieve.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The row indices and their similarities, sorted by descending similarity.
+        """
+
+    def search_batch(
+        self, embeddings_matrix: np.ndarray, query_embeddings: np.ndarray, top_k: int
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Finds the most similar rows for each query embedding in a batch of shape (n_queries, dim).
+        Returns the result of `search` for each query.
+        """
+        return [self.search(embeddings_matrix, query_embedding, top_k) for query_embedding in query_embeddings]
+
+
+class ExactIndex(VectorIndex):
+    """
+    Brute-force search that compares the query to every row in the embeddings matrix.
+    """
+
+    def search(
+        self, embeddings_matrix: np.ndarray, query_embedding: np.ndarray, top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        similarities = embeddings_matrix @ query_embedding
+        indices = top_k_indices(similarities, top_k)
+        return indices, similarities[indices]
+
+    def search_batch(
+        self, embeddings_matrix: np.ndarray, query_embeddings: np.ndarray, top_k: int
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # A single matrix-matrix product reads the embeddings matrix once for the whole batch.
+        similarities = (embeddings_matrix @ query_embeddings.T).T
+        results = []
+        for query_similarities in similarities:
+            indices = top_k_indices(query_similarities, top_k)
+            results.append((indices, query_similarities[indices]))
+        return results
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted file index. The embeddings are clustered with spherical k-means, and a query is only compared to
+    the rows in the `n_probe` clusters whose centroids are most similar to the query.
+
+    Increasing `n_probe` improves the recall at the cost of latency. With `n_probe` equal to the number of clusters,
+    the results are identical to those of the `ExactIndex`.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, n_probe: int = 32):
+        """
+        Initializes the IVFIndex from trained centroids and the cluster assignment of every row.
+
+        Args:
+            centroids (np.ndarray): The L2-normalized cluster centroids of shape (n_lists, dim).
+            assignments (np.ndarray): The cluster index for every row in the embeddings matrix.
+            n_probe (int, optional): The number of clusters to search per query. Defaults to 32.
+        """
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.n_probe = n_probe
+        # Store the row indices grouped per cluster, so that the rows of cluster `i`
+        # are `self.row_indices[self.offsets[i] : self.offsets[i + 1]]`.
+        self.row_indices = np.argsort(assignments, kind="stable")
+        self.offsets = np.searchsorted(assignments[self.row_indices], np.arange(len(self.centroids) + 1))
+
+    def search(
+        self, embeddings_matrix: np.ndarray, query_embedding: np.ndarray, top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        probed_lists = top_k_indices(self.centroids @ query_embedding, self.n_probe)
+        candidate_indices = np.concatenate(
+            [self.row_indices[self.offsets[i] : self.offsets[i + 1]] for i in probed_lists]
+        )
+
+        similarities = embeddings_matrix[candidate_indices] @ query_embedding
+        indices = top_k_indices(similarities, top_k)
+        return candidate_indices[indices], similarities[indices]
+
+    @staticmethod
+    def train_centroids(
+        embeddings_matrix: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_iterations: int = 20,
+        sample_size: Optional[int] = None,
+        seed: int = 0,
+    ) -> np.ndarray:
+        """
+        Trains the cluster centroids with spherical k-means on a random sample of the embeddings matrix.
+
+        Args:
+            embeddings_matrix (np.ndarray): The L2-normalized embeddings matrix of shape (n_rows, dim).
+            n_lists (int, optional): The number of clusters. Defaults to 4 * sqrt(n_rows).
+            n_iterations (int, optional): The number of k-means iterations. Defaults to 20.
+            sample_size (int, optional): The number of rows used for training. Defaults to 64 rows per cluster.
+            seed (int, optional): The random seed. Defaults to 0.
+
+        Returns:
+            np.ndarray: The L2-normalized centroids of shape (n_lists, dim).
+        """
+        rng = np.random.default_rng(seed)
+        n_rows = len(embeddings_matrix)
+        n_lists = min(n_lists or int(4 * np.sqrt(n_rows)), n_rows)
+        sample_size = min(sample_size or 64 * n_lists, n_rows)
+
+        logging.info(f"Training {n_lists:,} IVF centroids on a sample of {sample_size:,} embeddings...")
+        sample = embeddings_matrix[np.sort(rng.choice(n_rows, size=sample_size, replace=False))]
+        centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+
+        for _ in range(n_iterations):
+            assignments = IVFIndex.assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=n_lists)
+
+            # Re-initialize empty clusters with random points from the sample.
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(sample_size, size=empty.sum(), replace=False)]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            centroids = (sums / norms).astype(np.float32)
+
+        return centroids
+
+    @staticmethod
+    def assign(embeddings_matrix: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+        """
+        Assigns every row of the embeddings matrix to its most similar centroid.
+        The rows are processed in batches to bound the size of the intermediate similarity matrix.
+        """
+        assignments = np.empty(len(embeddings_matrix), dtype=np.int32)
+        for start in range(0, len(embeddings_matrix), batch_size):
+            batch = embeddings_matrix[start : start + batch_size]
+            assignments[start : start + batch_size] = np.argmax(batch @ centroids.T, axis=1)
+        return assignments
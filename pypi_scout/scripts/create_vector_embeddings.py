@@ -1,12 +1,19 @@
 import logging
+import os
 from pathlib import Path
+from typing import Optional
 
+import numpy as np
 import polars as pl
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 
-from pypi_scout.config import Config
+from pypi_scout.config import Config, EmbeddingsChunking, EmbeddingsQuantization, EncoderBackend, VectorIndexType
 from pypi_scout.embeddings.embeddings_creator import VectorEmbeddingCreator
+from pypi_scout.embeddings.embeddings_model import EmbeddingsModel, load_embeddings_model
+from pypi_scout.embeddings.quantized_embeddings import QuantizedEmbeddings
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.embeddings.text_chunker import TextChunker
+from pypi_scout.embeddings.vector_index import IVFIndex
 from pypi_scout.utils.logging import setup_logging
 
 
@@ -17,12 +24,92 @@ def read_processed_dataset(path_to_processed_dataset: Path):
     return df
 
 
+def read_previous_embeddings(config: Config) -> Optional[pl.DataFrame]:
+    """
+    Reads the embeddings and text hashes from a previous run of `create_vector_embeddings`, so that the embeddings of
+    unchanged packages can be reused. Returns None if incremental embeddings are disabled or there is no previous run.
+    """
+    embeddings_path = config.DATA_DIR / config.EMBEDDINGS_PARQUET_NAME
+    if not config.INCREMENTAL_EMBEDDINGS or not embeddings_path.exists():
+        return None
+
+    logging.info(f"Reading previous embeddings from `{embeddings_path}`...")
+    df_previous = pl.read_parquet(embeddings_path)
+    logging.info(f"📊 Number of rows in the previous embeddings: {len(df_previous):,}")
+    return df_previous
+
+
 def write_parquet(df: pl.DataFrame, processed_dataset_path: Path):
     logging.info(f"Storing dataset in {processed_dataset_path}...")
     df.write_parquet(processed_dataset_path)
     logging.info("✅ Done!")
 
 
+def write_embeddings_matrix(df_names: pl.DataFrame, embeddings_matrix: np.ndarray, config: Config):
+    """
+    Stores the embeddings matrix as a `.npy` file that the API can memory-map, together with the package names
+    (and any other columns in `df_names`) in the same row order.
+    """
+    embeddings_matrix_path = config.DATA_DIR / config.EMBEDDINGS_NPY_NAME
+    logging.info(f"Storing embeddings matrix in {embeddings_matrix_path}...")
+    np.save(embeddings_matrix_path, embeddings_matrix)
+    write_parquet(df_names, config.DATA_DIR / config.EMBEDDINGS_NAMES_PARQUET_NAME)
+
+
+def write_quantized_embeddings(embeddings_matrix: np.ndarray, config: Config):
+    dtype = {EmbeddingsQuantization.FLOAT16: np.float16, EmbeddingsQuantization.INT8: np.int8}[
+        config.EMBEDDINGS_QUANTIZATION
+    ]
+    codes_path = config.DATA_DIR / config.QUANTIZED_EMBEDDINGS_NPY_NAME
+    logging.info(f"Storing {np.dtype(dtype).name} quantized embeddings matrix in {codes_path}...")
+    QuantizedEmbeddings.quantize(embeddings_matrix, dtype).save(
+        codes_path, config.DATA_DIR / config.QUANTIZATION_SCALES_NPY_NAME
+    )
+
+
+def add_ivf_lists(df: pl.DataFrame, embeddings_matrix: np.ndarray, config: Config) -> pl.DataFrame:
+    """
+    Clusters the embeddings for the IVF vector index. The centroids are stored in a separate file, and the cluster of
+    each package is added to the DataFrame as the `ivf_list` column, so it stays aligned with the embeddings.
+    """
+    logging.info("Creating the IVF vector index...")
+    centroids = IVFIndex.train_centroids(embeddings_matrix, n_lists=config.IVF_N_LISTS)
+    df = df.with_columns(ivf_list=pl.Series(IVFIndex.assign(embeddings_matrix, centroids)))
+
+    write_parquet(pl.DataFrame({"centroids": centroids}), config.DATA_DIR / config.IVF_CENTROIDS_PARQUET_NAME)
+    return df
+
+
+def create_text_chunker(model: EmbeddingsModel, config: Config) -> Optional[TextChunker]:
+    if config.EMBEDDINGS_CHUNKING == EmbeddingsChunking.NONE:
+        return None
+
+    # The maximum sequence length of the model includes the two special tokens that the tokenizer adds to every text.
+    max_tokens = config.EMBEDDINGS_CHUNK_MAX_TOKENS or model.max_seq_length - 2
+    logging.info(
+        f"Splitting the texts into at most {config.EMBEDDINGS_MAX_CHUNKS_PER_PACKAGE} chunks of {max_tokens} tokens..."
+    )
+    return TextChunker(
+        model.tokenizer,
+        max_tokens=max_tokens,
+        max_chunks=config.EMBEDDINGS_MAX_CHUNKS_PER_PACKAGE,
+        overlap_tokens=config.EMBEDDINGS_CHUNK_OVERLAP_TOKENS,
+    )
+
+
+def split_into_chunks(df: pl.DataFrame, text_chunker: TextChunker, text_column: str) -> pl.DataFrame:
+    """
+    Splits every row into a row per chunk of the text in `text_column`. The chunks replace the texts in that column,
+    and the position of each chunk in its text is added as the `chunk_index` column.
+    """
+    chunks = text_chunker.chunk_texts(df[text_column].to_list())
+    df = df.with_columns(pl.Series(text_column, chunks))
+    df = df.with_columns(chunk_index=pl.int_ranges(pl.col(text_column).list.len(), dtype=pl.Int32))
+    df = df.explode(text_column, "chunk_index")
+    logging.info(f"📊 Number of chunks: {len(df):,}")
+    return df
+
+
 def create_vector_embeddings():
     setup_logging()
     load_dotenv()
@@ -32,12 +119,47 @@ def create_vector_embeddings():
     df = df.with_columns(
         summary_and_description_cleaned=pl.concat_str(pl.col("summary"), pl.lit(" - "), pl.col("description_cleaned"))
     )
-    df = VectorEmbeddingCreator(embeddings_model=SentenceTransformer(config.EMBEDDINGS_MODEL_NAME)).add_embeddings(
-        df, text_column="summary_and_description_cleaned"
+    model = load_embeddings_model(config)
+    text_chunker = create_text_chunker(model, config)
+
+    # With multi-vector embeddings, every chunk is embedded as a separate row. With mean-pooled embeddings,
+    # the embeddings creator splits the texts into chunks, and pools the embeddings of the chunks of each package.
+    key_columns = ["name"]
+    if config.EMBEDDINGS_CHUNKING == EmbeddingsChunking.MULTI_VECTOR:
+        df = split_into_chunks(df, text_chunker, "summary_and_description_cleaned")
+        key_columns = ["name", "chunk_index"]
+
+    # ONNX Runtime uses all CPU cores in a single process.
+    n_processes = 1
+    if config.ENCODER_BACKEND == EncoderBackend.TORCH:
+        n_processes = config.EMBEDDINGS_N_PROCESSES or os.cpu_count() or 1
+    embeddings_creator = VectorEmbeddingCreator(
+        embeddings_model=model,
+        sort_by_length=config.EMBEDDINGS_SORT_BY_LENGTH,
+        n_processes=n_processes,
+        checkpoint_dir=config.DATA_DIR / config.EMBEDDINGS_CHECKPOINT_DIR_NAME,
+        text_chunker=text_chunker if config.EMBEDDINGS_CHUNKING == EmbeddingsChunking.MEAN_POOLED else None,
+        model_id=f"{config.EMBEDDINGS_MODEL_NAME}:{config.ENCODER_BACKEND.value}",
+    )
+    df = embeddings_creator.update_embeddings(
+        df, text_column="summary_and_description_cleaned", df_previous=read_previous_embeddings(config)
+    )
+
+    # Store the embeddings in order of descending weekly downloads, so that the API can scan them by popularity.
+    # The sort is stable, so the chunks of a package stay together and in order.
+    df = (
+        df.sort("weekly_downloads", descending=True, maintain_order=True)
+        .select(*key_columns, "embeddings", "text_hash")
+        .unique(subset=key_columns, keep="first", maintain_order=True)
     )
+    embeddings_matrix = SimpleVectorDatabase.create_embeddings_matrix(df["embeddings"])
+    if config.VECTOR_INDEX_TYPE == VectorIndexType.IVF:
+        df = add_ivf_lists(df, embeddings_matrix, config)
 
-    df = df.select("name", "embeddings").unique(subset="name")
     write_parquet(df, config.DATA_DIR / config.EMBEDDINGS_PARQUET_NAME)
+    write_embeddings_matrix(df.drop("embeddings", "text_hash"), embeddings_matrix, config)
+    if config.EMBEDDINGS_QUANTIZATION != EmbeddingsQuantization.NONE:
+        write_quantized_embeddings(embeddings_matrix, config)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,34 @@
+import logging
+
+from dotenv import load_dotenv
+from sentence_transformers import SentenceTransformer
+
+from pypi_scout.config import Config, EncoderBackend
+from pypi_scout.embeddings.onnx_encoder import export_to_onnx
+from pypi_scout.utils.logging import setup_logging
+
+
+def export_onnx_model():
+    """
+    Exports the embeddings model to ONNX, for the ONNX encoder backends. With EncoderBackend.ONNX_INT8, a copy of the
+    model with int8-quantized weights is exported as well.
+    """
+    load_dotenv()
+    config = Config()
+
+    if config.ENCODER_BACKEND == EncoderBackend.TORCH:
+        logging.info("Using the TORCH encoder backend. Skipping the export of the embeddings model to ONNX.")
+        return
+
+    model = SentenceTransformer(config.EMBEDDINGS_MODEL_NAME, device="cpu")
+    export_to_onnx(
+        model,
+        config.DATA_DIR / config.ONNX_MODEL_DIR_NAME,
+        quantize=config.ENCODER_BACKEND == EncoderBackend.ONNX_INT8,
+    )
+    logging.info("✅ Done!")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    export_onnx_model()
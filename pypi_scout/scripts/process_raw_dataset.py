@@ -1,13 +1,18 @@
 import logging
+import os
 
 import polars as pl
 from dotenv import load_dotenv
 
-from pypi_scout.config import Config
-from pypi_scout.data.description_cleaner import CLEANING_FAILED, DescriptionCleaner
+from pypi_scout.config import Config, SearchMode
+from pypi_scout.data.description_cleaner import CLEANING_FAILED, FastDescriptionCleaner
 from pypi_scout.data.raw_data_reader import RawDataReader
+from pypi_scout.embeddings.bm25_index import BM25IndexBuilder
 from pypi_scout.utils.logging import setup_logging
 
+# The columns of the processed dataset that are indexed for the lexical search of SearchMode.HYBRID.
+BM25_TEXT_COLUMNS = ["name", "summary", "description_cleaned"]
+
 
 def read_raw_dataset(path_to_raw_dataset):
     logging.info("📂 Reading the raw dataset...")
@@ -34,9 +39,15 @@ def filter_top_packages(df, frac_data_to_include):
     return df
 
 
-def clean_descriptions(df):
+def create_description_cleaner(config):
+    return FastDescriptionCleaner(
+        n_workers=config.CLEANING_N_WORKERS or os.cpu_count(), chunk_size=config.CLEANING_CHUNK_SIZE
+    )
+
+
+def clean_descriptions(df, description_cleaner, executor=None):
     logging.info("🧹 Cleaning the descriptions...")
-    df = DescriptionCleaner().clean(df, "description", "description_cleaned")
+    df = description_cleaner.clean(df, "description", "description_cleaned", executor)
     df = df.filter(~pl.col("description_cleaned").is_null())
     df = df.filter(pl.col("description_cleaned") != CLEANING_FAILED)
     return df
@@ -48,17 +59,69 @@ def write_csv(df, processed_dataset_path):
     logging.info("✅ Done!")
 
 
+def create_bm25_index_builder(config):
+    if config.SEARCH_MODE != SearchMode.HYBRID:
+        return None
+    logging.info("Creating the BM25 index of the names, summaries and cleaned descriptions...")
+    return BM25IndexBuilder(max_tokens_per_document=config.BM25_MAX_TOKENS_PER_DOCUMENT)
+
+
+def write_bm25_index(bm25_index_builder, config):
+    bm25_index_path = config.DATA_DIR / config.BM25_INDEX_NPZ_NAME
+    logging.info(f"Storing BM25 index in {bm25_index_path}...")
+    bm25_index_builder.build(min_document_frequency=config.BM25_MIN_DOCUMENT_FREQUENCY).save(bm25_index_path)
+    logging.info("✅ Done!")
+
+
+def process_raw_dataset_in_batches(config):
+    logging.info(f"📂 Reading the raw dataset in batches of {config.RAW_DATASET_BATCH_SIZE:,} packages...")
+    batches = RawDataReader(config.DATA_DIR / config.RAW_DATASET_CSV_NAME).read_in_batches(
+        config.RAW_DATASET_BATCH_SIZE, config.FRAC_DATA_TO_INCLUDE
+    )
+
+    processed_dataset_path = config.DATA_DIR / config.PROCESSED_DATASET_CSV_NAME
+    dataset_for_api_path = config.DATA_DIR / config.DATASET_FOR_API_CSV_NAME
+    logging.info(f"Storing datasets in {processed_dataset_path} and {dataset_for_api_path}...")
+    bm25_index_builder = create_bm25_index_builder(config)
+    description_cleaner = create_description_cleaner(config)
+    n_rows, is_first_batch = 0, True
+    # The worker processes that clean the descriptions are started once, and reused for every batch.
+    with description_cleaner.worker_pool() as executor:
+        cleaned_batches = (clean_descriptions(df, description_cleaner, executor) for df in batches)
+        with open(processed_dataset_path, "wb") as processed_file, open(dataset_for_api_path, "wb") as api_file:
+            for df in cleaned_batches:
+                df.write_csv(processed_file, include_header=is_first_batch)
+                df.select(["name", "summary", "weekly_downloads"]).write_csv(api_file, include_header=is_first_batch)
+                if bm25_index_builder is not None:
+                    bm25_index_builder.add_documents(df, BM25_TEXT_COLUMNS)
+                n_rows, is_first_batch = n_rows + len(df), False
+                logging.info(f"Processed {n_rows:,} packages.")
+    logging.info("✅ Done!")
+
+    if bm25_index_builder is not None:
+        write_bm25_index(bm25_index_builder, config)
+
+
 def process_raw_dataset():
     load_dotenv()
     config = Config()
+    if config.STREAM_RAW_DATASET:
+        process_raw_dataset_in_batches(config)
+        return
+
     df = read_raw_dataset(config.DATA_DIR / config.RAW_DATASET_CSV_NAME)
     if config.FRAC_DATA_TO_INCLUDE < 1.0:
         df = filter_top_packages(df, config.FRAC_DATA_TO_INCLUDE)
-    df = clean_descriptions(df)
+    df = clean_descriptions(df, create_description_cleaner(config))
 
     write_csv(df, config.DATA_DIR / config.PROCESSED_DATASET_CSV_NAME)
     write_csv(df.select(["name", "summary", "weekly_downloads"]), config.DATA_DIR / config.DATASET_FOR_API_CSV_NAME)
 
+    bm25_index_builder = create_bm25_index_builder(config)
+    if bm25_index_builder is not None:
+        bm25_index_builder.add_documents(df, BM25_TEXT_COLUMNS)
+        write_bm25_index(bm25_index_builder, config)
+
 
 if __name__ == "__main__":
     setup_logging()
@@ -2,6 +2,7 @@ import logging
 
 from pypi_scout.scripts.create_vector_embeddings import create_vector_embeddings
 from pypi_scout.scripts.download_raw_dataset import download_raw_dataset
+from pypi_scout.scripts.export_onnx_model import export_onnx_model
 from pypi_scout.scripts.process_raw_dataset import process_raw_dataset
 from pypi_scout.scripts.upload_processed_datasets import upload_processed_datasets
 from pypi_scout.utils.logging import setup_logging
@@ -16,6 +17,9 @@ def main():
     logging.info("\n\nPROCESSING RAW DATASET -------------\n")
     process_raw_dataset()
 
+    logging.info("\n\nEXPORTING EMBEDDINGS MODEL -------------\n")
+    export_onnx_model()
+
     logging.info("\n\nCREATING VECTOR EMBEDDINGS -------------\n")
     create_vector_embeddings()
 
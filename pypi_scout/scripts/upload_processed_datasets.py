@@ -1,33 +1,138 @@
+import json
 import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Tuple
 
 from dotenv import load_dotenv
 
-from pypi_scout.config import Config, StorageBackend
+from pypi_scout.config import (
+    Config,
+    EmbeddingsQuantization,
+    EncoderBackend,
+    SearchMode,
+    StorageBackend,
+    VectorIndexType,
+)
+from pypi_scout.embeddings.onnx_encoder import MANIFEST_FILE_NAME
 from pypi_scout.utils.blob_io import BlobIO
 from pypi_scout.utils.logging import setup_logging
 
 
+def get_processed_dataset_file_names(config: Config) -> List[str]:
+    file_names = [
+        config.PROCESSED_DATASET_CSV_NAME,
+        config.DATASET_FOR_API_CSV_NAME,
+        config.EMBEDDINGS_PARQUET_NAME,
+        config.EMBEDDINGS_NPY_NAME,
+        config.EMBEDDINGS_NAMES_PARQUET_NAME,
+    ]
+    if config.VECTOR_INDEX_TYPE == VectorIndexType.IVF:
+        file_names.append(config.IVF_CENTROIDS_PARQUET_NAME)
+    if config.EMBEDDINGS_QUANTIZATION != EmbeddingsQuantization.NONE:
+        file_names.extend([config.QUANTIZED_EMBEDDINGS_NPY_NAME, config.QUANTIZATION_SCALES_NPY_NAME])
+    if config.SEARCH_MODE == SearchMode.HYBRID:
+        file_names.append(config.BM25_INDEX_NPZ_NAME)
+    return file_names
+
+
+def create_dataset_version() -> str:
+    # Versions sort in the order in which they were created.
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def create_local_version_dir(config: Config) -> Tuple[str, Path]:
+    """
+    Creates the directory of a new version in DATA_DIR. Versions are named after the second in which they are created,
+    so a version that is published in the same second as another one gets a counter as suffix.
+    """
+    config.DATA_DIR.mkdir(parents=True, exist_ok=True)
+    base_version = create_dataset_version()
+    for attempt in range(100):
+        # The counter is zero-padded, so that the versions still sort in the order in which they were created.
+        version = base_version if attempt == 0 else f"{base_version}-{attempt:02d}"
+        version_dir = config.DATA_DIR / version
+        try:
+            version_dir.mkdir()
+        except FileExistsError:
+            continue
+        return version, version_dir
+    raise FileExistsError(f"Could not create a new version directory for `{base_version}` in `{config.DATA_DIR}`.")  # noqa: TRY003
+
+
+def publish_local_dataset_version(config: Config, file_names: List[str]) -> str:
+    """
+    Copies the processed datasets into a new version directory in DATA_DIR, and then points the version file to it.
+    The version file is replaced atomically, so the API never reads a version that is only partially copied.
+    """
+    version, version_dir = create_local_version_dir(config)
+    for file_name in file_names:
+        logging.info(f"💫 Copying {file_name} to `{version_dir}`...")
+        shutil.copy2(config.DATA_DIR / file_name, version_dir / file_name)
+
+    version_file_path = config.DATA_DIR / config.DATASET_VERSION_FILE_NAME
+    # Named after the version, so that concurrent publishes do not write the same temporary file.
+    temporary_version_file_path = config.DATA_DIR / f"{config.DATASET_VERSION_FILE_NAME}.{version}.tmp"
+    temporary_version_file_path.write_text(version)
+    os.replace(temporary_version_file_path, version_file_path)
+    return version
+
+
+def upload_onnx_model(blob_io: BlobIO, config: Config) -> None:
+    # The model is shared by all versions of the datasets, so it is uploaded without a version prefix. The manifest is
+    # uploaded last, since the API downloads the files that it lists.
+    model_dir = config.DATA_DIR / config.ONNX_MODEL_DIR_NAME
+    with open(model_dir / MANIFEST_FILE_NAME) as f:
+        file_names = json.load(f)["files"]
+    for file_name in [*file_names, MANIFEST_FILE_NAME]:
+        logging.info(f"💫 Uploading {config.ONNX_MODEL_DIR_NAME}/{file_name} to blob container...")
+        blob_io.upload_local_file(model_dir / file_name, f"{config.ONNX_MODEL_DIR_NAME}/{file_name}")
+
+
 def upload_processed_datasets():
     load_dotenv()
     config = Config()
+    file_names = get_processed_dataset_file_names(config)
 
     if config.STORAGE_BACKEND != StorageBackend.BLOB:
+        if config.VERSIONED_DATASETS:
+            version = publish_local_dataset_version(config, file_names)
+            logging.info(f"✅ Published version `{version}` of the datasets!")
+            return
+
         logging.info(
             "Not using BLOB backend. Skipping upload. To enable, configure the `STORAGE_BACKEND_` variables in config"
         )
         return
 
-    file_names = [config.PROCESSED_DATASET_CSV_NAME, config.DATASET_FOR_API_CSV_NAME, config.EMBEDDINGS_PARQUET_NAME]
-
     blob_io = BlobIO(
         config.STORAGE_BACKEND_BLOB_ACCOUNT_NAME,
         config.STORAGE_BACKEND_BLOB_CONTAINER_NAME,
         config.STORAGE_BACKEND_BLOB_KEY,
+        max_concurrency=config.BLOB_MAX_CONCURRENCY,
     )
 
+    # With versioned datasets, the files are uploaded under a new prefix, and the version file is only updated once
+    # all of them, and the ONNX model, are uploaded.
+    prefix = ""
+    if config.VERSIONED_DATASETS:
+        version = create_dataset_version()
+        prefix = f"{version}/"
+
     for file_name in file_names:
-        logging.info(f"💫 Uploading {file_name} to blob container `{config.STORAGE_BACKEND_BLOB_CONTAINER_NAME}`...")
-        blob_io.upload_local_file(config.DATA_DIR / file_name, file_name)
+        logging.info(
+            f"💫 Uploading {file_name} to blob container `{config.STORAGE_BACKEND_BLOB_CONTAINER_NAME}` as `{prefix}{file_name}`..."
+        )
+        blob_io.upload_local_file(config.DATA_DIR / file_name, f"{prefix}{file_name}")
+
+    if config.ENCODER_BACKEND != EncoderBackend.TORCH:
+        upload_onnx_model(blob_io, config)
+
+    if config.VERSIONED_DATASETS:
+        blob_io.upload_text(version, config.DATASET_VERSION_FILE_NAME)
+        logging.info(f"Published version `{version}` of the datasets.")
 
     logging.info("✅ Done!")
 
@@ -1,8 +1,14 @@
+import io
+import json
+import logging
+import os
 import tempfile
 from enum import Enum
+from pathlib import Path
+from typing import IO, Any, Callable, Optional, Union
 
 import polars as pl
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, ContainerClient
 
 
 class Format(Enum):
@@ -11,19 +17,114 @@ class Format(Enum):
 
 
 class BlobIO:
-    def __init__(self, account_name: str, container_name: str, account_key: str):
+    """
+    Uploads and downloads files to and from a container in Azure Blob Storage.
+
+    Large blobs are downloaded with `max_concurrency` parallel ranged requests, straight into the file or buffer that
+    they are read from. If a `cache_dir` is set, downloaded DataFrames are cached on disk, and files that were
+    downloaded before are only downloaded again if the ETag of the blob changed, so a restart does not download
+    blobs that are unchanged.
+    """
+
+    # Suffix of the file next to every downloaded file that holds the ETag and last-modified time of its blob.
+    BLOB_PROPERTIES_SUFFIX = ".blob.json"
+
+    def __init__(
+        self,
+        account_name: str,
+        container_name: str,
+        account_key: str,
+        max_concurrency: int = 1,
+        cache_dir: Optional[Path] = None,
+        container_client: Optional[ContainerClient] = None,
+    ):
+        """
+        Initializes the BlobIO.
+
+        Args:
+            account_name (str): The name of the storage account.
+            container_name (str): The name of the container.
+            account_key (str): The key of the storage account.
+            max_concurrency (int, optional): The number of parallel connections used per upload or download.
+                Defaults to 1.
+            cache_dir (Optional[Path], optional): The directory in which downloaded DataFrames are cached. If None,
+                they are downloaded into memory every time. Defaults to None.
+            container_client (Optional[ContainerClient], optional): The client of the container. Defaults to a client
+                for the container in the storage account.
+        """
         self.account_name = account_name
         self.container_name = container_name
         self.account_key = account_key
-        self.service_client = BlobServiceClient(
-            account_url=f"https://{account_name}.blob.core.windows.net", credential=account_key
-        )
-        self.container_client = self.service_client.get_container_client(container_name)
+        self.max_concurrency = max_concurrency
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if container_client is None:
+            self.service_client = BlobServiceClient(
+                account_url=f"https://{account_name}.blob.core.windows.net", credential=account_key
+            )
+            container_client = self.service_client.get_container_client(container_name)
+        self.container_client = container_client
 
     def upload_local_file(self, local_file_path: str, blob_name: str) -> None:
         with open(local_file_path, "rb") as data:
             blob_client = self.container_client.get_blob_client(blob_name)
-            blob_client.upload_blob(data, overwrite=True)
+            blob_client.upload_blob(data, overwrite=True, max_concurrency=self.max_concurrency)
+
+    def upload_text(self, text: str, blob_name: str) -> None:
+        blob_client = self.container_client.get_blob_client(blob_name)
+        blob_client.upload_blob(text.encode(), overwrite=True)
+
+    def download_text(self, blob_name: str) -> str:
+        blob_client = self.container_client.get_blob_client(blob_name)
+        return blob_client.download_blob().readall().decode()
+
+    def download_to_file(self, blob_name: str, local_file_path: Union[str, Path]) -> bool:
+        """
+        Downloads the blob to a local file, unless the file was downloaded before from the blob with the same ETag.
+
+        The blob is downloaded to a temporary file that replaces the local file once it is complete, so the local file
+        is never partially written, and a process that has memory-mapped the previous file can keep using it.
+
+        Returns:
+            bool: Whether the blob was downloaded, rather than found unchanged on disk.
+        """
+        local_file_path = Path(local_file_path)
+        properties_path = local_file_path.with_name(local_file_path.name + self.BLOB_PROPERTIES_SUFFIX)
+        blob_client = self.container_client.get_blob_client(blob_name)
+
+        if local_file_path.exists() and properties_path.exists():
+            with open(properties_path) as f:
+                cached_etag = json.load(f)["etag"]
+            if cached_etag == blob_client.get_blob_properties().etag:
+                logging.info(f"`{local_file_path}` is up to date with blob `{blob_name}`. Skipping download.")
+                return False
+
+        # The properties are removed first, so an interrupted download is never mistaken for an up-to-date file.
+        properties_path.unlink(missing_ok=True)
+        local_file_path.parent.mkdir(parents=True, exist_ok=True)
+        downloader = blob_client.download_blob(max_concurrency=self.max_concurrency)
+        self._write_atomically(local_file_path, downloader.readinto)
+
+        # These are the properties of the version of the blob that was downloaded, even if it changed meanwhile.
+        properties = {"etag": downloader.properties.etag, "last_modified": str(downloader.properties.last_modified)}
+        self._write_atomically(properties_path, lambda f: f.write(json.dumps(properties).encode()))
+        return True
+
+    @staticmethod
+    def _write_atomically(path: Path, write: Callable[[IO[bytes]], Any]) -> None:
+        """
+        Writes a file through a temporary file with a unique name in the same directory, which then replaces the file.
+        Processes that download the same blob at the same time, like the workers of the API when they start, each
+        write their own temporary file, so the file is always one complete download.
+        """
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False) as f:
+            temporary_file_path = Path(f.name)
+            try:
+                write(f)
+            except BaseException:
+                f.close()
+                temporary_file_path.unlink(missing_ok=True)
+                raise
+        os.replace(temporary_file_path, path)
 
     def download_csv_to_df(self, blob_name: str):
         return self._download_as_df(blob_name, Format.CSV)
@@ -33,20 +134,23 @@ class BlobIO:
 
     def _download_as_df(self, blob_name: str, format: Format) -> pl.DataFrame:  # noqa: A002
         """
-        //TODO: Improve by not reading into a file first.
+        With a cache directory, the blob is downloaded into the cache if it changed, and read from there. Otherwise,
+        it is downloaded into an in-memory buffer that Polars reads directly.
         """
-        blob_client = self.container_client.get_blob_client(blob_name)
-        download_stream = blob_client.download_blob()
-
-        with tempfile.NamedTemporaryFile(delete=True) as temp_file:
-            temp_file.write(download_stream.readall())
-            temp_file.flush()
+        if self.cache_dir is not None:
+            source = self.cache_dir / blob_name
+            self.download_to_file(blob_name, source)
+        else:
+            source = io.BytesIO()
+            blob_client = self.container_client.get_blob_client(blob_name)
+            blob_client.download_blob(max_concurrency=self.max_concurrency).readinto(source)
+            source.seek(0)
 
-            if format == Format.CSV:
-                return pl.read_csv(temp_file.name)
+        if format == Format.CSV:
+            return pl.read_csv(source)
 
-            if format == Format.PARQUET:
-                return pl.read_parquet(temp_file.name)
+        if format == Format.PARQUET:
+            return pl.read_parquet(source)
 
     def exists(self, blob_name):
         blob_client = self.container_client.get_blob_client(blob_name)
@@ -0,0 +1,13 @@
+import resource
+import sys
+
+
+def get_peak_memory_usage_mb() -> float:
+    """
+    Returns the peak resident set size (RSS) of the current process in megabytes.
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS, and in kilobytes on Linux.
+    if sys.platform == "darwin":
+        return peak_rss / 1024**2
+    return peak_rss / 1024
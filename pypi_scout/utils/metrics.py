@@ -0,0 +1,198 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds of the latency histogram buckets in seconds, from half a millisecond to ten seconds.
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(label_names: Sequence[str], label_values: Tuple[str, ...], extra: str = "") -> str:
+    labels = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _get_label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric `{self.name}` expects the labels {self.label_names}, got {tuple(labels)}.")  # noqa: TRY003
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def collect(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+
+
+class Counter(_Metric):
+    """
+    A value per combination of labels that only increases, like the number of requests or the seconds spent on a task.
+    """
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        label_values = self._get_label_values(labels)
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._get_label_values(labels), 0.0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return super().collect() + [
+            f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}"
+            for label_values, value in values
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Counts observations, like latencies, per combination of labels in cumulative buckets, and keeps their count and sum,
+    so that quantiles can be estimated over any time window from the scraped values.
+    """
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per combination of labels: the number of observations per bucket, with a last bucket for +Inf, and the sum.
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        label_values = self._get_label_values(labels)
+        with self._lock:
+            bucket_counts, total = self._values.setdefault(label_values, ([0] * (len(self.buckets) + 1), [0.0]))
+            bucket_counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = sorted(
+                (label_values, (list(counts), total[0])) for label_values, (counts, total) in self._values.items()
+            )
+
+        lines = super().collect()
+        for label_values, (bucket_counts, total) in values:
+            cumulative_count = 0
+            for upper_bound, count in zip([*self.buckets, float("inf")], bucket_counts):
+                cumulative_count += count
+                bound = "+Inf" if upper_bound == float("inf") else _format_value(upper_bound)
+                labels = _format_labels(self.label_names, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative_count}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative_count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    A collection of metrics that is rendered in the Prometheus text exposition format, for a `/metrics` endpoint.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics.values() for line in metric.collect()) + "\n"
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"A metric named `{metric.name}` is already registered.")  # noqa: TRY003
+        self._metrics[metric.name] = metric
+        return metric
+
+
+class StageTimer:
+    """
+    Measures the duration of the stages of a single unit of work, like a search or loading the datasets. Every duration
+    is passed to `observe`, for example to record it in a histogram, and is kept per stage, for example for a
+    `Server-Timing` header. A stage that occurs more than once is kept as the sum of its durations.
+    """
+
+    def __init__(
+        self,
+        observe: Optional[Callable[[str, float], None]] = None,
+        durations: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Initializes the StageTimer.
+
+        Args:
+            observe (Optional[Callable[[str, float], None]], optional): Called with the name and the duration in seconds
+                of every stage when it ends. Defaults to None.
+            durations (Optional[Dict[str, float]], optional): The durations of stages that were measured elsewhere, for
+                example by the batch that a request was searched in. They are kept, but not passed to `observe`.
+                Defaults to None.
+        """
+        self.observe = observe
+        self.durations: Dict[str, float] = dict(durations or {})
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, duration: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+        if self.observe is not None:
+            self.observe(name, duration)
+
+    def server_timing(self) -> str:
+        """
+        Returns the durations as the value of a `Server-Timing` header, in milliseconds.
+        """
+        return ", ".join(f"{name};dur={duration * 1000:.2f}" for name, duration in self.durations.items())
+
+    def summary(self) -> str:
+        return ", ".join(f"{name}: {duration:.2f}s" for name, duration in self.durations.items())
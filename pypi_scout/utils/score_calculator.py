@@ -1,39 +1,34 @@
-import polars as pl
+import numpy as np
 
 
-def calculate_score(
-    df: pl.DataFrame, weight_similarity: float = 0.5, weight_weekly_downloads: float = 0.5
-) -> pl.DataFrame:
+def calculate_score_from_arrays(
+    similarity: np.ndarray,
+    log_weekly_downloads: np.ndarray,
+    weight_similarity: float = 0.5,
+    weight_weekly_downloads: float = 0.5,
+) -> np.ndarray:
     """
-    Calculate a combined score for packages based on similarity and weekly downloads.
+    Calculate a combined score for the matches of a query, based on their similarity and weekly downloads.
 
-    This function normalizes the 'similarity' and 'weekly_downloads' columns to a [0, 1] scale,
-    and computes a combined score using the provided weights for similarity and weekly downloads.
-    The combined score helps in recommending packages that are both popular and relevant based on similarity.
+    Both are normalized to a [0, 1] scale over the matches, and combined with the provided weights, so that packages
+    are recommended that are both relevant and popular. The log of the weekly downloads should be precomputed, so the
+    score is a single fused expression over the matches. The result is not sorted; use `top_k_indices` to select the
+    best matches. If all matches have the same value for a column, its normalized value is 0 rather than NaN.
 
     Args:
-        df (pl.DataFrame): DataFrame containing 'similarity' and 'weekly_downloads' columns.
+        similarity (np.ndarray): The similarity of each match.
+        log_weekly_downloads (np.ndarray): log1p of the weekly downloads of each match.
         weight_similarity (float): Weight for the similarity score in the combined score calculation. Default is 0.5.
         weight_weekly_downloads (float): Weight for the weekly downloads score in the combined score calculation. Default is 0.5.
 
     Returns:
-        pl.DataFrame: DataFrame with the combined score and sorted by this score in descending order.
+        np.ndarray: The combined score of each match.
     """
-    df = df.with_columns(
-        log_weekly_downloads=pl.col("weekly_downloads").log1p()  # log1p is log(1 + x)
-    )
+    if len(similarity) == 0:
+        return np.empty(0, dtype=np.float32)
 
-    df = df.with_columns(
-        normalized_similarity=(pl.col("similarity") - pl.col("similarity").min())
-        / (pl.col("similarity").max() - pl.col("similarity").min()),
-        normalized_log_weekly_downloads=(pl.col("log_weekly_downloads") - pl.col("log_weekly_downloads").min())
-        / (pl.col("log_weekly_downloads").max() - pl.col("log_weekly_downloads").min()),
-    )
+    def normalize(values: np.ndarray) -> np.ndarray:
+        minimum, value_range = values.min(), np.ptp(values)
+        return (values - minimum) / value_range if value_range > 0 else np.zeros_like(values)
 
-    df = df.with_columns(
-        score=weight_similarity * pl.col("normalized_similarity")
-        + weight_weekly_downloads * pl.col("normalized_log_weekly_downloads")
-    )
-
-    df = df.sort("score", descending=True)
-    return df
+    return weight_similarity * normalize(similarity) + weight_weekly_downloads * normalize(log_weekly_downloads)
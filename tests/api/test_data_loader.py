@@ -0,0 +1,85 @@
+import json
+
+from pypi_scout.api.data_loader import ApiDataLoader
+from pypi_scout.config import Config, EncoderBackend, StorageBackend
+from pypi_scout.embeddings.onnx_encoder import MANIFEST_FILE_NAME
+from pypi_scout.scripts import upload_processed_datasets
+from pypi_scout.scripts.upload_processed_datasets import publish_local_dataset_version
+
+
+def test_read_dataset_version_without_versioned_datasets(tmp_path):
+    assert ApiDataLoader.read_dataset_version(Config(DATA_DIR=tmp_path)) is None
+
+
+def test_publish_local_dataset_version(tmp_path):
+    config = Config(DATA_DIR=tmp_path, VERSIONED_DATASETS=True)
+    (tmp_path / "a.csv").write_text("name\\nnumpy\\n")
+
+    version = publish_local_dataset_version(config, ["a.csv"])
+
+    assert ApiDataLoader.read_dataset_version(config) == version
+    assert (tmp_path / version / "a.csv").read_text() == "name\\nnumpy\\n"
+    assert ApiDataLoader(config, version).data_dir == tmp_path / version
+
+
+def test_publish_local_dataset_version_twice_in_the_same_second(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "pypi_scout.scripts.upload_processed_datasets.create_dataset_version", lambda: "20240101T000000Z"
+    )
+    config = Config(DATA_DIR=tmp_path, VERSIONED_DATASETS=True)
+    (tmp_path / "a.csv").write_text("name\\nnumpy\\n")
+
+    versions = [publish_local_dataset_version(config, ["a.csv"]) for _ in range(3)]
+
+    assert versions == ["20240101T000000Z", "20240101T000000Z-01", "20240101T000000Z-02"]
+    assert versions == sorted(versions)
+    assert ApiDataLoader.read_dataset_version(config) == versions[-1]
+
+
+def test_remove_older_versions(tmp_path):
+    config = Config(DATA_DIR=tmp_path, VERSIONED_DATASETS=True)
+    versions = ["20240101T000000Z", "20240101T000000Z-01", "20240102T000000Z", "20240103T000000Z"]
+    for parent_dir in [tmp_path, tmp_path / config.BLOB_CACHE_DIR_NAME]:
+        for version in versions:
+            (parent_dir / version).mkdir(parents=True)
+            (parent_dir / version / "a.csv").write_text("name\nnumpy\n")
+    (tmp_path / config.ONNX_MODEL_DIR_NAME).mkdir()
+    (tmp_path / "a.csv").write_text("name\nnumpy\n")
+
+    ApiDataLoader.remove_older_versions(config, "20240102T000000Z")
+
+    for parent_dir in [tmp_path, tmp_path / config.BLOB_CACHE_DIR_NAME]:
+        assert sorted(path.name for path in parent_dir.iterdir() if path.name in versions) == versions[2:]
+    assert (tmp_path / config.ONNX_MODEL_DIR_NAME).is_dir()
+    assert (tmp_path / "a.csv").exists()
+
+
+def test_upload_processed_datasets_publishes_version_after_onnx_model(tmp_path, monkeypatch):
+    config = Config(DATA_DIR=tmp_path, VERSIONED_DATASETS=True, ENCODER_BACKEND=EncoderBackend.ONNX)
+    config.STORAGE_BACKEND = StorageBackend.BLOB
+    for file_name in upload_processed_datasets.get_processed_dataset_file_names(config):
+        (tmp_path / file_name).write_text("")
+    model_dir = tmp_path / config.ONNX_MODEL_DIR_NAME
+    model_dir.mkdir()
+    (model_dir / "model.onnx").write_text("")
+    (model_dir / MANIFEST_FILE_NAME).write_text(json.dumps({"files": ["model.onnx"]}))
+
+    uploaded_blob_names = []
+
+    class RecordingBlobIO:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def upload_local_file(self, local_file_path, blob_name):
+            uploaded_blob_names.append(blob_name)
+
+        def upload_text(self, text, blob_name):
+            uploaded_blob_names.append(blob_name)
+
+    monkeypatch.setattr(upload_processed_datasets, "Config", lambda: config)
+    monkeypatch.setattr(upload_processed_datasets, "BlobIO", RecordingBlobIO)
+
+    upload_processed_datasets.upload_processed_datasets()
+
+    assert uploaded_blob_names[-1] == config.DATASET_VERSION_FILE_NAME
+    assert f"{config.ONNX_MODEL_DIR_NAME}/{MANIFEST_FILE_NAME}" in uploaded_blob_names
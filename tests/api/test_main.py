@@ -0,0 +1,166 @@
+import importlib
+import sys
+import time
+import zlib
+from functools import partial
+
+import numpy as np
+import polars as pl
+import pytest
+from fastapi.testclient import TestClient
+
+from pypi_scout.config import Config
+
+PACKAGES = {
+    "name": ["orjson", "requests", "httpx", "pandas", "polars", "click"],
+    "summary": [
+        "Fast json parsing and serialization",
+        "Simple http client for humans",
+        "Async http client with http2 support",
+        "Dataframe library for data analysis",
+        "Fast dataframe library written in rust",
+        "Command line interface toolkit",
+    ],
+    "weekly_downloads": [1_000, 50_000, 20_000, 40_000, 5_000, 30_000],
+}
+
+
+class StubEncoder:
+    """
+    Encodes a text as the counts of its words hashed into a few dimensions, so texts that share words are similar.
+    """
+
+    dim = 16
+    max_seq_length = 128
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False, normalize_embeddings=False):
+        texts = [sentences] if isinstance(sentences, str) else sentences
+        embeddings = np.full((len(texts), self.dim), 0.01, dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                embeddings[row, zlib.crc32(word.encode()) % self.dim] += 1
+        return embeddings[0] if isinstance(sentences, str) else embeddings
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    """
+    Imports the API with a stub encoder and a tiny dataset, and returns the module. The API is configured when it is
+    imported, so the tests change `api.config` to test other settings.
+    """
+    data_dir = tmp_path_factory.mktemp("data")
+    config = Config(DATA_DIR=data_dir)
+    df_packages = pl.DataFrame(PACKAGES)
+    df_packages.write_csv(data_dir / config.DATASET_FOR_API_CSV_NAME)
+    df_packages.select("name").write_parquet(data_dir / config.EMBEDDINGS_NAMES_PARQUET_NAME)
+    embeddings = StubEncoder().encode(PACKAGES["summary"])
+    np.save(data_dir / config.EMBEDDINGS_NPY_NAME, embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True))
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+        monkeypatch.setattr("pypi_scout.config.Config", partial(Config, DATA_DIR=data_dir))
+        monkeypatch.setattr(
+            "pypi_scout.embeddings.embeddings_model.load_embeddings_model", lambda config, download: StubEncoder()
+        )
+        if "pypi_scout.api.main" in sys.modules:
+            api = importlib.reload(sys.modules["pypi_scout.api.main"])
+        else:
+            api = importlib.import_module("pypi_scout.api.main")
+    api.limiter.enabled = False
+    return api
+
+
+@pytest.fixture(scope="module")
+def client(api):
+    with TestClient(api.app) as client:
+        yield client
+
+
+def test_batch_search_rejects_too_many_queries(api, client, monkeypatch):
+    monkeypatch.setattr(api.config, "BATCH_SEARCH_MAX_QUERIES", 2)
+    queries = [{"query": "http client", "top_k": 2}] * 3
+
+    response = client.post("/api/search/batch", json={"queries": queries})
+
+    assert response.status_code == 400
+
+
+def test_batch_search_returns_results_in_query_order(client):
+    queries = [
+        {"query": "dataframe library", "top_k": 2},
+        {"query": "http client", "top_k": 3},
+        {"query": "json parsing", "top_k": 1},
+    ]
+
+    response = client.post("/api/search/batch", json={"queries": queries})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [len(result["matches"]) for result in results] == [2, 3, 1]
+    assert len({result["matches"][0]["name"] for result in results}) == 3
+
+    # The similarities of a batch are computed with a single matrix product, so they may differ in the last bits.
+    for result, query in zip(results, queries):
+        matches = client.post("/api/search", json=query).json()["matches"]
+        assert [match["name"] for match in result["matches"]] == [match["name"] for match in matches]
+        assert [match["similarity"] for match in result["matches"]] == pytest.approx(
+            [match["similarity"] for match in matches], abs=1e-5
+        )
+
+
+def test_search_reports_stages_in_server_timing_header_and_metrics(api, client, monkeypatch):
+    monkeypatch.setattr(api.config, "SERVER_TIMING_HEADER", True)
+
+    response = client.post("/api/search", json={"query": "rust dataframe", "top_k": 2})
+
+    assert response.status_code == 200
+    stages = [entry.split(";dur=")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert {"encode", "similarity", "join"} <= set(stages)
+
+    metrics = client.get("/metrics")
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE pypi_scout_search_stage_seconds histogram" in metrics.text
+    for stage in ["encode", "similarity", "join"]:
+        assert f'pypi_scout_search_stage_seconds_bucket{{stage="{stage}",le="+Inf"}}' in metrics.text
+    assert 'pypi_scout_http_requests_total{method="POST",path="/api/search",status="200"}' in metrics.text
+
+
+def test_search_has_no_server_timing_header_by_default(client):
+    response = client.post("/api/search", json={"query": "rust dataframe", "top_k": 2})
+
+    assert "Server-Timing" not in response.headers
+
+
+def test_admin_reload_is_disabled_without_admin_token(api, client, monkeypatch):
+    monkeypatch.setattr(api.config, "ADMIN_TOKEN", None)
+
+    response = client.post("/api/admin/reload", headers={"Authorization": "Bearer secret"})
+
+    assert response.status_code == 404
+
+
+def test_admin_reload_rejects_wrong_token(api, client, monkeypatch):
+    monkeypatch.setattr(api.config, "ADMIN_TOKEN", "secret")
+    snapshot = api.snapshot_reloader.snapshot
+
+    assert client.post("/api/admin/reload").status_code == 401
+    assert client.post("/api/admin/reload", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert api.snapshot_reloader.snapshot is snapshot
+
+
+def test_admin_reload_with_token_swaps_in_new_snapshot(api, client, monkeypatch):
+    monkeypatch.setattr(api.config, "ADMIN_TOKEN", "secret")
+    snapshot = api.snapshot_reloader.snapshot
+
+    response = client.post("/api/admin/reload", headers={"Authorization": "Bearer secret"})
+
+    assert response.status_code == 202
+    assert response.json()["status"] == "started"
+    deadline = time.monotonic() + 10
+    while api.snapshot_reloader.is_reloading and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert api.snapshot_reloader.snapshot is not snapshot
+    assert client.post("/api/search", json={"query": "http client", "top_k": 1}).status_code == 200
@@ -0,0 +1,29 @@
+import numpy as np
+import polars as pl
+
+from pypi_scout.api.package_metadata import PackageMetadata
+
+
+def test_from_packages_aligns_rows_with_names():
+    df_packages = pl.DataFrame(
+        {
+            "name": ["a", "b", "c"],
+            "summary": ["summary a", "summary b", "summary c"],
+            "weekly_downloads": [10, 0, 99],
+        }
+    )
+
+    metadata = PackageMetadata.from_packages(df_packages, pl.Series(["c", "a", "b"]))
+
+    assert metadata.name.tolist() == ["c", "a", "b"]
+    assert metadata.summary.tolist() == ["summary c", "summary a", "summary b"]
+    np.testing.assert_allclose(metadata.log_weekly_downloads, np.log1p([99, 10, 0]), rtol=1e-6)
+
+
+def test_get_matches():
+    df_packages = pl.DataFrame({"name": ["a", "b"], "summary": ["summary a", "summary b"], "weekly_downloads": [1, 2]})
+    metadata = PackageMetadata.from_packages(df_packages, df_packages["name"])
+
+    matches = metadata.get_matches(np.array([1]), np.array([0.5], dtype=np.float32))
+
+    assert matches == [{"name": "b", "summary": "summary b", "similarity": 0.5, "weekly_downloads": 2}]
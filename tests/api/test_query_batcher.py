@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from pypi_scout.api.query_batcher import QueryBatcher
+from pypi_scout.api.search_executor import SearchExecutor
+
+
+def create_batcher(process_batch, max_batch_size=16, max_wait_ms=5.0):
+    executor = SearchExecutor(max_concurrency=1, max_queue_size=4)
+    return QueryBatcher(process_batch, executor, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+
+def test_queries_that_arrive_together_are_processed_as_one_batch():
+    batches = []
+
+    def process_batch(queries):
+        batches.append(queries)
+        return [query.upper() for query in queries]
+
+    batcher = create_batcher(process_batch)
+
+    async def submit_queries():
+        return await asyncio.gather(*[batcher.submit(query) for query in ["a", "b", "c"]])
+
+    assert asyncio.run(submit_queries()) == ["A", "B", "C"]
+    assert batches == [["a", "b", "c"]]
+    assert batcher.stats()["batches"] == 1
+    assert batcher.stats()["mean_batch_size"] == 3
+
+
+def test_batch_is_processed_when_it_reaches_max_batch_size():
+    batches = []
+
+    def process_batch(queries):
+        batches.append(queries)
+        return queries
+
+    batcher = create_batcher(process_batch, max_batch_size=2, max_wait_ms=10_000)
+
+    async def submit_queries():
+        return await asyncio.wait_for(asyncio.gather(*[batcher.submit(i) for i in range(4)]), timeout=5)
+
+    assert asyncio.run(submit_queries()) == [0, 1, 2, 3]
+    assert batches == [[0, 1], [2, 3]]
+    assert batcher.stats()["largest_batch_size"] == 2
+
+
+def test_exception_is_raised_for_every_query_in_the_batch():
+    def process_batch(queries):
+        raise RuntimeError("failed")
+
+    batcher = create_batcher(process_batch)
+
+    async def submit_queries():
+        return await asyncio.gather(*[batcher.submit(i) for i in range(2)], return_exceptions=True)
+
+    results = asyncio.run(submit_queries())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.parametrize("max_wait_ms", [0.0, 1.0])
+def test_single_query_is_processed_after_max_wait(max_wait_ms):
+    batcher = create_batcher(lambda queries: queries, max_wait_ms=max_wait_ms)
+
+    assert asyncio.run(asyncio.wait_for(batcher.submit("a"), timeout=5)) == "a"
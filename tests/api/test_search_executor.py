@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+import pytest
+
+from pypi_scout.api.search_executor import SearchExecutor, SearchQueueFullError
+
+
+def test_run_returns_result_from_thread_pool():
+    executor = SearchExecutor(max_concurrency=2, max_queue_size=0)
+
+    thread_name = asyncio.run(executor.run(lambda: threading.current_thread().name))
+
+    assert thread_name.startswith("search")
+    assert executor.n_pending == 0
+    executor.shutdown()
+
+
+def test_run_rejects_tasks_when_queue_is_full():
+    executor = SearchExecutor(max_concurrency=1, max_queue_size=1)
+    release = threading.Event()
+
+    async def submit_three_tasks():
+        tasks = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(SearchQueueFullError):
+            await executor.run(release.wait)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(submit_three_tasks()) == [True, True]
+    executor.shutdown()
+
+
+def test_cancelled_task_keeps_its_slot_until_it_is_done():
+    executor = SearchExecutor(max_concurrency=1, max_queue_size=0)
+    started, release = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        return release.wait()
+
+    async def cancel_running_task():
+        task = asyncio.ensure_future(executor.run(work))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # The thread still runs the cancelled task, so there is no room for another one.
+        assert executor.n_pending == 1
+        with pytest.raises(SearchQueueFullError):
+            await executor.run(work)
+
+    try:
+        asyncio.run(cancel_running_task())
+    finally:
+        release.set()
+        executor.shutdown()
+    assert executor.n_pending == 0
@@ -0,0 +1,123 @@
+import threading
+from unittest.mock import MagicMock
+
+from pypi_scout.api.search_snapshot import SearchSnapshot, SnapshotReloader
+
+
+def create_snapshot(version):
+    return SearchSnapshot(version=version, package_metadata=MagicMock(), vector_database=MagicMock())
+
+
+def test_reload_swaps_in_new_version():
+    reloader = SnapshotReloader(create_snapshot("v1"), load_snapshot=create_snapshot, get_latest_version=lambda: "v2")
+    snapshot_in_flight = reloader.snapshot
+
+    assert reloader.reload()
+    assert reloader.snapshot.version == "v2"
+    assert snapshot_in_flight.version == "v1"
+
+
+def test_reload_skips_unchanged_version_unless_forced():
+    load_snapshot = MagicMock(side_effect=create_snapshot)
+    reloader = SnapshotReloader(create_snapshot("v1"), load_snapshot=load_snapshot, get_latest_version=lambda: "v1")
+
+    assert not reloader.reload()
+    load_snapshot.assert_not_called()
+    assert reloader.reload(force=True)
+    load_snapshot.assert_called_once_with("v1")
+
+
+def test_reload_always_reloads_unversioned_datasets():
+    reloader = SnapshotReloader(create_snapshot(None), load_snapshot=create_snapshot, get_latest_version=lambda: None)
+    snapshot = reloader.snapshot
+
+    assert reloader.reload()
+    assert reloader.snapshot is not snapshot
+
+
+def test_reload_keeps_current_snapshot_if_loading_fails():
+    snapshot = create_snapshot("v1")
+    reloader = SnapshotReloader(
+        snapshot, load_snapshot=MagicMock(side_effect=FileNotFoundError), get_latest_version=lambda: "v2"
+    )
+
+    assert not reloader.reload()
+    assert reloader.snapshot is snapshot
+
+
+def test_reload_removes_older_versions_after_swap():
+    remove_older_versions = MagicMock()
+    reloader = SnapshotReloader(
+        create_snapshot("v1"),
+        load_snapshot=create_snapshot,
+        get_latest_version=lambda: "v2",
+        remove_older_versions=remove_older_versions,
+    )
+
+    assert reloader.reload()
+    remove_older_versions.assert_called_once_with("v2")
+
+
+def test_reload_keeps_older_versions_if_loading_fails():
+    remove_older_versions = MagicMock()
+    reloader = SnapshotReloader(
+        create_snapshot("v1"),
+        load_snapshot=MagicMock(side_effect=FileNotFoundError),
+        get_latest_version=lambda: "v2",
+        remove_older_versions=remove_older_versions,
+    )
+
+    assert not reloader.reload()
+    remove_older_versions.assert_not_called()
+
+
+def test_reload_swaps_in_new_version_if_removing_older_versions_fails():
+    reloader = SnapshotReloader(
+        create_snapshot("v1"),
+        load_snapshot=create_snapshot,
+        get_latest_version=lambda: "v2",
+        remove_older_versions=MagicMock(side_effect=PermissionError),
+    )
+
+    assert reloader.reload()
+    assert reloader.snapshot.version == "v2"
+
+
+def test_reload_in_background_runs_one_reload_at_a_time():
+    loading = threading.Event()
+    release = threading.Event()
+
+    def load_snapshot(version):
+        loading.set()
+        release.wait()
+        return create_snapshot(version)
+
+    reloader = SnapshotReloader(create_snapshot("v1"), load_snapshot=load_snapshot, get_latest_version=lambda: "v2")
+
+    assert reloader.reload_in_background()
+    loading.wait()
+    assert reloader.is_reloading
+    assert not reloader.reload_in_background()
+    assert reloader.snapshot.version == "v1"
+
+    release.set()
+    assert not reloader.reload()  # Waits for the background reload, after which v2 is already served.
+    assert reloader.snapshot.version == "v2"
+
+
+def test_start_watching_reloads_new_versions():
+    versions = iter(["v1", "v2"])
+    swapped = threading.Event()
+
+    def load_snapshot(version):
+        swapped.set()
+        return create_snapshot(version)
+
+    reloader = SnapshotReloader(
+        create_snapshot("v1"), load_snapshot=load_snapshot, get_latest_version=lambda: next(versions, "v2")
+    )
+    reloader.start_watching(interval_seconds=0.001)
+    assert swapped.wait(timeout=5)
+    reloader.stop_watching()
+
+    assert reloader.snapshot.version == "v2"
@@ -0,0 +1,95 @@
+import json
+from concurrent.futures import Future
+from pathlib import Path
+
+import polars as pl
+import pytest
+from bs4 import BeautifulSoup
+
+from pypi_scout.data.description_cleaner import DescriptionCleaner, FastDescriptionCleaner
+
+
+class AlwaysParseHtmlDescriptionCleaner(DescriptionCleaner):
+    @staticmethod
+    def _remove_html_tags(text: str) -> str:
+        return BeautifulSoup(text, "lxml").get_text(separator=" ")
+
+
+@pytest.fixture
+def df_descriptions():
+    with open(Path(__file__).parent / "fixtures" / "descriptions.json") as f:
+        return pl.DataFrame({"description": [*json.load(f), None]})
+
+
+def test_clean():
+    df = pl.DataFrame({"description": ["# Title\n\nSee [the docs](https://docs.example.com) for *more*.", None]})
+
+    result = DescriptionCleaner().clean(df, "description", "description_cleaned")
+
+    assert result["description_cleaned"].to_list() == ["Title See for more.", None]
+
+
+@pytest.mark.parametrize(
+    "cleaner",
+    [DescriptionCleaner(), DescriptionCleaner(n_workers=2, chunk_size=8), FastDescriptionCleaner()],
+    ids=["serial", "parallel", "fast"],
+)
+def test_cleaners_match_the_reference_cleaner(df_descriptions, cleaner):
+    # The reference always parses the HTML, so this also checks that skipping the parser does not change the result.
+    expected = AlwaysParseHtmlDescriptionCleaner().clean(df_descriptions, "description", "description_cleaned")
+
+    result = cleaner.clean(df_descriptions, "description", "description_cleaned")
+
+    assert result["description_cleaned"].to_list() == expected["description_cleaned"].to_list()
+
+
+def test_clean_reuses_the_worker_pool(df_descriptions, monkeypatch):
+    cleaner = FastDescriptionCleaner(n_workers=2, chunk_size=8)
+    expected = cleaner.clean(df_descriptions, "description", "description_cleaned")
+
+    with cleaner.worker_pool() as executor:
+        monkeypatch.setattr(
+            FastDescriptionCleaner, "worker_pool", lambda self: pytest.fail("Started another pool of workers.")
+        )
+        for _ in range(2):
+            result = cleaner.clean(df_descriptions, "description", "description_cleaned", executor)
+            assert result["description_cleaned"].to_list() == expected["description_cleaned"].to_list()
+
+
+def test_worker_pool_without_workers():
+    with DescriptionCleaner().worker_pool() as executor:
+        assert executor is None
+
+
+def test_clean_submits_a_bounded_number_of_chunks():
+    class CountingExecutor:
+        """
+        Runs every task on submission, and counts the chunks that were submitted but whose results were not yet used.
+        """
+
+        def __init__(self):
+            self.n_in_flight = 0
+            self.max_n_in_flight = 0
+
+        def submit(self, function, *args):
+            executor = self
+            executor.n_in_flight += 1
+            executor.max_n_in_flight = max(executor.max_n_in_flight, executor.n_in_flight)
+
+            class CountingFuture(Future):
+                def result(self, timeout=None):
+                    executor.n_in_flight -= 1
+                    return super().result(timeout)
+
+            future = CountingFuture()
+            future.set_result(function(*args))
+            return future
+
+    df = pl.DataFrame({"description": [f"*Description* {i}" for i in range(100)]})
+    cleaner = DescriptionCleaner(n_workers=2, chunk_size=5)
+    executor = CountingExecutor()
+
+    result = cleaner.clean(df, "description", "description_cleaned", executor)
+
+    assert result["description_cleaned"].to_list() == [f"Description {i}" for i in range(100)]
+    assert executor.max_n_in_flight == 4
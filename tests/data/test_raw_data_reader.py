@@ -0,0 +1,95 @@
+import random
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from pypi_scout.data.raw_data_reader import RawDataReader
+
+
+@pytest.fixture
+def raw_dataset(tmp_path):
+    path = tmp_path / "raw_dataset.csv"
+    pl.DataFrame(
+        {
+            "name": ["a", "b", "a", "c", "d", "e"],
+            "summary": ["Summary a", "Summary b", "Summary a", None, "Summary d", None],
+            "description": [
+                'Multi-line,\n"quoted" description',
+                None,
+                'Multi-line,\n"quoted" description',
+                None,
+                "",
+                "e",
+            ],
+            "number_of_downloads": [5, 10, 5, 7, 1, 3],
+        }
+    ).write_csv(path)
+    return path
+
+
+def test_read_in_batches_matches_read(raw_dataset):
+    expected = RawDataReader(raw_dataset).read()
+
+    batches = list(RawDataReader(raw_dataset).read_in_batches(batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 2]
+    assert_frame_equal(pl.concat(batches).sort("name"), expected.sort("name"))
+
+
+def test_read_in_batches_keeps_the_most_downloaded_packages(raw_dataset):
+    df = pl.concat(RawDataReader(raw_dataset).read_in_batches(batch_size=10, frac_data_to_include=0.5))
+
+    assert df["name"].to_list() == ["a", "b"]
+
+
+def test_read_in_batches_drops_rows_with_invalid_downloads(tmp_path, caplog):
+    path = tmp_path / "raw_dataset.csv"
+    path.write_text(
+        "name,summary,description,number_of_downloads\n"
+        "a,Summary a,,5\n"
+        "b,Summary b,,many\n"
+        "c,Summary c,,\n"
+        "b,Summary b,,2\n"
+    )
+
+    df = pl.concat(RawDataReader(path).read_in_batches(batch_size=10))
+
+    assert df["name"].to_list() == ["a", "c", "b"]
+    assert df["weekly_downloads"].to_list() == [5, None, 2]
+    assert "Dropping 1 rows" in caplog.text
+
+
+def test_read_in_batches_splits_rows_only_at_unquoted_line_breaks(tmp_path):
+    # Descriptions with quoted line breaks, some of which look like rows of the raw dataset or contain quotes, so that
+    # a reader that guesses where rows start within a batch finds packages that do not exist.
+    lines = [
+        'foo,"bar",baz,1',
+        'x,y,"z",2',
+        '"q"',
+        "plain text here",
+        "a,b,c,d",
+        "name,summary,description,number_of_downloads",
+        '"',
+        'x,"',
+        "",
+        ",,,",
+    ]
+    rng = random.Random(1)
+    n_rows = 1_000
+    path = tmp_path / "raw_dataset.csv"
+    pl.DataFrame(
+        {
+            "name": [f"p{i}" for i in range(n_rows)],
+            "summary": [f"S {i}" for i in range(n_rows)],
+            "description": ["\n".join(rng.choice(lines) for _ in range(rng.randint(1, 40))) for _ in range(n_rows)],
+            "number_of_downloads": list(range(n_rows)),
+        }
+    ).write_csv(path)
+    expected = RawDataReader(path).read()
+
+    batches = list(RawDataReader(path).read_in_batches(batch_size=500))
+
+    assert len(expected) == n_rows
+    assert [len(batch) for batch in batches] == [500, 500]
+    assert_frame_equal(pl.concat(batches).sort("name"), expected.sort("name"))
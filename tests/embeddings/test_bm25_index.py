@@ -0,0 +1,96 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from pypi_scout.embeddings.bm25_index import BM25Index, BM25IndexBuilder, tokenize_query
+
+
+@pytest.fixture
+def df_packages():
+    return pl.DataFrame(
+        {
+            "name": ["pydantic", "grpcio", "requests", "typing_extensions"],
+            "summary": [
+                "Data validation using Python type hints",
+                "HTTP/2-based RPC framework",
+                "HTTP for Humans.",
+                None,
+            ],
+            "description": ["Pydantic models.", "The gRPC framework. gRPC gRPC.", "Requests is an HTTP library.", ""],
+        }
+    )
+
+
+@pytest.fixture
+def bm25_index(df_packages):
+    builder = BM25IndexBuilder()
+    builder.add_documents(df_packages, ["name", "summary", "description"])
+    return builder.build()
+
+
+def test_tokenize_query():
+    assert tokenize_query("Typing_Extensions for HTTP/2, http!") == ["typing", "extensions", "for", "http", "2"]
+
+
+def test_search(bm25_index):
+    documents, scores = bm25_index.search("grpc validation", top_k=10)
+
+    assert documents.tolist() == [1, 0]
+    assert scores[0] > scores[1] > 0
+
+
+def test_search_scores_match_bm25(bm25_index):
+    # "humans" only occurs once, in document 2 of 4 documents.
+    document_lengths = np.array([9, 11, 9, 2])
+    idf = np.log1p((4 - 1 + 0.5) / (1 + 0.5))
+    expected = idf * 2.2 / (1 + 1.2 * (0.25 + 0.75 * 9 / document_lengths.mean()))
+
+    documents, scores = bm25_index.search("Humans", top_k=10)
+
+    assert bm25_index.document_lengths.tolist() == document_lengths.tolist()
+    assert documents.tolist() == [2]
+    np.testing.assert_allclose(scores, [expected], rtol=1e-6)
+
+
+def test_search_without_matching_terms(bm25_index):
+    documents, scores = bm25_index.search("numpy", top_k=10)
+    assert len(documents) == len(scores) == 0
+
+
+def test_build_in_batches_matches_build_at_once(df_packages, bm25_index):
+    builder = BM25IndexBuilder(batch_size=1)
+    builder.add_documents(df_packages.head(2), ["name", "summary", "description"])
+    builder.add_documents(df_packages.tail(2), ["name", "summary", "description"])
+    batched_index = builder.build()
+
+    for array in ["vocabulary", "offsets", "documents", "term_frequencies", "document_lengths"]:
+        np.testing.assert_array_equal(getattr(batched_index, array), getattr(bm25_index, array))
+    assert batched_index.names == bm25_index.names
+
+
+def test_build_with_min_document_frequency_and_max_tokens(df_packages):
+    builder = BM25IndexBuilder(max_tokens_per_document=3)
+    builder.add_documents(df_packages, ["name", "summary", "description"])
+    bm25_index = builder.build(min_document_frequency=2)
+
+    assert bm25_index.vocabulary.tolist() == [b"http"]
+    assert bm25_index.document_lengths.tolist() == [3, 3, 3, 2]
+
+
+def test_save_and_load(bm25_index, tmp_path):
+    bm25_index.save(tmp_path / "bm25_index.npz")
+    loaded_index = BM25Index.load(tmp_path / "bm25_index.npz")
+
+    assert loaded_index.names == ["pydantic", "grpcio", "requests", "typing_extensions"]
+    for query in ["grpc", "http humans", "typing"]:
+        np.testing.assert_array_equal(loaded_index.search(query, 10)[0], bm25_index.search(query, 10)[0])
+
+
+def test_search_with_sparse_scores_matches_dense_scores(bm25_index, monkeypatch):
+    dense_results = [bm25_index.search(query, 10) for query in ["grpc validation", "http humans", "numpy"]]
+    monkeypatch.setattr("pypi_scout.embeddings.bm25_index.DENSE_SCORES_RATIO", 0)
+
+    for query, (documents, scores) in zip(["grpc validation", "http humans", "numpy"], dense_results):
+        sparse_documents, sparse_scores = bm25_index.search(query, 10)
+        np.testing.assert_array_equal(sparse_documents, documents)
+        np.testing.assert_allclose(sparse_scores, scores)
@@ -0,0 +1,152 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import polars as pl
+import pytest
+
+from pypi_scout.embeddings.embeddings_creator import VectorEmbeddingCreator
+
+
+@pytest.fixture
+def mock_model():
+    # Mock the SentenceTransformer model to return an embedding of the text length for each text
+    mock_model = MagicMock()
+    mock_model.encode.side_effect = lambda texts, **kwargs: np.array(
+        [[len(text), 1.0] for text in texts], dtype=np.float32
+    )
+    return mock_model
+
+
+@pytest.fixture
+def creator(mock_model):
+    return VectorEmbeddingCreator(embeddings_model=mock_model, batch_size=2)
+
+
+def test_add_embeddings(creator, mock_model):
+    df = pl.DataFrame({"name": ["a", "b", "c"], "text": ["x", "yy", "zzz"]})
+    df = creator.add_embeddings(df, "text")
+    assert df["embeddings"].to_list() == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert mock_model.encode.call_count == 2
+
+
+def test_update_embeddings_without_previous_embeddings(creator):
+    df = pl.DataFrame({"name": ["a", "b"], "text": ["x", "yy"]})
+    df = creator.update_embeddings(df, "text")
+    assert df["embeddings"].to_list() == [[1.0, 1.0], [2.0, 1.0]]
+    assert df["text_hash"].to_list() == VectorEmbeddingCreator.hash_texts(pl.Series(["x", "yy"]))
+
+
+def test_update_embeddings_reuses_unchanged_texts(creator, mock_model):
+    df_previous = pl.DataFrame(
+        {
+            "name": ["a", "b", "removed"],
+            "embeddings": [[-1.0, -1.0], [-2.0, -2.0], [-3.0, -3.0]],
+            "text_hash": VectorEmbeddingCreator.hash_texts(pl.Series(["x", "yy", "removed"])),
+        },
+        schema_overrides={"embeddings": pl.List(pl.Float32)},
+    )
+    df = pl.DataFrame({"name": ["new", "a", "b"], "text": ["new", "x", "changed"]})
+
+    df = creator.update_embeddings(df, "text", df_previous)
+
+    assert df["name"].to_list() == ["new", "a", "b"]
+    assert df["embeddings"].to_list() == [[3.0, 1.0], [-1.0, -1.0], [7.0, 1.0]]
+    assert df["text_hash"].to_list() == VectorEmbeddingCreator.hash_texts(df["text"])
+    mock_model.encode.assert_called_once()
+    assert mock_model.encode.call_args.args[0] == ["new", "changed"]
+
+
+def test_update_embeddings_with_only_unchanged_texts(creator, mock_model):
+    df = creator.update_embeddings(pl.DataFrame({"name": ["a", "b"], "text": ["x", "yy"]}), "text")
+    mock_model.encode.reset_mock()
+
+    df_updated = creator.update_embeddings(df.select("name", "text"), "text", df)
+
+    assert df_updated["embeddings"].to_list() == df["embeddings"].to_list()
+    mock_model.encode.assert_not_called()
+
+
+def test_update_embeddings_after_changing_the_model_encodes_every_text(mock_model):
+    texts = ["x", "yy", "zzz"]
+    df = pl.DataFrame({"name": ["a", "b", "c"], "text": texts})
+    creator = VectorEmbeddingCreator(embeddings_model=mock_model, model_id="all-mpnet-base-v2:TORCH")
+    df_previous = creator.update_embeddings(df, "text")
+    mock_model.encode.reset_mock()
+
+    creator = VectorEmbeddingCreator(embeddings_model=mock_model, model_id="all-MiniLM-L6-v2:TORCH")
+    df_updated = creator.update_embeddings(df, "text", df_previous)
+
+    assert mock_model.encode.call_args.args[0] == texts
+    assert set(df_updated["text_hash"]).isdisjoint(df_previous["text_hash"])
+
+
+@pytest.mark.parametrize("n_processes", [1, 2])
+def test_add_embeddings_sorted_by_length(mock_model, n_processes):
+    mock_model.encode_multi_process.side_effect = lambda texts, pool, **kwargs: mock_model.encode(texts)
+    creator = VectorEmbeddingCreator(
+        embeddings_model=mock_model, batch_size=2, sort_by_length=True, n_processes=n_processes
+    )
+    texts = ["ccc", "a", "eeeee", "bb", "dddd"]
+
+    df = creator.add_embeddings(pl.DataFrame({"text": texts}), "text")
+
+    assert df["embeddings"].to_list() == [[len(text), 1.0] for text in texts]
+    encoded_texts = [text for call in mock_model.encode.call_args_list for text in call.args[0]]
+    assert encoded_texts == sorted(texts, key=len)
+    assert mock_model.start_multi_process_pool.called == (n_processes > 1)
+    assert mock_model.stop_multi_process_pool.called == (n_processes > 1)
+
+
+def test_add_embeddings_resumes_from_checkpoint(mock_model, tmp_path):
+    encode = mock_model.encode.side_effect
+    n_calls = 0
+
+    def encode_until_interrupted(texts, **kwargs):
+        nonlocal n_calls
+        n_calls += 1
+        if n_calls == 3:
+            raise KeyboardInterrupt
+        return encode(texts)
+
+    mock_model.encode.side_effect = encode_until_interrupted
+    creator = VectorEmbeddingCreator(
+        embeddings_model=mock_model, batch_size=2, sort_by_length=True, checkpoint_dir=tmp_path
+    )
+    texts = ["ccc", "a", "eeeee", "bb", "dddd", "ffffff"]
+    df = pl.DataFrame({"text": texts})
+    with pytest.raises(KeyboardInterrupt):
+        creator.add_embeddings(df, "text")
+
+    mock_model.encode.reset_mock()
+    mock_model.encode.side_effect = encode
+    df = creator.add_embeddings(df, "text")
+
+    assert df["embeddings"].to_list() == [[len(text), 1.0] for text in texts]
+    mock_model.encode.assert_called_once()
+    assert mock_model.encode.call_args.args[0] == ["eeeee", "ffffff"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_add_embeddings_ignores_checkpoint_of_other_texts(mock_model, tmp_path):
+    creator = VectorEmbeddingCreator(embeddings_model=mock_model, batch_size=2, checkpoint_dir=tmp_path)
+    mock_model.encode.side_effect = [np.ones((2, 2), dtype=np.float32), KeyboardInterrupt]
+    with pytest.raises(KeyboardInterrupt):
+        creator.add_embeddings(pl.DataFrame({"text": ["a", "b", "c"]}), "text")
+
+    mock_model.encode.side_effect = lambda texts, **kwargs: np.zeros((len(texts), 2), dtype=np.float32)
+    df = creator.add_embeddings(pl.DataFrame({"text": ["a", "b", "changed"]}), "text")
+
+    assert df["embeddings"].to_list() == [[0.0, 0.0]] * 3
+
+
+def test_add_embeddings_with_mean_pooled_chunks(mock_model):
+    mock_model.encode.side_effect = lambda texts, **kwargs: np.array(
+        [[1.0, 0.0] if text.startswith("a") else [0.0, 2.0] for text in texts], dtype=np.float32
+    )
+    text_chunker = MagicMock()
+    text_chunker.chunk_texts.return_value = [["a1", "b1"], ["a2"]]
+    creator = VectorEmbeddingCreator(embeddings_model=mock_model, text_chunker=text_chunker)
+
+    df = creator.add_embeddings(pl.DataFrame({"text": ["a1 b1", "a2"]}), "text")
+
+    assert df["embeddings"].to_list() == [[0.5, 0.5], [1.0, 0.0]]
@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import polars as pl
+import pytest
+
+from pypi_scout.embeddings.bm25_index import BM25IndexBuilder
+from pypi_scout.embeddings.hybrid_search import HybridSearcher, normalize_package_name, reciprocal_rank_fusion
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+
+
+@pytest.fixture
+def mock_model():
+    mock_model = MagicMock()
+    mock_model.encode.return_value = np.array([[1.0, 0.0, 0.0]])
+    return mock_model
+
+
+@pytest.fixture
+def hybrid_searcher(mock_model):
+    df = pl.DataFrame(
+        {
+            "name": ["fastapi", "grpcio", "Typing_Extensions"],
+            "summary": ["Web framework for building APIs", "HTTP/2-based RPC framework", "Backported type hints"],
+            "embeddings": [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.6, 0.0, 0.8]],
+        }
+    )
+    vector_database = SimpleVectorDatabase(embeddings_model=mock_model, df_embeddings=df)
+    builder = BM25IndexBuilder()
+    builder.add_documents(df, ["name", "summary"])
+    return HybridSearcher(vector_database, builder.build(), np.arange(len(df)), df["name"].to_numpy())
+
+
+def test_normalize_package_name():
+    assert normalize_package_name(" Typing_Extensions ") == "typing-extensions"
+    assert normalize_package_name("zope.interface") == "zope-interface"
+
+
+def test_reciprocal_rank_fusion():
+    rows, scores = reciprocal_rank_fusion([np.array([3, 1, 2]), np.array([1, 4])], k=60)
+
+    assert rows.tolist() == [1, 3, 4, 2]
+    np.testing.assert_allclose(scores, [1 / 62 + 1 / 61, 1 / 61, 1 / 62, 1 / 63])
+
+
+def test_search_batch_finds_lexical_matches(hybrid_searcher):
+    ((rows, fused_scores, similarities),) = hybrid_searcher.search_batch(["rpc"], n_candidates=3)
+
+    # The vector search ranks grpcio last, but only grpcio contains the term.
+    assert rows.tolist() == [1, 0, 2]
+    np.testing.assert_allclose(fused_scores, [1 / 63 + 1 / 61, 1 / 61, 1 / 62])
+    np.testing.assert_allclose(similarities, [0.0, 1.0, 0.6])
+
+
+def test_search_batch_uses_embedding_of_exact_package_name(mock_model, hybrid_searcher):
+    ((rows, _, similarities),) = hybrid_searcher.search_batch(["typing-extensions"], n_candidates=3)
+
+    mock_model.encode.assert_not_called()
+    assert rows[0] == 2
+    assert similarities[0] == pytest.approx(1.0)
+
+
+def test_hybrid_searcher_requires_single_embedding_per_package(mock_model):
+    df = pl.DataFrame({"name": ["a", "a"], "embeddings": [[1.0, 0.0], [0.0, 1.0]]})
+    vector_database = SimpleVectorDatabase(
+        embeddings_model=mock_model, df_embeddings=df, row_to_package=np.array([0, 0])
+    )
+
+    with pytest.raises(ValueError, match="single embedding per package"):
+        HybridSearcher(vector_database, BM25IndexBuilder().build(), np.array([0]), np.array(["a"]))
@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+import pytest
+import torch
+from sentence_transformers import SentenceTransformer, models
+from transformers import BertConfig, BertModel, BertTokenizerFast
+
+from pypi_scout.embeddings.onnx_encoder import (
+    MANIFEST_FILE_NAME,
+    ONNX_MODEL_FILE_NAME,
+    OnnxEncoder,
+    _SentenceEmbeddingModule,
+    export_to_onnx,
+)
+
+WORDS = "a fast simple library for parsing json yaml http client server async web framework testing".split()
+TEXTS = [
+    "fast json parsing",
+    "an async http client and server library for the web",
+    "testing",
+    "a simple yaml library for parsing configuration files " * 20,
+]
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    # A small, randomly initialized BERT model, so the tests do not need to download a pretrained model.
+    model_dir = tmp_path_factory.mktemp("bert")
+    (model_dir / "vocab.txt").write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *WORDS]))
+    BertTokenizerFast(vocab_file=str(model_dir / "vocab.txt")).save_pretrained(model_dir)
+    torch.manual_seed(0)
+    bert_config = BertConfig(
+        vocab_size=len(WORDS) + 5, hidden_size=32, num_hidden_layers=2, num_attention_heads=2, intermediate_size=64
+    )
+    BertModel(bert_config).save_pretrained(model_dir)
+    transformer = models.Transformer(str(model_dir), max_seq_length=64)
+    return SentenceTransformer(modules=[transformer, models.Pooling(32), models.Normalize()], device="cpu")
+
+
+def cosine_similarities(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def test_exported_module_matches_sentence_transformer(model):
+    input_names = list(model.tokenizer.model_input_names)
+    features = model.tokenizer(TEXTS, padding=True, truncation=True, max_length=64, return_tensors="pt")
+
+    with torch.no_grad():
+        embeddings = _SentenceEmbeddingModule(model, input_names)(*(features[name] for name in input_names))
+
+    np.testing.assert_allclose(embeddings.numpy(), model.encode(TEXTS), atol=1e-5)
+
+
+def test_export_to_onnx_writes_model_and_manifest(model, tmp_path):
+    # Exporting only needs `onnx`, so this runs also where `onnxruntime` is not installed.
+    onnx = pytest.importorskip("onnx")
+
+    model_path = export_to_onnx(model, tmp_path)
+
+    assert model_path == tmp_path / ONNX_MODEL_FILE_NAME
+    onnx.checker.check_model(str(model_path))
+    graph = onnx.load(str(model_path)).graph
+    assert [graph_input.name for graph_input in graph.input] == list(model.tokenizer.model_input_names)
+    assert [graph_output.name for graph_output in graph.output] == ["sentence_embedding"]
+    with open(tmp_path / MANIFEST_FILE_NAME) as f:
+        manifest = json.load(f)
+    assert manifest["dimension"] == 32
+    assert ONNX_MODEL_FILE_NAME in manifest["files"]
+    assert all((tmp_path / file_name).exists() for file_name in manifest["files"])
+
+
+def test_export_to_onnx_supports_torch_without_dynamo_keyword(model, tmp_path, monkeypatch):
+    # Before torch 2.5, `torch.onnx.export` has no `dynamo` keyword.
+    calls = []
+
+    def export(model, args, f, input_names=None, output_names=None, dynamic_axes=None, opset_version=None):
+        calls.append(f)
+
+    monkeypatch.setattr(torch.onnx, "export", export)
+
+    export_to_onnx(model, tmp_path)
+
+    assert calls == [str(tmp_path / ONNX_MODEL_FILE_NAME)]
+
+
+# The int8-quantized model quantizes the activations with a scale per batch, so a text that is encoded on its own gets
+# a slightly different embedding than in a batch.
+@pytest.mark.parametrize(("quantized", "min_cosine_similarity", "atol"), [(False, 0.9999, 1e-5), (True, 0.95, 1e-3)])
+def test_onnx_encoder_matches_sentence_transformer(model, tmp_path, quantized, min_cosine_similarity, atol):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    export_to_onnx(model, tmp_path, quantize=quantized)
+    encoder = OnnxEncoder(tmp_path, quantized=quantized)
+
+    embeddings = encoder.encode(TEXTS, batch_size=3)
+
+    assert embeddings.shape == (len(TEXTS), 32)
+    assert cosine_similarities(embeddings, model.encode(TEXTS)).min() >= min_cosine_similarity
+    np.testing.assert_allclose(encoder.encode(TEXTS[0]), embeddings[0], atol=atol)
+    assert encoder.max_seq_length == 64
@@ -0,0 +1,56 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import polars as pl
+import pytest
+
+from pypi_scout.embeddings.popularity_ranker import PopularityRanker
+from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+
+
+@pytest.fixture
+def vector_db():
+    embeddings = np.random.default_rng(0).standard_normal((1000, 16)).astype(np.float32)
+    return SimpleVectorDatabase(
+        embeddings_model=MagicMock(),
+        df_embeddings=pl.DataFrame({"name": [f"package-{i}" for i in range(1000)]}),
+        embeddings_matrix=SimpleVectorDatabase._normalize(embeddings),
+    )
+
+
+def brute_force_ranking(vector_db, log_weekly_downloads, query_embedding, top_k):
+    popularity = (log_weekly_downloads - log_weekly_downloads.min()) / np.ptp(log_weekly_downloads)
+    scores = 0.8 * (vector_db.embeddings_matrix @ query_embedding) + 0.2 * popularity
+    return np.argsort(-scores)[:top_k]
+
+
+@pytest.mark.parametrize("early_exit", [False, True])
+@pytest.mark.parametrize("sorted_by_popularity", [False, True])
+def test_rank_matches_brute_force(vector_db, early_exit, sorted_by_popularity):
+    log_weekly_downloads = np.log1p(np.random.default_rng(1).lognormal(6, 3, 1000)).astype(np.float32)
+    if sorted_by_popularity:
+        log_weekly_downloads = np.sort(log_weekly_downloads)[::-1]
+    ranker = PopularityRanker(vector_db, log_weekly_downloads, early_exit=early_exit, block_size=64)
+    query_embeddings = SimpleVectorDatabase._normalize(np.random.default_rng(2).standard_normal((3, 16)))
+
+    results = ranker.rank(query_embeddings.astype(np.float32), top_k=10, n_candidates=30)
+
+    for (rows, similarities), query_embedding in zip(results, query_embeddings):
+        expected = brute_force_ranking(vector_db, log_weekly_downloads, query_embedding, top_k=10)
+        np.testing.assert_array_equal(rows, expected)
+        np.testing.assert_allclose(similarities, vector_db.embeddings_matrix[rows] @ query_embedding, rtol=1e-5)
+
+
+def test_popular_package_outranks_slightly_more_similar_package():
+    embeddings = np.array([[1.0, 0.0], [0.99, 0.14], [0.0, 1.0]], dtype=np.float32)
+    vector_db = SimpleVectorDatabase(
+        embeddings_model=MagicMock(),
+        df_embeddings=pl.DataFrame({"name": ["exact", "popular", "other"]}),
+        embeddings_matrix=SimpleVectorDatabase._normalize(embeddings),
+    )
+    ranker = PopularityRanker(vector_db, np.log1p(np.array([10, 1_000_000, 100])))
+
+    # With only the single most similar candidate from the vector index, the popular package is found by the scan.
+    (rows, _) = ranker.rank(np.array([[1.0, 0.0]], dtype=np.float32), top_k=1, n_candidates=1)[0]
+
+    assert rows.tolist() == [1]
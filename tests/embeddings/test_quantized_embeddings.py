@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from pypi_scout.embeddings.quantized_embeddings import DEQUANTIZED_BLOCK_BYTES, QuantizedEmbeddings
+from pypi_scout.embeddings.vector_index import ExactIndex
+
+
+@pytest.fixture
+def embeddings_matrix():
+    embeddings = np.random.default_rng(0).standard_normal((1000, 32)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("dtype", [np.float16, np.int8])
+def test_quantize_approximates_embeddings(embeddings_matrix, dtype):
+    quantized = QuantizedEmbeddings.quantize(embeddings_matrix, dtype)
+
+    assert quantized.codes.dtype == dtype
+    assert quantized.shape == embeddings_matrix.shape
+    np.testing.assert_allclose(quantized[np.arange(len(embeddings_matrix))], embeddings_matrix, atol=0.01)
+
+
+@pytest.mark.parametrize("dtype", [np.float16, np.int8])
+def test_matmul_matches_dequantized_matrix(embeddings_matrix, dtype):
+    quantized = QuantizedEmbeddings.quantize(embeddings_matrix, dtype)
+    quantized.block_size = 128
+    query = embeddings_matrix[0]
+
+    expected = quantized[np.arange(len(embeddings_matrix))] @ query
+    np.testing.assert_allclose(quantized @ query, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_block_size_fits_in_memory_budget(embeddings_matrix):
+    quantized = QuantizedEmbeddings.quantize(embeddings_matrix, np.int8)
+
+    assert quantized.block_size == DEQUANTIZED_BLOCK_BYTES // (4 * 32)
+
+
+def test_quantize_rejects_unsupported_dtype(embeddings_matrix):
+    with pytest.raises(ValueError, match="Unsupported dtype"):
+        QuantizedEmbeddings.quantize(embeddings_matrix, np.int16)
+
+
+def test_save_and_load(embeddings_matrix, tmp_path):
+    quantized = QuantizedEmbeddings.quantize(embeddings_matrix, np.int8)
+    quantized.save(tmp_path / "codes.npy", tmp_path / "scales.npy")
+
+    loaded = QuantizedEmbeddings.load(tmp_path / "codes.npy", tmp_path / "scales.npy")
+
+    np.testing.assert_array_equal(loaded.codes, quantized.codes)
+    np.testing.assert_array_equal(loaded.scales, quantized.scales)
+
+
+def test_exact_index_on_quantized_embeddings_finds_nearest_row(embeddings_matrix):
+    quantized = QuantizedEmbeddings.quantize(embeddings_matrix, np.int8)
+
+    indices, _ = ExactIndex().search(quantized, embeddings_matrix[42], top_k=1)
+
+    assert indices[0] == 42
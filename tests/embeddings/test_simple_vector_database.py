@@ -3,8 +3,11 @@ from unittest.mock import MagicMock
 import numpy as np
 import polars as pl
 import pytest
+from polars.testing import assert_frame_equal
 
+from pypi_scout.embeddings.quantized_embeddings import QuantizedEmbeddings
 from pypi_scout.embeddings.simple_vector_database import SimpleVectorDatabase
+from pypi_scout.utils.metrics import StageTimer
 
 
 @pytest.fixture
@@ -34,6 +37,10 @@ def vector_db(mock_model, df_embeddings):
 
 def test_embeddings_matrix_creation(vector_db):
     expected_matrix = np.array([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6], [0.7, 0.8, 0.9]], dtype=np.float32)
+    expected_matrix /= np.linalg.norm(expected_matrix, axis=1, keepdims=True)
+
+    assert vector_db.embeddings_matrix.dtype == np.float32
+    assert vector_db.embeddings_matrix.flags["C_CONTIGUOUS"]
 
     np.testing.assert_allclose(vector_db.embeddings_matrix, expected_matrix, rtol=1e-6, atol=1e-8)
 
@@ -49,3 +56,98 @@ def test_find_similar(vector_db):
 
     expected_columns = ["id", "text", "similarity"]
     assert set(result.columns) == set(expected_columns)
+
+
+def test_find_similar_matches_cosine_similarity(vector_db):
+    matrix = np.array([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6], [0.7, 0.8, 0.9]])
+    query = np.array([0.5, 0.5, 0.5])
+    expected = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+
+    result = vector_db.find_similar("Hello", top_k=3)
+
+    np.testing.assert_allclose(result.sort("id")["similarity"].to_numpy(), expected, rtol=1e-5)
+
+
+def test_find_similar_returns_matches_sorted_by_similarity(vector_db):
+    result = vector_db.find_similar("Hello", top_k=3)
+
+    assert result["similarity"].to_list() == sorted(result["similarity"].to_list(), reverse=True)
+
+
+def test_find_similar_with_precomputed_embeddings_matrix(mock_model, df_embeddings, vector_db, tmp_path):
+    np.save(tmp_path / "embeddings.npy", vector_db.embeddings_matrix)
+    memory_mapped_db = SimpleVectorDatabase(
+        embeddings_model=mock_model,
+        df_embeddings=df_embeddings.drop("embeddings"),
+        embeddings_matrix=np.load(tmp_path / "embeddings.npy", mmap_mode="r"),
+    )
+
+    result = memory_mapped_db.find_similar("Hello", top_k=2)
+
+    assert result.equals(vector_db.find_similar("Hello", top_k=2))
+
+
+def test_find_similar_with_quantized_embeddings_rescores_exactly(mock_model, df_embeddings, vector_db):
+    # With 2 * 2 candidates, every row is re-scored, so the result equals the exact search.
+    quantized_db = SimpleVectorDatabase(
+        embeddings_model=mock_model,
+        df_embeddings=df_embeddings,
+        quantized_embeddings=QuantizedEmbeddings.quantize(vector_db.embeddings_matrix, np.int8),
+        rescore_multiplier=2,
+    )
+
+    result = quantized_db.find_similar("Hello", top_k=2)
+
+    assert_frame_equal(result, vector_db.find_similar("Hello", top_k=2))
+
+
+def test_find_similar_caches_query_embeddings_by_normalized_query(mock_model, vector_db):
+    vector_db.find_similar("Hello  World", top_k=2)
+    vector_db.find_similar(" hello world", top_k=2)
+
+    mock_model.encode.assert_called_once_with("hello world", show_progress_bar=False)
+    assert vector_db.query_embedding_cache.hits == 1
+
+
+def test_find_similar_measures_stages(vector_db):
+    observed = []
+    timer = StageTimer(observe=lambda stage, seconds: observed.append(stage))
+
+    vector_db.find_similar("Hello", top_k=2, timer=timer)
+
+    assert observed == ["encode", "similarity", "join"]
+    assert all(duration >= 0 for duration in timer.durations.values())
+
+
+def test_find_similar_batch_matches_find_similar(mock_model, vector_db):
+    mock_model.encode.side_effect = lambda query, **kwargs: (
+        np.array([[0.5, 0.5, 0.5], [0.1, 0.9, 0.1]]) if isinstance(query, list) else np.array([0.5, 0.5, 0.5])
+    )
+
+    results = vector_db.find_similar_batch(["Hello", "World"], top_k=2)
+
+    assert len(results) == 2
+    assert_frame_equal(results[0], vector_db.find_similar("Hello", top_k=2))
+    assert results[1]["id"].to_list() == [3, 2]
+    assert mock_model.encode.call_args_list[0].args[0] == ["hello", "world"]
+
+
+def test_find_similar_with_multiple_embeddings_per_package_uses_max_sim(mock_model):
+    mock_model.encode.return_value = np.array([1.0, 0.0])
+    df_embeddings = pl.DataFrame(
+        {
+            "name": ["a", "a", "b", "c", "c"],
+            "chunk_index": [0, 1, 0, 0, 1],
+            "embeddings": [[0.0, 1.0], [0.9, 0.1], [0.8, 0.2], [1.0, 0.0], [0.95, 0.05]],
+        }
+    )
+    multi_vector_db = SimpleVectorDatabase(
+        embeddings_model=mock_model, df_embeddings=df_embeddings, row_to_package=np.array([0, 0, 1, 2, 2])
+    )
+
+    result = multi_vector_db.find_similar("query", top_k=2)
+    packages, similarities = multi_vector_db.find_similar_indices_batch(["query"], top_k=3)[0]
+
+    assert result["name"].to_list() == ["c", "a"]
+    assert packages.tolist() == [2, 0, 1]
+    np.testing.assert_allclose(similarities, [1.0, 0.9 / np.hypot(0.9, 0.1), 0.8 / np.hypot(0.8, 0.2)], rtol=1e-6)
@@ -0,0 +1,36 @@
+import re
+
+import pytest
+
+from pypi_scout.embeddings.text_chunker import TextChunker
+
+
+class WhitespaceTokenizer:
+    # Mimics the interface of a fast Hugging Face tokenizer, with one token per word.
+    def __call__(self, texts, **kwargs):
+        return {"offset_mapping": [[match.span() for match in re.finditer(r"\S+", text)] for text in texts]}
+
+
+@pytest.fixture
+def text_chunker():
+    return TextChunker(WhitespaceTokenizer(), max_tokens=3, max_chunks=3, overlap_tokens=1)
+
+
+def test_chunk_texts(text_chunker):
+    texts = ["one two three", "one two three four  five", "", "a b c d e f g h i j"]
+    assert text_chunker.chunk_texts(texts, batch_size=2) == [
+        ["one two three"],
+        ["one two three", "three four  five"],
+        [""],
+        ["a b c", "c d e", "e f g"],
+    ]
+
+
+def test_chunk_texts_without_overlap():
+    text_chunker = TextChunker(WhitespaceTokenizer(), max_tokens=2, max_chunks=10)
+    assert text_chunker.chunk_texts(["a b c d e"]) == [["a b", "c d", "e"]]
+
+
+def test_overlap_should_be_smaller_than_max_tokens():
+    with pytest.raises(ValueError):
+        TextChunker(WhitespaceTokenizer(), max_tokens=2, max_chunks=10, overlap_tokens=2)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from pypi_scout.embeddings.vector_index import ExactIndex, IVFIndex, top_k_indices
+
+
+@pytest.fixture
+def embeddings_matrix():
+    embeddings = np.random.default_rng(0).standard_normal((2000, 16)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def query_embedding():
+    query = np.random.default_rng(1).standard_normal(16).astype(np.float32)
+    return query / np.linalg.norm(query)
+
+
+@pytest.mark.parametrize("top_k", [0, 1, 10, 300, 999, 1000, 1500])
+def test_top_k_indices_matches_full_argsort(top_k):
+    similarities = np.random.default_rng(42).uniform(-1, 1, size=1000).astype(np.float32)
+
+    expected = np.argsort(similarities)[::-1][:top_k]
+    result = top_k_indices(similarities, top_k)
+
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_exact_index_search(embeddings_matrix, query_embedding):
+    indices, similarities = ExactIndex().search(embeddings_matrix, query_embedding, top_k=10)
+
+    expected_similarities = embeddings_matrix @ query_embedding
+    np.testing.assert_array_equal(indices, np.argsort(expected_similarities)[::-1][:10])
+    np.testing.assert_allclose(similarities, expected_similarities[indices])
+
+
+def test_ivf_index_assigns_every_row_to_one_list(embeddings_matrix):
+    centroids = IVFIndex.train_centroids(embeddings_matrix, n_lists=20, n_iterations=5)
+    index = IVFIndex(centroids, IVFIndex.assign(embeddings_matrix, centroids))
+
+    assert centroids.shape == (20, 16)
+    np.testing.assert_allclose(np.linalg.norm(centroids, axis=1), 1, rtol=1e-5)
+    np.testing.assert_array_equal(np.sort(index.row_indices), np.arange(len(embeddings_matrix)))
+    assert index.offsets[-1] == len(embeddings_matrix)
+
+
+def test_ivf_index_probing_all_lists_matches_exact_search(embeddings_matrix, query_embedding):
+    centroids = IVFIndex.train_centroids(embeddings_matrix, n_lists=20, n_iterations=5)
+    index = IVFIndex(centroids, IVFIndex.assign(embeddings_matrix, centroids), n_probe=20)
+
+    indices, similarities = index.search(embeddings_matrix, query_embedding, top_k=10)
+    expected_indices, expected_similarities = ExactIndex().search(embeddings_matrix, query_embedding, top_k=10)
+
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(similarities, expected_similarities)
+
+
+def test_ivf_index_only_searches_probed_lists(embeddings_matrix, query_embedding):
+    centroids = IVFIndex.train_centroids(embeddings_matrix, n_lists=20, n_iterations=5)
+    assignments = IVFIndex.assign(embeddings_matrix, centroids)
+    index = IVFIndex(centroids, assignments, n_probe=2)
+
+    indices, _ = index.search(embeddings_matrix, query_embedding, top_k=10)
+
+    probed_lists = set(np.argsort(centroids @ query_embedding)[::-1][:2])
+    assert set(assignments[indices]) <= probed_lists
@@ -0,0 +1,167 @@
+import io
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from pypi_scout.utils.blob_io import BlobIO
+
+
+class FakeDownloader:
+    def __init__(self, data: bytes, properties: SimpleNamespace):
+        self.data = data
+        self.properties = properties
+
+    def readinto(self, stream) -> int:
+        return stream.write(self.data)
+
+    def readall(self) -> bytes:
+        return self.data
+
+
+class FakeBlobClient:
+    def __init__(self, container: "FakeContainerClient", blob_name: str):
+        self.container = container
+        self.blob_name = blob_name
+
+    def upload_blob(self, data, overwrite: bool = False, max_concurrency: int = 1) -> None:
+        self.container.put(self.blob_name, data if isinstance(data, bytes) else data.read())
+
+    def get_blob_properties(self) -> SimpleNamespace:
+        return self.container.blobs[self.blob_name][1]
+
+    def download_blob(self, max_concurrency: int = 1) -> FakeDownloader:
+        self.container.n_downloads += 1
+        return FakeDownloader(*self.container.blobs[self.blob_name])
+
+
+class FakeContainerClient:
+    """
+    An in-memory stand-in for `azure.storage.blob.ContainerClient`, which gives every upload a new ETag.
+    """
+
+    def __init__(self):
+        self.blobs = {}
+        self.n_uploads = 0
+        self.n_downloads = 0
+
+    def get_blob_client(self, blob_name: str) -> FakeBlobClient:
+        return FakeBlobClient(self, blob_name)
+
+    def put(self, blob_name: str, data: bytes) -> None:
+        self.n_uploads += 1
+        properties = SimpleNamespace(etag=f'"0x{self.n_uploads}"', last_modified=datetime.now(timezone.utc))
+        self.blobs[blob_name] = (data, properties)
+
+
+@pytest.fixture
+def container_client():
+    return FakeContainerClient()
+
+
+@pytest.fixture
+def df():
+    return pl.DataFrame({"name": ["numpy", "polars"], "weekly_downloads": [100, 10]})
+
+
+def parquet_bytes(df: pl.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    df.write_parquet(buffer)
+    return buffer.getvalue()
+
+
+def test_download_parquet_to_df_without_cache(container_client, df):
+    container_client.put("v1/embeddings.parquet", parquet_bytes(df))
+    blob_io = BlobIO("account", "container", "key", container_client=container_client)
+
+    assert_frame_equal(blob_io.download_parquet_to_df("v1/embeddings.parquet"), df)
+    assert_frame_equal(blob_io.download_parquet_to_df("v1/embeddings.parquet"), df)
+    assert container_client.n_downloads == 2
+
+
+def test_download_csv_to_df_uses_cache_until_blob_changes(container_client, df, tmp_path):
+    blob_io = BlobIO("account", "container", "key", cache_dir=tmp_path, container_client=container_client)
+    container_client.put("dataset.csv", b"name,weekly_downloads\nnumpy,100\npolars,10\n")
+
+    assert_frame_equal(blob_io.download_csv_to_df("dataset.csv"), df)
+    assert_frame_equal(blob_io.download_csv_to_df("dataset.csv"), df)
+    assert container_client.n_downloads == 1
+
+    container_client.put("dataset.csv", b"name,weekly_downloads\npandas,50\n")
+    assert blob_io.download_csv_to_df("dataset.csv")["name"].to_list() == ["pandas"]
+    assert container_client.n_downloads == 2
+
+
+def test_download_to_file_skips_unchanged_blob(container_client, tmp_path):
+    blob_io = BlobIO("account", "container", "key", container_client=container_client)
+    container_client.put("embeddings.npy", b"abc")
+    local_file_path = tmp_path / "data" / "embeddings.npy"
+
+    assert blob_io.download_to_file("embeddings.npy", local_file_path)
+    assert not blob_io.download_to_file("embeddings.npy", local_file_path)
+    assert local_file_path.read_bytes() == b"abc"
+
+    container_client.put("embeddings.npy", b"abcd")
+    assert blob_io.download_to_file("embeddings.npy", local_file_path)
+    assert local_file_path.read_bytes() == b"abcd"
+    assert sorted(path.name for path in local_file_path.parent.iterdir()) == [
+        "embeddings.npy",
+        "embeddings.npy.blob.json",
+    ]
+
+
+def test_download_to_file_downloads_again_after_interrupted_download(container_client, tmp_path):
+    blob_io = BlobIO("account", "container", "key", container_client=container_client)
+    container_client.put("embeddings.npy", b"abc")
+    local_file_path = tmp_path / "embeddings.npy"
+    blob_io.download_to_file("embeddings.npy", local_file_path)
+
+    # A file without its blob properties is not trusted, as if the previous download was interrupted.
+    (tmp_path / "embeddings.npy.blob.json").unlink()
+
+    assert blob_io.download_to_file("embeddings.npy", local_file_path)
+
+
+def test_concurrent_downloads_of_the_same_blob_write_complete_files(container_client, tmp_path):
+    blob_io = BlobIO("account", "container", "key", container_client=container_client)
+    container_client.put("embeddings.npy", b"abc" * 1000)
+    local_file_path = tmp_path / "embeddings.npy"
+
+    # Both downloads write their first half before either writes its second half.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def interleaved_readinto(downloader, stream):
+        half = len(downloader.data) // 2
+        stream.write(downloader.data[:half])
+        barrier.wait()
+        return stream.write(downloader.data[half:])
+
+    results = []
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(FakeDownloader, "readinto", interleaved_readinto)
+        threads = [
+            threading.Thread(target=lambda: results.append(blob_io.download_to_file("embeddings.npy", local_file_path)))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert results == [True, True]
+    assert local_file_path.read_bytes() == b"abc" * 1000
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["embeddings.npy", "embeddings.npy.blob.json"]
+
+
+def test_upload_and_download_text(container_client, tmp_path):
+    blob_io = BlobIO("account", "container", "key", container_client=container_client)
+    (tmp_path / "a.csv").write_bytes(b"name\nnumpy\n")
+
+    blob_io.upload_local_file(tmp_path / "a.csv", "v1/a.csv")
+    blob_io.upload_text("v1", "dataset_version.txt")
+
+    assert blob_io.download_text("dataset_version.txt") == "v1"
+    assert container_client.blobs["v1/a.csv"][0] == b"name\nnumpy\n"
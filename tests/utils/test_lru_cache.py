@@ -0,0 +1,46 @@
+from unittest.mock import MagicMock
+
+from pypi_scout.utils.lru_cache import LRUCache
+
+
+def test_get_or_compute_caches_values():
+    cache = LRUCache(max_size=2)
+    compute = MagicMock(return_value="value")
+
+    assert cache.get_or_compute("key", compute) == "value"
+    assert cache.get_or_compute("key", compute) == "value"
+
+    compute.assert_called_once()
+    assert cache.stats() == {"size": 1, "max_size": 2, "hits": 1, "misses": 1}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get_or_compute("a", lambda: None)
+    cache.put("c", 3)
+
+    assert cache.get_or_compute("a", lambda: "recomputed") == 1
+    assert cache.get_or_compute("b", lambda: "recomputed") == "recomputed"
+    assert len(cache) == 2
+
+
+def test_cache_with_max_size_zero_is_disabled():
+    cache = LRUCache(max_size=0)
+    compute = MagicMock(return_value="value")
+
+    cache.get_or_compute("key", compute)
+    cache.get_or_compute("key", compute)
+
+    assert compute.call_count == 2
+    assert len(cache) == 0
+
+
+def test_clear():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+
+    cache.clear()
+
+    assert cache.get_or_compute("a", lambda: "recomputed") == "recomputed"
@@ -0,0 +1,71 @@
+import pytest
+
+from pypi_scout.utils.metrics import MetricsRegistry, StageTimer
+
+
+def test_counter_renders_a_sample_per_label_value():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Number of requests.", ["status"])
+
+    requests.inc(status="200")
+    requests.inc(2, status="200")
+    requests.inc(status="404")
+
+    assert requests.get(status="200") == 3
+    assert registry.render() == (
+        "# HELP requests_total Number of requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{status="200"} 3\n'
+        'requests_total{status="404"} 1\n'
+    )
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=[0.1, 1.0])
+
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        latency.observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 2.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_metric_rejects_unexpected_labels():
+    requests = MetricsRegistry().counter("requests_total", "Number of requests.", ["status"])
+
+    with pytest.raises(ValueError, match="expects the labels"):
+        requests.inc(path="/api/search")
+
+
+def test_registry_rejects_duplicate_names():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Number of requests.")
+
+    with pytest.raises(ValueError, match="already registered"):
+        registry.histogram("requests_total", "Number of requests.")
+
+
+def test_stage_timer_sums_repeated_stages_and_observes_each():
+    observed = []
+    timer = StageTimer(observe=lambda stage, seconds: observed.append((stage, seconds)))
+
+    timer.add("scoring", 0.001)
+    timer.add("scoring", 0.002)
+    with timer.stage("join"):
+        pass
+
+    assert timer.durations["scoring"] == pytest.approx(0.003)
+    assert [stage for stage, _ in observed] == ["scoring", "scoring", "join"]
+
+
+def test_stage_timer_formats_server_timing_in_milliseconds():
+    timer = StageTimer(durations={"encode": 0.0125})
+    timer.add("serialization", 0.0005)
+
+    assert timer.server_timing() == "encode;dur=12.50, serialization;dur=0.50"
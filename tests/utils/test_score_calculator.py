@@ -0,0 +1,21 @@
+import numpy as np
+
+from pypi_scout.utils.score_calculator import calculate_score_from_arrays
+
+
+def test_calculate_score_from_arrays_weights_normalized_columns():
+    scores = calculate_score_from_arrays(
+        np.array([0.2, 0.6, 1.0]),
+        np.log1p(np.array([99, 0, 9])),
+        weight_similarity=0.6,
+        weight_weekly_downloads=0.4,
+    )
+
+    # The similarity normalizes to [0, 0.5, 1], and the log of the weekly downloads to [1, 0, 0.5].
+    np.testing.assert_allclose(scores, [0.4, 0.3, 0.8])
+
+
+def test_calculate_score_from_arrays_with_constant_column():
+    scores = calculate_score_from_arrays(np.array([0.5, 0.3]), np.array([2.0, 2.0]))
+
+    np.testing.assert_allclose(scores, [0.5, 0.0])